@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class AsyncMetrics:
+    """Evaluate metrics of iterates in a background thread pool.
+
+    Each call to `submit` snapshots `(inner_var, outer_var)` and schedules the
+    evaluation of `metrics` on it, so that the caller can go on with the
+    optimization. Numpy arrays are copied since solvers may update them in
+    place, while jax arrays are immutable and only converted in the worker,
+    which also waits for their asynchronous computation to finish.
+
+    Parameters
+    ----------
+    metrics : callable
+        Function `metrics(inner_var, outer_var)` returning the metrics.
+    n_workers : int
+        Number of threads. Numpy releases the GIL in the linear algebra
+        routines that dominate the metrics, so threads run concurrently.
+        These routines are already multithreaded, so a few workers suffice.
+    """
+    def __init__(self, metrics, n_workers=4):
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(max_workers=n_workers)
+        self.futures = {}
+
+    def submit(self, key, inner_var, outer_var):
+        """Schedule the evaluation of the metrics of an iterate.
+
+        `key` identifies the iterate, e.g. `(config, i_eval, seed)`, in the
+        results.
+        """
+        if isinstance(inner_var, np.ndarray):
+            inner_var = inner_var.copy()
+        if isinstance(outer_var, np.ndarray):
+            outer_var = outer_var.copy()
+        self.futures[key] = self.executor.submit(
+            self._compute, inner_var, outer_var
+        )
+
+    def _compute(self, inner_var, outer_var):
+        return self.metrics(np.asarray(inner_var), np.asarray(outer_var))
+
+    def results(self):
+        """Wait for all the evaluations and return a dict of the metrics of
+        each key. Exceptions raised by `metrics` are raised here."""
+        return {key: future.result() for key, future in self.futures.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,94 @@
+import jax
+import jax.numpy as jnp
+
+
+def tree_stack(trees):
+    """Stack a list of pytrees with the same structure along a new leading
+    axis."""
+    return jax.tree_util.tree_map(lambda *leaves: jnp.stack(leaves), *trees)
+
+
+def run_batched(solver, args, carry, n_evals=1, shared=()):
+    """Run a jax solver on a batch of independent runs in lockstep.
+
+    The solver is vectorized with `jax.vmap` over the leading axis of all the
+    variables and states, so that a single compiled program advances all the
+    runs at once.
+
+    `benchopt run` calls `Solver.run` once per seed with a callback for that
+    single run, so it cannot use this function. It is only used by the
+    `run_sweep` methods of the jax solvers, which the successive halving
+    script in `config/` calls to tune the step sizes.
+
+    Parameters
+    ----------
+    solver : callable
+        Jax solver with signature `solver(*args, **carry)` returning
+        `(*args, carry)`, where `args[0]` and `args[1]` are the inner and the
+        outer variables. All static arguments (oracles, samplers, max_iter)
+        should already be bound, e.g. with `functools.partial`.
+    args : tuple of arrays
+        Positional arguments of the solver, with a leading batch axis.
+    carry : dict
+        Keyword states of the solver (samplers, learning rates...), with a
+        leading batch axis except for the keys in `shared`.
+    n_evals : int
+        Number of calls to the solver.
+    shared : tuple of str
+        Keys of `carry` that are identical for all the runs, such as the
+        iteration counter. They are not batched so that control flow depending
+        on them is not turned into a select.
+
+    Returns
+    -------
+    args : tuple of arrays
+        Final positional arguments of the solver.
+    carry : dict
+        Final states of the solver.
+    trajectory : list of tuple
+        The batched `(inner_var, outer_var)` before each call to the solver
+        and after the last one.
+    """
+    axes = (0, {k: None if k in shared else 0 for k in carry})
+
+    def one_call(args, carry):
+        *args, carry = solver(*args, **carry)
+        return tuple(args), carry
+
+    batched_solver = jax.jit(
+        jax.vmap(one_call, in_axes=axes, out_axes=axes)
+    )
+
+    args = tuple(args)
+    trajectory = [(args[0], args[1])]
+    for _ in range(n_evals):
+        args, carry = batched_solver(args, carry)
+        trajectory.append((args[0], args[1]))
+    return args, carry, trajectory
+
+
+def split_trajectory(trajectory, keys):
+    """Group a batched trajectory by configuration.
+
+    Parameters
+    ----------
+    trajectory : list of tuple
+        Batched `(inner_var, outer_var)` as returned by `run_batched`.
+    keys : list
+        Hashable configuration of each run of the batch. Runs sharing the same
+        key, typically the different seeds of one configuration, are kept
+        together along the leading axis.
+
+    Returns
+    -------
+    trajectories : dict
+        For each key, the list of `(inner_var, outer_var)` of its runs.
+    """
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key, []).append(i)
+    return {
+        key: [(inner_var[idx], outer_var[idx])
+              for inner_var, outer_var in trajectory]
+        for key, idx in ((k, jnp.array(v)) for k, v in groups.items())
+    }
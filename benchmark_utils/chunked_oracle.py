@@ -0,0 +1,178 @@
+import os
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import jax
+import jax.numpy as jnp
+
+
+class ChunkedOracle():
+    """Numpy oracle evaluating the large batches by chunks in a thread pool.
+
+    The oracles of a batch are the means of the oracles of its chunks of
+    `chunk_size` samples, weighted by their number of samples. The chunks are
+    evaluated by `n_jobs` threads, numpy releasing the GIL in the linear
+    algebra, so that only the intermediate arrays of `n_jobs` chunks are
+    allocated at the same time. This bounds the peak memory of the full batch
+    evaluations of SRBA and of SOBA with `batch_size='full'`.
+
+    Only `grad_sparse` and `oracles_sparse`, which the solvers call on the
+    large batches, are chunked, and only for batches given as slices of more
+    than `chunk_size` samples. The other batches and attributes are forwarded
+    to the oracle.
+
+    Usage
+    -----
+    >>> f_inner = ChunkedOracle(f_train(framework='none'), chunk_size=4096)
+    >>> grad_in, (idx, grad_out) = f_inner.grad_sparse(
+    >>>     inner_var, outer_var, slice(0, f_inner.n_samples)
+    >>> )
+
+    Parameters
+    ----------
+    oracle : BaseOracle
+        The numpy oracle to evaluate.
+    chunk_size : int
+        Number of samples of the chunks.
+    n_jobs : int or None
+        Number of threads, all the cores if None.
+    """
+    def __init__(self, oracle, chunk_size, n_jobs=None):
+        self.oracle = oracle
+        self.chunk_size = chunk_size
+        self.n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+
+    def __getattr__(self, name):
+        if name == 'oracle':
+            raise AttributeError(name)
+        return getattr(self.oracle, name)
+
+    def get_chunks(self, idx):
+        """Chunks of the batch idx and their weights, or None if the batch is
+        not chunked."""
+        if not isinstance(idx, slice):
+            return None
+        start, stop, _ = idx.indices(self.oracle.n_samples)
+        if stop - start <= self.chunk_size:
+            return None
+        chunks = [
+            slice(chunk_start, min(chunk_start + self.chunk_size, stop))
+            for chunk_start in range(start, stop, self.chunk_size)
+        ]
+        weights = [(c.stop - c.start) / (stop - start) for c in chunks]
+        return chunks, weights
+
+    def map(self, method, chunks, *args, **kwargs):
+        """Results of `method(*args, chunk, **kwargs)` for all the chunks.
+
+        The threads only live for the call, so that no idle pool is left
+        behind by the oracles of the previous runs.
+        """
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            return list(executor.map(
+                lambda chunk: method(*args, chunk, **kwargs), chunks
+            ))
+
+    def grad_sparse(self, inner_var, outer_var, idx, out=None):
+        batches = self.get_chunks(idx)
+        if batches is None:
+            return self.oracle.grad_sparse(inner_var, outer_var, idx, out=out)
+        chunks, weights = batches
+        results = self.map(
+            self.oracle.grad_sparse, chunks, inner_var, outer_var
+        )
+        grad_inner = _weighted_sum(weights, [res[0] for res in results], out)
+        grad_outer = _weighted_sum_sparse(
+            weights, [res[1] for res in results], outer_var
+        )
+        return grad_inner, grad_outer
+
+    def oracles_sparse(self, inner_var, outer_var, v, idx, inverse='id',
+                       out=None):
+        batches = self.get_chunks(idx)
+        if batches is None:
+            return self.oracle.oracles_sparse(
+                inner_var, outer_var, v, idx, inverse=inverse, out=out
+            )
+        chunks, weights = batches
+        results = self.map(
+            self.oracle.oracles_sparse, chunks, inner_var, outer_var, v,
+            inverse=inverse
+        )
+        val = sum(w * res[0] for w, res in zip(weights, results))
+        grad = _weighted_sum(
+            weights, [res[1] for res in results],
+            None if out is None else out[0]
+        )
+        hvp = _weighted_sum(
+            weights, [res[2] for res in results],
+            None if out is None else out[1]
+        )
+        cross_v = _weighted_sum_sparse(
+            weights, [res[3] for res in results], outer_var
+        )
+        return val, grad, hvp, cross_v
+
+
+def _weighted_sum(weights, arrays, out=None):
+    """Sum of the arrays weighted by weights, written in out if given."""
+    if out is None:
+        out = np.zeros_like(arrays[0])
+    else:
+        out[:] = 0
+    for weight, array in zip(weights, arrays):
+        out += weight * array
+    return out
+
+
+def _weighted_sum_sparse(weights, sparse_arrays, outer_var):
+    """Weighted sum of `(outer_idx, values)` gradients in outer_var, as a
+    dense `(outer_idx, values)` gradient."""
+    res = np.zeros_like(outer_var)
+    for weight, (outer_idx, values) in zip(weights, sparse_arrays):
+        res[outer_idx] += weight * values
+    return slice(0, res.shape[0]), res
+
+
+def get_chunked_oracle_jax(jax_oracle, batch_size, chunk_size):
+    """Jax oracle on batches of batch_size samples evaluated by chunks.
+
+    jax_oracle is a jax oracle with a static `batch_size` argument. The
+    returned oracle `f(inner_var, outer_var, start=0)` is the mean of
+    jax_oracle on the chunks of chunk_size samples of the batch starting at
+    start, computed with `jax.lax.scan` and a last call on the remaining
+    samples. The chunks are rematerialized with `jax.checkpoint` when
+    differentiating, so that the intermediate arrays of only one chunk are
+    stored, even for the hvp and cross derivatives. Unlike the batches of the
+    jax oracles, the chunks are not shifted to fit in the samples, so it
+    should be used on full batches.
+
+    If chunk_size is None or not smaller than batch_size, the batches are
+    not chunked and `jax_oracle` is returned with its batch size bound.
+    """
+    if chunk_size is None or batch_size <= chunk_size:
+        return partial(jax_oracle, batch_size=batch_size)
+    n_chunks, remainder = divmod(batch_size, chunk_size)
+    chunk_oracle = jax.checkpoint(partial(jax_oracle, batch_size=chunk_size))
+
+    def chunked_oracle(inner_var, outer_var, start=0):
+        def add_chunk(value, chunk_start):
+            value += chunk_size * chunk_oracle(
+                inner_var, outer_var, chunk_start
+            )
+            return value, None
+
+        value, _ = jax.lax.scan(
+            add_chunk, jnp.zeros((), jnp.result_type(inner_var)),
+            start + chunk_size * jnp.arange(n_chunks)
+        )
+        if remainder > 0:
+            value += remainder * jax_oracle(
+                inner_var, outer_var, start + n_chunks * chunk_size,
+                batch_size=remainder
+            )
+        return value / batch_size
+
+    return chunked_oracle
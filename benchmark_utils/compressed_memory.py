@@ -0,0 +1,222 @@
+import numpy as np
+from numba import int64, float64, boolean
+
+import jax
+import jax.numpy as jnp
+
+
+# Number of levels on each side of zero of the quantized tables
+QUANTIZATION_LEVELS = {'int8': 127}
+
+
+def get_spec(table_dtype):
+    """Specifications of the numba class for the numba type of the table."""
+    return [
+        ('table', table_dtype[:, :]),
+        ('scale', float64[:]),
+        ('mean', float64[:]),
+        ('levels', int64),
+        ('block', boolean),
+    ]
+
+
+class CompressedMemory():
+    """Variance reduction memory storing its entries in low precision.
+
+    The memory of SABA stores the last gradient computed on each batch and
+    their running mean. Here, the entries are stored in `table` in a low
+    precision floating dtype, or quantized in integers with one scale per
+    entry, while the running mean is kept in float64. The mean is updated with
+    the change of the *stored* entries, so that it stays the mean of the table
+    and no rounding error accumulates along the iterations.
+
+    With the block layout, used when the gradients of each batch are zero
+    outside of a block of coordinates, e.g. for per-sample outer variables,
+    an entry only stores the block of its batch in the first columns of the
+    table. The memory is then of the size of the variable instead of growing
+    with the number of batches.
+
+    Like `MinibatchSampler`, it is used as is with numpy and compiled with
+    `jitclass(CompressedMemory, get_spec(dtype))` with numba.
+
+    Usage
+    -----
+    >>> memory = init_compressed_memory(n_batches, size, 'int8')
+    >>> diff, change = memory.swap(idx, var_idx, grad)
+    >>> direction = diff + memory.mean
+    >>> memory.mean[var_idx] += weight * change
+
+    Parameters
+    ----------
+    table : ndarray, shape (n_batches, size)
+        Entries of the memory, in the storage dtype.
+    scale : ndarray, shape (n_batches,)
+        Scale of each entry, equal to one for floating tables.
+    mean : ndarray, shape (size,)
+        Running mean of the entries, in float64.
+    levels : int
+        Number of levels on each side of zero of a quantized table, 0 for
+        floating tables.
+    block : bool
+        Whether the table has the block layout, with shape
+        (n_batches, block_size).
+    """
+    def __init__(self, table, scale, mean, levels, block):
+        self.table = table
+        self.scale = scale
+        self.mean = mean
+        self.levels = levels
+        self.block = block
+
+    def columns(self, var_idx):
+        """Columns of the table storing the coordinates var_idx of an
+        entry."""
+        if self.block:
+            start, stop, _ = var_idx.indices(self.mean.shape[0])
+            return slice(0, stop - start)
+        return var_idx
+
+    def load(self, idx, var_idx):
+        """Entry of the batch idx on the coordinates var_idx, in float64."""
+        return (
+            self.table[idx, self.columns(var_idx)].astype(np.float64)
+            * self.scale[idx]
+        )
+
+    def swap(self, idx, var_idx, values):
+        """Store values as the entry of the batch idx on var_idx.
+
+        Returns `values - old` and `new - old`, where `old` and `new` are the
+        entries before and after the update. The first one is the correction
+        of the variance reduced direction and the second one the change of the
+        mean, up to the weight of the batch.
+
+        With a quantized table, the scale is shared by the whole entry, so the
+        entry must be zero outside of var_idx. This is the case in SABA, where
+        a batch always updates the same coordinates.
+        """
+        old = self.load(idx, var_idx)
+        columns = self.columns(var_idx)
+        if self.levels > 0:
+            amax = np.max(np.abs(values)) if values.shape[0] > 0 else 0.
+            scale = amax / self.levels if amax > 0 else 1.
+            self.scale[idx] = scale
+            self.table[idx, columns] = np.round(values / scale)
+        else:
+            self.table[idx, columns] = values
+        return values - old, self.load(idx, var_idx) - old
+
+
+def init_compressed_memory(n_batches, size, dtype, memory_class=None,
+                           block_size=None):
+    """Empty `CompressedMemory` with n_batches entries of the given size.
+
+    dtype is the name of the storage dtype and memory_class the class to
+    instantiate, e.g. the jitclass compiled for this dtype. If block_size is
+    not None, the memory has the block layout.
+    """
+    if memory_class is None:
+        memory_class = CompressedMemory
+    width = size if block_size is None else min(block_size, size)
+    return memory_class(
+        np.zeros((n_batches, width), get_numpy_dtype(dtype)),
+        np.ones(n_batches), np.zeros(size), QUANTIZATION_LEVELS.get(dtype, 0),
+        block_size is not None
+    )
+
+
+def get_numpy_dtype(dtype):
+    """Numpy dtype of a storage dtype name, bfloat16 being provided by jax."""
+    if dtype == 'bfloat16':
+        return jnp.bfloat16
+    return np.dtype(dtype)
+
+
+def init_compressed_memory_jax(n_batches, size, dtype, block_size=None):
+    """Jax version of `init_compressed_memory`, as a dict of arrays.
+
+    The mean is kept in the default floating dtype of jax. The layout is given
+    by the shape of the table, see `update_compressed_memory_jax`.
+    """
+    width = size if block_size is None else min(block_size, size)
+    return dict(
+        table=jnp.zeros((n_batches, width), get_numpy_dtype(dtype)),
+        scale=jnp.ones(n_batches),
+        mean=jnp.zeros(size),
+    )
+
+
+def swap_compressed_memory_jax(memory, idx, values):
+    """Jax version of `CompressedMemory.swap` on all the coordinates.
+
+    Returns the updated memory, `values - old` and `new - old`.
+    """
+    table, scale = memory['table'], memory['scale']
+    old = table[idx].astype(values.dtype) * scale[idx]
+    levels = QUANTIZATION_LEVELS.get(table.dtype.name, 0)
+    if levels > 0:
+        amax = jnp.max(jnp.abs(values), initial=0.)
+        new_scale = jnp.where(amax > 0, amax / levels, 1.)
+        new = jnp.round(values / new_scale).astype(table.dtype)
+    else:
+        new_scale, new = 1., values.astype(table.dtype)
+    memory = dict(
+        memory,
+        table=table.at[idx].set(new),
+        scale=scale.at[idx].set(new_scale),
+    )
+    return memory, values - old, new.astype(values.dtype) * new_scale - old
+
+
+def update_compressed_memory_jax(memory, grad, idx, weigth, start):
+    """Store grad as the entry of the batch idx and return the updated memory
+    and the variance reduced direction.
+
+    If the table is narrower than grad, the memory has the block layout and
+    only the block of grad starting at start is stored. `dynamic_slice` clips
+    start like for the batches of the jax oracles.
+    """
+    mean = memory['mean']
+    block_size = memory['table'].shape[1]
+    if block_size == grad.shape[0]:
+        memory, correction, change = swap_compressed_memory_jax(
+            memory, idx, grad
+        )
+        return dict(memory, mean=mean + weigth * change), correction + mean
+    values = jax.lax.dynamic_slice(grad, (start,), (block_size,))
+    memory, correction, change = swap_compressed_memory_jax(
+        memory, idx, values
+    )
+    mean_block = jax.lax.dynamic_slice(mean, (start,), (block_size,))
+    direction = jax.lax.dynamic_update_slice(
+        mean, mean_block + correction, (start,)
+    )
+    mean = jax.lax.dynamic_update_slice(
+        mean, mean_block + weigth * change, (start,)
+    )
+    return dict(memory, mean=mean), direction
+
+
+def fill_compressed_memory_jax(memory, rows, weights, starts):
+    """Store rows as the entries of all the batches and set the mean.
+
+    With the block layout, rows are the blocks of the batches, which start at
+    the samples starts, clipped like in `update_compressed_memory_jax`.
+    """
+    table, mean = memory['table'], memory['mean']
+    levels = QUANTIZATION_LEVELS.get(table.dtype.name, 0)
+    if levels > 0:
+        amax = jnp.max(jnp.abs(rows), axis=1, initial=0.)
+        scale = jnp.where(amax > 0, amax / levels, 1.)
+        table = jnp.round(rows / scale[:, None]).astype(table.dtype)
+    else:
+        scale, table = jnp.ones(rows.shape[0]), rows.astype(table.dtype)
+    stored = table.astype(rows.dtype) * scale[:, None]
+    block_size = table.shape[1]
+    if block_size == mean.shape[0]:
+        mean = weights @ stored
+    else:
+        starts = jnp.minimum(starts, mean.shape[0] - block_size)
+        columns = starts[:, None] + jnp.arange(block_size)
+        mean = jnp.zeros_like(mean).at[columns].add(weights[:, None] * stored)
+    return dict(memory, table=table, scale=scale, mean=mean)
@@ -0,0 +1,58 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+
+CACHE_DIR = Path(__file__).parent.parent / "datasets" / "data" / "cache"
+
+
+def get_cache_key(name, params):
+    """Name of the cache directory of a dataset for given parameters."""
+    params = ','.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return f'{name}[{params}]'
+
+
+def load_splits(name, params, get_splits, cache_dir=CACHE_DIR):
+    """Load the preprocessed splits of a dataset, computing them if needed.
+
+    The arrays returned by `get_splits` are stored as `.npy` files in a
+    directory keyed by the dataset name and `params`, and are loaded as read
+    only memory maps. The directory is written under a temporary name and
+    renamed once complete, so that concurrent benchmark processes never see a
+    partial cache.
+
+    Parameters
+    ----------
+    name : str
+        Name of the dataset.
+    params : dict
+        Parameters of the dataset that change the splits, such as the
+        `random_state`.
+    get_splits : callable
+        Function without argument returning a dict of arrays, e.g. with keys
+        `X_train`, `y_train`, `X_val`...
+    cache_dir : Path
+        Root directory of the cache.
+
+    Returns
+    -------
+    splits : dict
+        The arrays of `get_splits`, as read only memory maps.
+    """
+    path = Path(cache_dir) / get_cache_key(name, params)
+    if not path.exists():
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        for key, array in get_splits().items():
+            np.save(tmp_path / f'{key}.npy', np.ascontiguousarray(array))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process wrote the cache in the meantime.
+            shutil.rmtree(tmp_path)
+
+    return {
+        f.stem: np.load(f, mmap_mode='r') for f in sorted(path.glob('*.npy'))
+    }
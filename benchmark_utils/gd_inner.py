@@ -16,6 +16,23 @@ def gd_inner(inner_oracle, inner_var, outer_var, step_size,
     return inner_var
 
 
+def gd_inner_stack(inner_oracle, inner_vars, outer_vars, step_size,
+                   n_steps=1):
+    """
+    Implement gradient descent on the inner oracle for the inner variables
+    inner_vars, stacked as rows, each one with the outer variable in the same
+    row of outer_vars. The gradients of all the rows are computed together at
+    each step with `inner_oracle.grad_inner_var_stack`.
+    """
+    for i in range(n_steps):
+        grad_inner = inner_oracle.grad_inner_var_stack(
+            inner_vars, outer_vars, slice(None)
+        )
+        inner_vars -= step_size * grad_inner
+
+    return inner_vars
+
+
 @partial(jax.jit, static_argnums=(0, ), static_argnames=('n_steps'))
 def gd_inner_jax(grad_inner, inner_var, outer_var, step_size,
                  n_steps=1):
@@ -16,7 +16,8 @@ def hia(inner_oracle, inner_var, outer_var, v, step_size, n_steps=1,
         inner_slice, _ = sampler.get_batch()
         hvp = inner_oracle.hvp(inner_var, outer_var, v, inner_slice)
         v -= step_size * hvp
-    return n_steps * step_size * v
+    v *= n_steps * step_size
+    return v
 
 
 @partial(jax.jit, static_argnames=('sampler', 'n_steps', 'grad_inner'))
@@ -60,7 +61,8 @@ def shia(
         hvp = inner_oracle.hvp(inner_var, outer_var, v, inner_slice)
         v -= step_size * hvp
         s += v
-    return step_size * s
+    s *= step_size
+    return s
 
 
 @partial(jax.jit, static_argnames=('sampler', 'n_steps', 'grad_inner'))
@@ -106,7 +108,8 @@ def shia_fb(
         hvp = inner_oracle.hvp(inner_var, outer_var, v, inner_slice)
         v -= step_size * hvp
         s += v
-    return step_size * s
+    s *= step_size
+    return s
 
 
 @partial(jax.jit, static_argnames=('n_steps', 'grad_inner'))
@@ -198,7 +201,9 @@ def joint_shia(
         )
         v_old -= step_size * hvp_old
         s_old += v_old
-    return step_size * s, step_size * s_old
+    s *= step_size
+    s_old *= step_size
+    return s, s_old
 
 
 @partial(jax.jit, static_argnames=('sampler', 'n_steps', 'grad_inner'))
@@ -260,7 +265,9 @@ def joint_hia(inner_oracle, inner_var, outer_var, v,
             inner_var_old, outer_var_old, v_old, inner_slice
         )
         v_old -= step_size * hvp_old
-    return n_steps * step_size * v, n_steps * step_size * v_old
+    v *= n_steps * step_size
+    v_old *= n_steps * step_size
+    return v, v_old
 
 
 @partial(jax.jit, static_argnames=('sampler', 'n_steps', 'grad_inner'))
@@ -0,0 +1,57 @@
+import os
+import csv
+import time
+from pathlib import Path
+
+import jax
+
+
+# Project-local directory of the compiled jax functions, next to the joblib
+# cache of benchopt.
+JAX_CACHE_DIR = Path(__file__).parent.parent / "__cache__" / "jax"
+
+# Environment variable with the csv file where the compile times of the
+# solvers are appended. They are not logged if it is not set.
+COMPILE_TIMES_ENV = "BENCHMARK_COMPILE_TIMES"
+
+
+def enable_compilation_cache(cache_dir=JAX_CACHE_DIR):
+    """Enable the persistent compilation cache of jax in cache_dir.
+
+    The functions compiled by jax are written in cache_dir and loaded from
+    it by the next processes compiling them for the same shapes and
+    arguments, instead of being compiled again for each run of the
+    benchmark. All the functions are cached, whatever their compile time.
+    """
+    jax.config.update('jax_compilation_cache_dir', str(cache_dir))
+    jax.config.update('jax_persistent_cache_min_compile_time_secs', 0)
+    jax.config.update('jax_persistent_cache_min_entry_size_bytes', 0)
+
+
+def timed_run_once(solver, stop_val=2, log_file=None):
+    """Call `solver.run_once(stop_val)`, which compiles the jax or numba
+    functions of the solver, and record its duration.
+
+    For the jax solvers, the persistent compilation cache is enabled first
+    so that the compiled functions are shared by all the runs.
+
+    The duration is stored in `solver.compile_time` and appended to log_file
+    as a csv row `solver,compile_time`, where solver is the name of the
+    solver with its parameters. If log_file is None, it is read from the
+    environment variable BENCHMARK_COMPILE_TIMES and nothing is logged if it
+    is not set. The benchmark results only contain the time of the runs
+    after the compilation.
+    """
+    if getattr(solver, 'framework', 'jax') == 'jax':
+        enable_compilation_cache()
+    if log_file is None:
+        log_file = os.environ.get(COMPILE_TIMES_ENV)
+    t_start = time.perf_counter()
+    solver.run_once(stop_val)
+    solver.compile_time = time.perf_counter() - t_start
+    if log_file is not None:
+        log_file = Path(log_file)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_file, 'a', newline='') as f:
+            csv.writer(f).writerow([str(solver), solver.compile_time])
+    return solver.compile_time
@@ -52,13 +52,17 @@ class MinibatchSampler():
 
     def get_batch(self):
         idx = self.batch_order[self.i_batch]
-        selector = slice(idx * self.batch_size,
-                         (idx + 1) * self.batch_size)
         self.i_batch += 1
         if self.i_batch == self.n_batches:
             np.random.shuffle(self.batch_order)
             self.i_batch = 0
+        return self.batch_at(idx)
 
+    def batch_at(self, idx):
+        """Selector and `(idx, weight)` of the batch idx, as returned by
+        `get_batch`, without changing the state of the sampler."""
+        selector = slice(idx * self.batch_size,
+                         (idx + 1) * self.batch_size)
         weight = self.batch_size / self.n_samples
         if idx == self.n_batches - 1 and self.n_samples % self.batch_size != 0:
             weight = (self.n_samples % self.batch_size) / self.n_samples
@@ -1,5 +1,58 @@
+from functools import lru_cache
+
 import numpy as np
 from numba import njit
+from numba import float32, float64
+from numba.experimental import jitclass
+
+
+def jitclass_dtypes(get_spec, dtypes=(float64, float32)):
+    """Class decorator compiling a jitclass for each floating dtype.
+
+    `get_spec(dtype)` returns the spec of the class for the numba type dtype.
+    The decorated name is bound to a dict mapping the numpy dtypes to the
+    jitclasses, so that an oracle can pick the one of its data. Each jitclass
+    is only compiled when it is used.
+    """
+    def decorator(cls):
+        return {
+            np.dtype(dtype.name): jitclass(get_spec(dtype))(cls)
+            for dtype in dtypes
+        }
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def _get_njit(func, options):
+    return njit(func, **dict(options))
+
+
+def get_njit(func, **options):
+    """Returns `njit(func, **options)`, created once per process.
+
+    The solvers compile their functions in `set_objective`. Calling `njit`
+    there creates a new dispatcher for each run, which compiles func again.
+    With `get_njit`, the runs of a process share the dispatcher and only
+    compile func for new argument types.
+
+    Use `cache=True` to also cache func on disk, for the other processes.
+    numba only loads the cache for arguments with a stable type, i.e. arrays
+    and scalars, and not for jitclass instances or functions: the types of
+    those depend on the process.
+    """
+    return _get_njit(func, tuple(sorted(options.items())))
+
+
+@lru_cache(maxsize=None)
+def _get_jitclass(cls, spec):
+    return jitclass(cls, list(spec))
+
+
+def get_jitclass(cls, spec):
+    """Returns `jitclass(cls, spec)`, created once per process, so that the
+    runs share its compiled methods and the functions compiled for its
+    instances. See `get_njit`."""
+    return _get_jitclass(cls, tuple(spec))
 
 
 @njit
@@ -7,43 +60,82 @@ def np_apply_along_axis(func1d, axis, arr):
     """Since the argument 'axis' is not available for many numpy functions in
     numba, we can use this workaround found in [1]. Works only for 2d-arrays.
 
+    Not cached on disk, as numba cannot save the type of func1d in the cache.
+    The functions calling it with a fixed func1d can be cached.
+
     [1] https://github.com/numba/numba/issues/1269#issuecomment-472574352"""
     assert arr.ndim == 2
     assert axis in [0, 1]
     if axis == 0:
-        result = np.empty(arr.shape[1])
+        result = np.empty(arr.shape[1], arr.dtype)
         for i in range(len(result)):
             result[i] = func1d(arr[:, i])
     else:
-        result = np.empty(arr.shape[0])
+        result = np.empty(arr.shape[0], arr.dtype)
         for i in range(len(result)):
             result[i] = func1d(arr[i, :])
     return result
 
 
-@njit
+@njit(cache=True)
 def np_max(array, axis=0):
     return np_apply_along_axis(np.max, axis, array)
 
 
-@njit
+@njit(cache=True)
 def np_argmax(array, axis=0):
     return np_apply_along_axis(np.argmax, axis, array)
 
 
-@njit
+@njit(cache=True)
 def np_mean(array, axis=0):
     return np_apply_along_axis(np.mean, axis, array)
 
 
-@njit
+@njit(cache=True)
 def one_hot_fancy_index(M, y, value=1):
     """For a matrix M and a one-hot matrix y, equivalent to the command
     M[y == value].
     """
     assert y.ndim == 2
     n, c = y.shape
-    res = np.empty(n)
+    res = np.empty(n, M.dtype)
     for i in range(n):
         res[i] = M[i][y[i] == value][0]
     return res
+
+
+@njit(cache=True)
+def csr_rows(indptr, idx):
+    """Bounds `(start, stop)` of the rows selected by the slice idx in a CSR
+    matrix. Only contiguous slices, as given by the minibatch samplers, are
+    supported."""
+    start, stop, step = idx.indices(indptr.shape[0] - 1)
+    assert step == 1
+    return start, max(start, stop)
+
+
+@njit(cache=True)
+def csr_matmul(data, indices, indptr, start, stop, w):
+    """Returns `x @ w` for the rows start:stop of a CSR matrix x and w of shape
+    (n_features, k)."""
+    res = np.zeros((stop - start, w.shape[1]), data.dtype)
+    for i in range(start, stop):
+        for jj in range(indptr[i], indptr[i + 1]):
+            j = indices[jj]
+            for k in range(w.shape[1]):
+                res[i - start, k] += data[jj] * w[j, k]
+    return res
+
+
+@njit(cache=True)
+def csr_rmatmul(data, indices, indptr, start, stop, u, out):
+    """Writes `u @ x` in out for the rows start:stop of a CSR matrix x and u of
+    shape (k, stop - start)."""
+    out[:] = 0
+    for i in range(start, stop):
+        for jj in range(indptr[i], indptr[i + 1]):
+            j = indices[jj]
+            for k in range(u.shape[0]):
+                out[k, j] += u[k, i - start] * data[jj]
+    return out
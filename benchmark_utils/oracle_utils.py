@@ -1,7 +1,111 @@
+import inspect
+from functools import wraps, lru_cache
+
+import numpy as np
 import jax.numpy as jnp
+from jax.experimental import sparse as jsparse
+from scipy import sparse
+from sklearn.utils.extmath import safe_sparse_dot
 
 
 def convert_array_framework(x, framework=None):
+    """Convert x to the array type of the framework.
+
+    For the numpy and numba frameworks, x is returned as is, so that
+    memory-mapped arrays are shared between the benchmark processes. Jax
+    arrays are always copied to the device memory, and sparse matrices are
+    converted to a BCOO matrix with `csr_to_bcoo` instead of being densified.
+    """
     if framework == "jax":
+        if sparse.issparse(x):
+            return csr_to_bcoo(x)
         x = jnp.array(x)
     return x
+
+
+def csr_to_bcoo(x):
+    """Convert a sparse matrix to a jax BCOO matrix batched over the rows.
+
+    Each row is padded to the largest number of non-zeros of a row, so that
+    contiguous rows are taken with `bcoo_dynamic_slice` at a cost independent
+    of the total number of non-zeros. `BCOO.update_layout` pads each row to
+    the total number of non-zeros instead.
+    """
+    x = sparse.csr_matrix(x)
+    n_samples, _ = x.shape
+    row_nnz = np.diff(x.indptr)
+    nse = max(row_nnz.max(initial=0), 1)
+    rows = np.repeat(np.arange(n_samples), row_nnz)
+    pos = np.arange(x.nnz) - np.repeat(x.indptr[:-1], row_nnz)
+
+    # Padded entries are zeros in the first column.
+    data = np.zeros((n_samples, nse), dtype=x.dtype)
+    indices = np.zeros((n_samples, nse, 1), dtype=np.int32)
+    data[rows, pos] = x.data
+    indices[rows, pos, 0] = x.indices
+    return jsparse.BCOO(
+        (jnp.array(data), jnp.array(indices)), shape=x.shape
+    )
+
+
+def dot_out(a, b, out=None):
+    """Returns `a @ b`, written in out if given.
+
+    The product is computed in place for dense arrays, and copied in out
+    when a or b is a sparse matrix.
+    """
+    if out is None:
+        return safe_sparse_dot(a, b)
+    if sparse.issparse(a) or sparse.issparse(b):
+        out[:] = safe_sparse_dot(a, b)
+    else:
+        np.dot(a, b, out=out)
+    return out
+
+
+def memoize_oracle(get_oracle):
+    """Memoize a dataset oracle getter on its arguments, such as `framework`,
+    `get_full_batch` and `dtype`.
+
+    The arguments are completed with the defaults of get_oracle, so that
+    `get_oracle()` and `get_oracle(dtype="float64")` share the same oracle
+    when the default dtype is float64. The oracle is built, and its data
+    converted to the framework, only once per process. The cached oracles are
+    shared by all the callers, so they should not be modified in place.
+    """
+    cache = {}
+    signature = inspect.signature(get_oracle)
+
+    @wraps(get_oracle)
+    def get_oracle_memoized(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(sorted(bound.arguments.items()))
+        if key not in cache:
+            cache[key] = get_oracle(*bound.args, **bound.kwargs)
+        return cache[key]
+
+    return get_oracle_memoized
+
+
+def array_lru_cache(maxsize=128):
+    """LRU cache for a function of a single array, keyed on its bytes.
+
+    The array given to the function is read-only and the results are shared
+    between the calls, so they should not be modified in place.
+    """
+    def decorator(func):
+        @lru_cache(maxsize=maxsize)
+        def cached_func(key):
+            data, dtype, shape = key
+            return func(np.frombuffer(data, dtype=dtype).reshape(shape))
+
+        @wraps(func)
+        def wrapper(x):
+            x = np.asarray(x)
+            return cached_func((x.tobytes(), x.dtype.str, x.shape))
+
+        wrapper.cache_info = cached_func.cache_info
+        return wrapper
+
+    return decorator
@@ -38,6 +38,12 @@ class BaseOracle(ABC):
       variable) at inner_var and outer_var estimated on the indices contained
       in idx and a vector v.
 
+    The fused methods `grad` and `oracles` accept an optional `out` buffer,
+    so that the solvers do not allocate new arrays at each iteration. It is
+    an array of shape `(n_inner,)` for `grad` and `(2, n_inner)` for
+    `oracles`, where the gradient and the hvp are written. The returned
+    arrays are then views on `out`.
+
     Note that the batch size should be defined in __init__.
     """
     # Shape of the variable for the considered problem
@@ -70,15 +76,18 @@ class BaseOracle(ABC):
     def inverse_hvp(self, inner_var, outer_var, v, idx, approx='cg'):
         pass
 
-    def grad(self, inner_var, outer_var, idx):
-        return self.grad_inner_var(inner_var, outer_var, idx), \
-            self.grad_outer_var(inner_var, outer_var, idx)
+    def grad(self, inner_var, outer_var, idx, out=None):
+        grad_inner = self.grad_inner_var(inner_var, outer_var, idx)
+        if out is not None:
+            out[:] = grad_inner
+            grad_inner = out
+        return grad_inner, self.grad_outer_var(inner_var, outer_var, idx)
 
     def prox(self, inner_var, outer_var):
         "Prox function for the inner and outer_var."
         return inner_var, outer_var
 
-    def oracles(self, inner_var, outer_var, v, idx, inverse='id'):
+    def oracles(self, inner_var, outer_var, v, idx, inverse='id', out=None):
         """Compute all the quantities together on the same batch."""
         val = self.value(inner_var, outer_var, idx)
         grad = self.grad_inner_var(inner_var, outer_var, idx)
@@ -87,11 +96,87 @@ class BaseOracle(ABC):
             inner_var, outer_var, v, idx, approx=inverse
         )
         implicit_grad = self.cross(inner_var, outer_var, inv_hvp, idx)
+        if out is not None:
+            out[0], out[1] = grad, hvp
+            grad, hvp = out[0], out[1]
         return val, grad, hvp, implicit_grad
 
-    def inner_var_star(self, outer_var, idx):
+    def grad_sparse(self, inner_var, outer_var, idx, out=None):
+        """Same as `grad`, with the gradient with respect to outer_var
+        returned as `(outer_idx, values)`: it is equal to `values` on
+        `outer_var[outer_idx]` and to zero elsewhere.
+
+        Oracles whose outer variable has one entry per sample override it
+        to only compute the entries of the batch.
+        """
+        grad_inner, grad_outer = self.grad(inner_var, outer_var, idx, out=out)
+        return grad_inner, (slice(0, grad_outer.shape[0]), grad_outer)
+
+    def oracles_sparse(self, inner_var, outer_var, v, idx, inverse='id',
+                       out=None):
+        """Same as `oracles`, with the cross derivatives product returned as
+        `(outer_idx, values)`, see `grad_sparse`."""
+        val, grad, hvp, implicit_grad = self.oracles(
+            inner_var, outer_var, v, idx, inverse=inverse, out=out
+        )
+        return val, grad, hvp, (
+            slice(0, implicit_grad.shape[0]), implicit_grad
+        )
+
+    def grad_inner_var_stack(self, inner_vars, outer_vars, idx):
+        """Returns the gradients with respect to inner_var at the rows of
+        inner_vars and outer_vars on the same batch idx, as the rows of an
+        array.
+
+        It is used to run several gradient descents on the inner problem
+        together, e.g. in PZOBO. Oracles override it to read the batch once
+        and compute all the gradients with stacked products.
+        """
+        return np.stack([
+            self.grad_inner_var(inner_var, outer_var, idx)
+            for inner_var, outer_var in zip(inner_vars, outer_vars)
+        ])
+
+    def grad_pair(self, inner_var, inner_var_old, outer_var, outer_var_old,
+                  idx):
+        """Returns `grad_sparse` at (inner_var, outer_var) and at
+        (inner_var_old, outer_var_old) on the same batch idx.
+
+        The variance reduced solvers evaluate the oracles at the current and
+        the previous iterates on the same batch. Oracles override it to read
+        the batch once and compute both points with stacked products.
+        """
+        return (self.grad_sparse(inner_var, outer_var, idx),
+                self.grad_sparse(inner_var_old, outer_var_old, idx))
+
+    def oracles_pair(self, inner_var, inner_var_old, outer_var,
+                     outer_var_old, v, v_old, idx):
+        """Returns `oracles_sparse` with inverse='id' at (inner_var,
+        outer_var, v) and at (inner_var_old, outer_var_old, v_old) on the same
+        batch idx, see `grad_pair`."""
+        return (
+            self.oracles_sparse(inner_var, outer_var, v, idx),
+            self.oracles_sparse(inner_var_old, outer_var_old, v_old, idx),
+        )
+
+    def get_outer_block_size(self, batch_size):
+        """Size of the block of outer_var where the gradients in outer_var
+        of a batch of batch_size samples are non zero, or None if they are
+        dense.
+
+        The gradients of the batch starting at sample `start` are zero outside
+        of `outer_var[start:start + block_size]`, so that the memories of the
+        variance reduced solvers only store this block for each batch.
+        """
+        return None
+
+    def inner_var_star(self, outer_var, idx, inner_var0=None):
+        """Minimize the function in inner_var with L-BFGS, starting from
+        inner_var0 if given and from zero otherwise."""
         inner_shape, outer_shape = self.variables_shape
         var_shape_flat = np.prod(inner_shape)
+        if inner_var0 is None:
+            inner_var0 = np.zeros(var_shape_flat)
 
         def func(inner_var):
             inner_var = inner_var.reshape(*inner_shape)
@@ -102,7 +187,7 @@ class BaseOracle(ABC):
             return self.grad_inner_var(inner_var, outer_var, idx)
 
         inner_var_star, _, d = fmin_l_bfgs_b(
-            func, np.zeros(var_shape_flat), fprime=fprime, maxls=30
+            func, np.ravel(inner_var0), fprime=fprime, maxls=30
         )
 
         if d['warnflag'] != 0:
@@ -5,7 +5,22 @@ from scipy import sparse
 import scipy.special as sc
 from scipy.sparse import linalg as splinalg
 
+from numba import njit
+from numba import int64, types
+
 from .base import BaseOracle
+from .special import expit_njit
+from .special import logsumexp as logsumexp_njit
+from .special import softmax as softmax_njit
+from .special import softmax_hvp as softmax_hvp_njit
+from .special import my_softmax_and_logsumexp as softmax_and_logsumexp_njit
+
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    from benchmark_utils.numba_utils import one_hot_fancy_index
+    from benchmark_utils.numba_utils import jitclass_dtypes
+    from benchmark_utils.oracle_utils import dot_out
 
 import warnings
 
@@ -72,6 +87,325 @@ def jax_loss(theta, lmbda, X, y):
     return jnp.mean(batched_loss(theta, lmbda, X, y), axis=0)
 
 
+@njit(cache=True)
+def datacleaning_oracle_njit(X, Y, theta, Lbda, v, idx, out):
+    """Fused oracles of the datacleaning loss on the batch idx.
+
+    The gradient with respect to Lbda and the cross derivatives product with
+    v are non-zero only on idx, so only their entries on idx are returned.
+    The gradient and the hvp in theta are written in the rows of out.
+    """
+    x = X[idx]
+    y = Y[idx]
+    lbda = Lbda[idx]
+    n_samples = x.shape[0]
+    prod = x @ theta
+    Y_proba, lse = softmax_and_logsumexp_njit(prod)
+    weights = expit_njit(lbda)
+    individual_losses = -one_hot_fancy_index(prod, y) + lse
+    loss = (individual_losses * weights).sum() / n_samples
+    residuals = Y_proba - y
+    grad_theta = out[0].reshape(theta.shape)
+    np.dot(x.T, residuals * weights.reshape(-1, 1), grad_theta)
+    grad_theta /= n_samples
+    d_weights = weights - weights ** 2
+    grad_lbda = d_weights * individual_losses / n_samples
+    xv = x @ v
+    hvp = out[1].reshape(theta.shape)
+    np.dot(x.T, softmax_hvp_njit(Y_proba, xv) * weights.reshape(-1, 1), hvp)
+    hvp /= n_samples
+    jvp = d_weights * np.sum(residuals * xv, axis=1) / n_samples
+    return loss, grad_theta, grad_lbda, hvp, jvp
+
+
+def get_spec(dtype):
+    """Spec of the numba oracle for data of the numba type dtype."""
+    return [
+        # X is read-only so that memory-mapped data can be used without copy
+        ('X', types.Array(dtype, 2, 'C', readonly=True)),
+        ('y', dtype[:, ::1]),
+        ('reg', dtype),
+        ('n_samples', int64),
+        ('n_features', int64),
+        ('n_classes', int64),
+        ("variables_shape", int64[:, ::1])
+    ]
+
+
+@jitclass_dtypes(get_spec)
+class DataCleaningOracleNumba():
+    """Numba class defining the oracles for datacleaning.
+
+    Parameters
+    ----------
+    X : ndarray, shape (n_samples, n_features)
+        Input data for the model.
+    y : ndarray, shape (n_samples, n_classes)
+        One hot encoded targets.
+    reg : float
+        Regularization parameter.
+    """
+    def __init__(self, X, y, reg=2e-1):
+
+        self.X = X
+        self.y = y
+        self.reg = reg
+
+        # attributes
+        self.n_samples = X.shape[0]
+        self.n_features = X.shape[1]
+        self.n_classes = y.shape[1]
+        self.variables_shape = np.array(
+            [[self.n_features * self.n_classes], [self.n_samples]]
+        )
+
+    def set_order(self, idx):
+        self.X = self.X[idx]
+        self.y = self.y[idx]
+
+    def value(self, theta_flat, lmbda, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        lbda = lmbda[idx]
+        prod = x @ theta
+        weights = expit_njit(lbda)
+        individual_losses = (
+            -one_hot_fancy_index(prod, y) + logsumexp_njit(prod)
+        )
+        regul = self.reg * np.dot(theta_flat, theta_flat)
+        return (individual_losses * weights).sum() / n_samples + regul
+
+    def grad_inner_var(self, theta_flat, lmbda, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        y = self.y[idx]
+        lbda = lmbda[idx]
+        n_samples = x.shape[0]
+        Y_proba = softmax_njit(x @ theta)
+        weights = expit_njit(lbda)
+        grad_theta = x.T @ (
+            (Y_proba - y) * weights.reshape(-1, 1)
+        ) / n_samples
+        return grad_theta.ravel() + 2 * (self.reg * theta_flat)
+
+    def grad_outer_var(self, theta_flat, lmbda, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        y = self.y[idx]
+        lbda = lmbda[idx]
+        grad_lbda = np.zeros_like(lmbda)
+        n_samples = x.shape[0]
+        prod = x @ theta
+        weights = expit_njit(lbda)
+        individual_losses = (
+            -one_hot_fancy_index(prod, y) + logsumexp_njit(prod)
+        )
+        d_weights = weights - weights ** 2
+        grad_lbda[idx] = d_weights * individual_losses / n_samples
+        return grad_lbda
+
+    def grad(self, theta_flat, lmbda, idx, out=None):
+        grad_theta, (idx, grad_lbda_batch) = self.grad_sparse(
+            theta_flat, lmbda, idx, out
+        )
+        grad_lbda = np.zeros_like(lmbda)
+        grad_lbda[idx] = grad_lbda_batch
+        return grad_theta, grad_lbda
+
+    def grad_sparse(self, theta_flat, lmbda, idx, out=None):
+        """Returns the gradients, with the one with respect to lmbda as
+        `(idx, values)` since it is zero outside of the batch."""
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty(self.n_features * self.n_classes, self.X.dtype)
+        x = self.X[idx]
+        y = self.y[idx]
+        lbda = lmbda[idx]
+        n_samples = x.shape[0]
+        prod = x @ theta
+        Y_proba, lse = softmax_and_logsumexp_njit(prod)
+        weights = expit_njit(lbda)
+        individual_losses = -one_hot_fancy_index(prod, y) + lse
+        grad_theta = out.reshape(self.n_features, self.n_classes)
+        np.dot(x.T, (Y_proba - y) * weights.reshape(-1, 1), grad_theta)
+        grad_theta /= n_samples
+        out += 2 * (self.reg * theta_flat)
+        d_weights = weights - weights ** 2
+        grad_lbda = d_weights * individual_losses / n_samples
+        return out, (idx, grad_lbda)
+
+    def cross(self, theta_flat, lmbda, v_flat, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        v = v_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        y = self.y[idx]
+        lbda = lmbda[idx]
+        jvp = np.zeros_like(lmbda)
+        n_samples = x.shape[0]
+        Y_proba = softmax_njit(x @ theta)
+        weights = expit_njit(lbda)
+        d_weights = weights - weights ** 2
+        xv = x @ v
+        jvp[idx] = d_weights * np.sum((Y_proba - y) * xv, axis=1) / n_samples
+        return jvp
+
+    def hvp(self, theta_flat, lmbda, v_flat, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        v = v_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        lbda = lmbda[idx]
+        n_samples = x.shape[0]
+        Y_proba = softmax_njit(x @ theta)
+        weights = expit_njit(lbda)
+        xv = x @ v
+        hvp = x.T @ (
+            softmax_hvp_njit(Y_proba, xv) * weights.reshape(-1, 1)
+        ) / n_samples
+        return hvp.ravel() + 2 * (self.reg * v_flat)
+
+    def prox(self, theta, lmbda):
+        return theta, lmbda
+
+    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse='id',
+                out=None):
+        """Returns the value, the gradient, the hvp and the cross derivatives
+        product with v."""
+        loss, grad, hvp, (idx, jvp_batch) = self.oracles_sparse(
+            theta_flat, lmbda, v_flat, idx, inverse, out
+        )
+        jvp = np.zeros_like(lmbda)
+        jvp[idx] = jvp_batch
+        return loss, grad, hvp, jvp
+
+    def oracles_sparse(self, theta_flat, lmbda, v_flat, idx, inverse='id',
+                       out=None):
+        """Same as `oracles` with the cross derivatives product as
+        `(idx, values)` since it is zero outside of the batch."""
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        v = v_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty((2, self.n_features * self.n_classes), self.X.dtype)
+        loss, _, _, _, jvp = datacleaning_oracle_njit(
+            self.X, self.y, theta, lmbda, v, idx, out
+        )
+        out[0] += 2 * (self.reg * theta_flat)
+        out[1] += 2 * (self.reg * v_flat)
+        return loss, out[0], out[1], (idx, jvp)
+
+    def grad_inner_var_stack(self, thetas_flat, lmbdas, idx):
+        """Same as `grad_inner_var` at the rows of thetas_flat and lmbdas on
+        the same batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        n_points, k = thetas_flat.shape[0], self.n_classes
+        thetas = np.empty((self.n_features, n_points * k), self.X.dtype)
+        for i in range(n_points):
+            thetas[:, i * k:(i + 1) * k] = thetas_flat[i].reshape(
+                self.n_features, k
+            )
+        prod = x @ thetas
+        residuals = np.empty((n_samples, n_points * k), self.X.dtype)
+        for i in range(n_points):
+            Y_proba = softmax_njit(prod[:, i * k:(i + 1) * k])
+            weights = expit_njit(lmbdas[i][idx])
+            residuals[:, i * k:(i + 1) * k] = (
+                (Y_proba - y) * weights.reshape(-1, 1)
+            )
+        grads = x.T @ residuals / n_samples
+        res = np.empty((n_points, self.n_features * k), self.X.dtype)
+        for i in range(n_points):
+            res[i] = np.ascontiguousarray(grads[:, i * k:(i + 1) * k]).ravel()
+        res += 2 * (self.reg * thetas_flat)
+        return res
+
+    def grad_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old, idx):
+        """Same as `grad_sparse` at (theta_flat, lmbda) and (theta_flat_old,
+        lmbda_old) on the same batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        k = self.n_classes
+        thetas = np.empty((self.n_features, 2 * k), self.X.dtype)
+        thetas[:, :k] = theta_flat.reshape(self.n_features, k)
+        thetas[:, k:] = theta_flat_old.reshape(self.n_features, k)
+        lbdas = np.empty((2, n_samples), lmbda.dtype)
+        lbdas[0] = lmbda[idx]
+        lbdas[1] = lmbda_old[idx]
+        prod = x @ thetas
+        residuals = np.empty((n_samples, 2 * k), self.X.dtype)
+        grad_lbda = np.empty((2, n_samples), lmbda.dtype)
+        for j in range(2):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            Y_proba, lse = softmax_and_logsumexp_njit(prod_j)
+            weights = expit_njit(lbdas[j])
+            individual_losses = -one_hot_fancy_index(prod_j, y) + lse
+            residuals[:, j * k:(j + 1) * k] = (
+                (Y_proba - y) * weights.reshape(-1, 1)
+            )
+            d_weights = weights - weights ** 2
+            grad_lbda[j] = d_weights * individual_losses / n_samples
+        grads = x.T @ residuals / n_samples
+        grad = np.ascontiguousarray(grads[:, :k]).ravel()
+        grad += 2 * (self.reg * theta_flat)
+        grad_old = np.ascontiguousarray(grads[:, k:]).ravel()
+        grad_old += 2 * (self.reg * theta_flat_old)
+        return (grad, (idx, grad_lbda[0])), (grad_old, (idx, grad_lbda[1]))
+
+    def oracles_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old,
+                     v_flat, v_flat_old, idx):
+        """Same as `oracles_sparse` with inverse='id' at (theta_flat, lmbda,
+        v_flat) and (theta_flat_old, lmbda_old, v_flat_old) on the same
+        batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        k = self.n_classes
+        params = np.empty((self.n_features, 4 * k), self.X.dtype)
+        params[:, :k] = theta_flat.reshape(self.n_features, k)
+        params[:, k:2 * k] = theta_flat_old.reshape(self.n_features, k)
+        params[:, 2 * k:3 * k] = v_flat.reshape(self.n_features, k)
+        params[:, 3 * k:] = v_flat_old.reshape(self.n_features, k)
+        lbdas = np.empty((2, n_samples), lmbda.dtype)
+        lbdas[0] = lmbda[idx]
+        lbdas[1] = lmbda_old[idx]
+        prod = x @ params
+        losses = np.empty(2, self.X.dtype)
+        jvp = np.empty((2, n_samples), lmbda.dtype)
+        residuals = np.empty((n_samples, 4 * k), self.X.dtype)
+        for j in range(2):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            xv = prod[:, (2 + j) * k:(3 + j) * k]
+            Y_proba, lse = softmax_and_logsumexp_njit(prod_j)
+            weights = expit_njit(lbdas[j])
+            individual_losses = -one_hot_fancy_index(prod_j, y) + lse
+            losses[j] = (individual_losses * weights).sum() / n_samples
+            residuals[:, 2 * j * k:(2 * j + 1) * k] = (
+                (Y_proba - y) * weights.reshape(-1, 1)
+            )
+            residuals[:, (2 * j + 1) * k:(2 * j + 2) * k] = (
+                softmax_hvp_njit(Y_proba, xv) * weights.reshape(-1, 1)
+            )
+            d_weights = weights - weights ** 2
+            jvp[j] = d_weights * np.sum((Y_proba - y) * xv, axis=1)
+            jvp[j] /= n_samples
+        res = x.T @ residuals / n_samples
+        grad = np.ascontiguousarray(res[:, :k]).ravel()
+        grad += 2 * (self.reg * theta_flat)
+        hvp = np.ascontiguousarray(res[:, k:2 * k]).ravel()
+        hvp += 2 * (self.reg * v_flat)
+        grad_old = np.ascontiguousarray(res[:, 2 * k:3 * k]).ravel()
+        grad_old += 2 * (self.reg * theta_flat_old)
+        hvp_old = np.ascontiguousarray(res[:, 3 * k:]).ravel()
+        hvp_old += 2 * (self.reg * v_flat_old)
+        return (
+            (losses[0], grad, hvp, (idx, jvp[0])),
+            (losses[1], grad_old, hvp_old, (idx, jvp[1])),
+        )
+
+
 class DataCleaningOracle(BaseOracle):
     """Class defining the oracles for datacleaning
 
@@ -94,7 +428,7 @@ class DataCleaningOracle(BaseOracle):
 
         # Store info for other
         self.X = X
-        self.y = y.astype(np.float64)
+        self.y = y.astype(X.dtype)
 
         # attributes
         self.n_samples, self.n_features = X.shape
@@ -105,8 +439,16 @@ class DataCleaningOracle(BaseOracle):
         self.reg = reg
 
     def _get_numba_oracle(self):
-        raise NotImplementedError("No Numba implementation for datacleaning  "
-                                  + "oracle available")
+        if sparse.issparse(self.X):
+            raise ValueError("X should not be sparse")
+        # No copy if X is already C-contiguous, e.g. a memory-mapped array.
+        return DataCleaningOracleNumba[self.X.dtype](
+            np.ascontiguousarray(self.X), self.y, self.reg
+        )
+
+    def get_outer_block_size(self, batch_size):
+        # outer_var has one entry per sample
+        return batch_size
 
     def _get_jax_oracle(self, get_full_batch=False):
         if sparse.issparse(self.X):
@@ -171,21 +513,37 @@ class DataCleaningOracle(BaseOracle):
         grad_lbda[idx] = d_weights * individual_losses / n_samples
         return grad_lbda
 
-    def grad(self, theta_flat, lmbda, idx):
+    def grad(self, theta_flat, lmbda, idx, out=None):
+        grad_theta, (idx, grad_lbda_batch) = self.grad_sparse(
+            theta_flat, lmbda, idx, out=out
+        )
+        grad_lbda = np.zeros_like(lmbda)
+        grad_lbda[idx] = grad_lbda_batch
+        return grad_theta, grad_lbda
+
+    def grad_sparse(self, theta_flat, lmbda, idx, out=None):
+        """Returns the gradients, with the one with respect to lmbda as
+        `(idx, values)` since it is zero outside of the batch."""
         theta = theta_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty(self.n_features * self.n_classes, self.X.dtype)
         x = self.X[idx]
         y = self.y[idx]
         lbda = lmbda[idx]
-        grad_lbda = np.zeros_like(lmbda)
         n_samples, n_features = x.shape
         prod = x @ theta
         Y_proba = sc.softmax(prod, axis=1)
         weights = sc.expit(lbda)
         individual_losses = -prod[y == 1] + sc.logsumexp(prod, axis=1)
-        grad_theta = x.T @ ((Y_proba - y) * weights[:, None]) / n_samples
+        grad_theta = dot_out(
+            x.T, (Y_proba - y) * weights[:, None],
+            out=out.reshape(n_features, self.n_classes)
+        )
+        grad_theta /= n_samples
+        out += 2 * self.reg * theta_flat
         d_weights = weights - weights ** 2
-        grad_lbda[idx] = d_weights * individual_losses / n_samples
-        return grad_theta.ravel() + 2 * self.reg * theta_flat, grad_lbda
+        grad_lbda = d_weights * individual_losses / n_samples
+        return out, (idx, grad_lbda)
 
     def cross(self, theta_flat, lmbda, v_flat, idx):
         theta = theta_flat.reshape(self.n_features, self.n_classes)
@@ -254,28 +612,120 @@ class DataCleaningOracle(BaseOracle):
             print("CG did not converge to the desired precision")
         return Hv
 
-    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse="id"):
+    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse="id",
+                out=None):
         """Returns the value, the gradient,"""
+        loss, grad, hvp, (idx, jvp_batch) = self.oracles_sparse(
+            theta_flat, lmbda, v_flat, idx, inverse=inverse, out=out
+        )
+        jvp = np.zeros_like(lmbda)
+        jvp[idx] = jvp_batch
+        return loss, grad, hvp, jvp
+
+    def oracles_sparse(self, theta_flat, lmbda, v_flat, idx, inverse="id",
+                       out=None):
+        """Same as `oracles` with the cross derivatives product as
+        `(idx, values)` since it is zero outside of the batch."""
         theta = theta_flat.reshape(self.n_features, self.n_classes)
         v = v_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty((2, self.n_features * self.n_classes), self.X.dtype)
         x = self.X[idx]
         y = self.y[idx]
         lbda = lmbda[idx]
-        jvp = np.zeros_like(lmbda)
         n_samples, n_features = x.shape
         prod = x @ theta
         Y_proba, lse = my_softmax_and_logsumexp(prod)
         weights = sc.expit(lbda)
         individual_losses = -prod[y == 1] + lse
         loss = (individual_losses * weights).sum() / n_samples
-        grad_theta = x.T @ ((Y_proba - y) * weights[:, None]) / n_samples
+        grad_theta = dot_out(
+            x.T, (Y_proba - y) * weights[:, None],
+            out=out[0].reshape(n_features, self.n_classes)
+        )
+        grad_theta /= n_samples
         d_weights = weights - weights ** 2
         xv = x @ v
-        hvp = x.T @ (softmax_hvp(Y_proba, xv) * weights[:, None]) / n_samples
-        jvp[idx] = d_weights * np.sum((Y_proba - y) * xv, axis=1) / n_samples
+        hvp = dot_out(
+            x.T, softmax_hvp(Y_proba, xv) * weights[:, None],
+            out=out[1].reshape(n_features, self.n_classes)
+        )
+        hvp /= n_samples
+        jvp = d_weights * np.sum((Y_proba - y) * xv, axis=1) / n_samples
+        out[0] += 2 * self.reg * theta_flat
+        out[1] += 2 * self.reg * v_flat
+        return loss, out[0], out[1], (idx, jvp)
+
+    def grad_inner_var_stack(self, thetas_flat, lmbdas, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        n_points, k = thetas_flat.shape[0], self.n_classes
+        thetas = thetas_flat.reshape(n_points, n_features, k)
+        prod = x @ np.concatenate(thetas, axis=1)
+        Y_proba = sc.softmax(prod.reshape(n_samples, n_points, k), axis=2)
+        weights = sc.expit(lmbdas[:, idx]).T
+        residuals = (Y_proba - y[:, None]) * weights[:, :, None]
+        grads = x.T @ residuals.reshape(n_samples, n_points * k) / n_samples
+        grads = grads.reshape(n_features, n_points, k).transpose(1, 0, 2)
+        return grads.reshape(n_points, n_features * k) \
+            + 2 * self.reg * thetas_flat
+
+    def grad_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        k = self.n_classes
+        prod = x @ np.concatenate([
+            theta_flat.reshape(n_features, k),
+            theta_flat_old.reshape(n_features, k)
+        ], axis=1)
+        residuals, grad_lbda = [], []
+        for j, lbda in enumerate([lmbda[idx], lmbda_old[idx]]):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            Y_proba, lse = my_softmax_and_logsumexp(prod_j)
+            weights = sc.expit(lbda)
+            individual_losses = -prod_j[y == 1] + lse
+            residuals.append((Y_proba - y) * weights[:, None])
+            d_weights = weights - weights ** 2
+            grad_lbda.append(d_weights * individual_losses / n_samples)
+        grads = x.T @ np.concatenate(residuals, axis=1) / n_samples
+        grad = grads[:, :k].ravel() + 2 * self.reg * theta_flat
+        grad_old = grads[:, k:].ravel() + 2 * self.reg * theta_flat_old
+        return (grad, (idx, grad_lbda[0])), (grad_old, (idx, grad_lbda[1]))
+
+    def oracles_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old,
+                     v_flat, v_flat_old, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        k = self.n_classes
+        prod = x @ np.concatenate([
+            theta_flat.reshape(n_features, k),
+            theta_flat_old.reshape(n_features, k),
+            v_flat.reshape(n_features, k),
+            v_flat_old.reshape(n_features, k),
+        ], axis=1)
+        losses, residuals, jvp = [], [], []
+        for j, lbda in enumerate([lmbda[idx], lmbda_old[idx]]):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            xv = prod[:, (2 + j) * k:(3 + j) * k]
+            Y_proba, lse = my_softmax_and_logsumexp(prod_j)
+            weights = sc.expit(lbda)
+            individual_losses = -prod_j[y == 1] + lse
+            losses.append((individual_losses * weights).sum() / n_samples)
+            residuals.append((Y_proba - y) * weights[:, None])
+            residuals.append(softmax_hvp(Y_proba, xv) * weights[:, None])
+            d_weights = weights - weights ** 2
+            jvp.append(
+                d_weights * np.sum((Y_proba - y) * xv, axis=1) / n_samples
+            )
+        res = x.T @ np.concatenate(residuals, axis=1) / n_samples
+        grad = res[:, :k].ravel() + 2 * self.reg * theta_flat
+        hvp = res[:, k:2 * k].ravel() + 2 * self.reg * v_flat
+        grad_old = res[:, 2 * k:3 * k].ravel() + 2 * self.reg * theta_flat_old
+        hvp_old = res[:, 3 * k:].ravel() + 2 * self.reg * v_flat_old
         return (
-            loss,
-            grad_theta.ravel() + 2 * self.reg * theta_flat,
-            hvp.ravel() + 2 * self.reg * v_flat,
-            jvp,
+            (losses[0], grad, hvp, (idx, jvp[0])),
+            (losses[1], grad_old, hvp_old, (idx, jvp[1])),
         )
@@ -7,55 +7,76 @@ from sklearn.utils.extmath import safe_sparse_dot
 from scipy.sparse import linalg as splinalg
 
 from numba import njit
-from numba import float64, int64, types    # import the types
-from numba.experimental import jitclass
+from numba import int32, int64, types    # import the types
 
 import jax
 import jax.numpy as jnp
 from functools import partial
 from jax.nn import log_sigmoid
+from jax.experimental import sparse as jsparse
 
 from .base import BaseOracle
 from .special import expit, logsig, expit_njit, logsig_njit
 
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    from benchmark_utils.oracle_utils import dot_out
+    from benchmark_utils.oracle_utils import csr_to_bcoo
+    from benchmark_utils.numba_utils import csr_rows
+    from benchmark_utils.numba_utils import jitclass_dtypes
+    from benchmark_utils.numba_utils import csr_matmul, csr_rmatmul
+
 import warnings
 warnings.filterwarnings('error', category=RuntimeWarning)
 
 
-def grad_theta_log_loss(x, y, theta):
-    """Returns the gradient of the logistic loss."""
+def grad_theta_log_loss(x, y, theta, out=None):
+    """Returns the gradient of the logistic loss, written in out if given."""
     n_samples, n_features = x.shape
     tmp = y * (x @ theta)
     tmp2 = expit(-tmp)
 
-    grad = -(x.T @ (y * tmp2)) / n_samples
+    grad = dot_out(y * tmp2, x, out=out)
+    grad /= -n_samples
 
     return grad
 
 
-@njit
-def grad_theta_log_loss_njit(x, y, theta):
-    """Returns the gradient of the logistic loss."""
+@njit(cache=True)
+def grad_theta_log_loss_njit(x, y, theta, out):
+    """Returns the gradient of the logistic loss, written in out."""
     n_samples, n_features = x.shape
     tmp = y * (x @ theta)
     tmp2 = expit_njit(-tmp)
 
-    grad = -(x.T @ (y * tmp2)) / n_samples
+    np.dot(y * tmp2, x, out)
+    out /= -n_samples
 
-    return grad
+    return out
+
+
+def log_loss_terms(t):
+    """Returns the loss `-logsig(t)`, `expit(-t)` and the curvature
+    `expit(t) * expit(-t)` of the logistic loss at the margins t.
+
+    They are computed with a single exponential `exp(-|t|)`, which is
+    stable for any sign of t.
+    """
+    e = np.exp(-np.abs(t))
+    d = 1 / (1 + e)
+    loss = np.log1p(e) - np.minimum(t, 0)
+    return loss, np.where(t >= 0, e * d, d), e * d * d
+
+
+log_loss_terms_njit = njit(log_loss_terms, cache=True)
 
 
 def hvp_log_loss(x, y, theta, v):
     """Returns an hessian-vector product for the logistic loss and a vector v.
     """
     n_samples, n_features = x.shape
-    tmp = np.zeros_like(y)
-    tmp2 = y * (x @ theta)
-
-    idx1 = tmp2 < 0
-    tmp[idx1] = np.exp(tmp2[idx1]) * expit(- tmp2[idx1])**2
-    idx2 = tmp2 >= 0
-    tmp[idx2] = np.exp(- tmp2[idx2]) * expit(tmp2[idx2])**2
+    _, _, tmp = log_loss_terms(y * (x @ theta))
 
     xv = (x @ v)
 
@@ -63,18 +84,12 @@ def hvp_log_loss(x, y, theta, v):
     return hvp
 
 
-@njit
+@njit(cache=True)
 def hvp_log_loss_njit(x, y, theta, v):
     """Returns an hessian-vector product for the logistic loss and a vector v.
     """
     n_samples, n_features = x.shape
-    tmp = np.zeros_like(y)
-    tmp2 = y * (x @ theta)
-
-    idx1 = tmp2 < 0
-    tmp[idx1] = np.exp(tmp2[idx1]) * expit_njit(- tmp2[idx1])**2
-    idx2 = tmp2 >= 0
-    tmp[idx2] = np.exp(- tmp2[idx2]) * expit_njit(tmp2[idx2])**2
+    _, _, tmp = log_loss_terms_njit(y * (x @ theta))
 
     xv = (x @ v)
 
@@ -82,35 +97,355 @@ def hvp_log_loss_njit(x, y, theta, v):
     return hvp
 
 
-def value_grad_hvp_log_loss(x, y, theta, v):
+def value_grad_hvp_log_loss(x, y, theta, v, out=None):
+    """Returns value, gradient, hessian-vector product for the logistic loss.
+
+    The margins and `x @ v` are computed with a single product with x, and
+    the gradient and the hvp with a single product with x.T, written in the
+    rows of out if given.
+    """
+    n_samples, n_features = x.shape
+    prod = safe_sparse_dot(x, np.stack([theta, v], axis=1))
+    loss, tmp, curvature = log_loss_terms(y * prod[:, 0])
+    val = loss.mean()
+
+    weights = np.stack([-y * tmp, prod[:, 1] * curvature])
+    grad_hvp = dot_out(weights, x, out=out)
+    grad_hvp /= n_samples
+    return val, grad_hvp[0], grad_hvp[1]
+
+
+@njit(cache=True)
+def value_grad_hvp_log_loss_njit(x, y, theta, v, out):
     """Returns value, gradient, hessian-vector product for the logistic loss.
+
+    The margins and `x @ v` are computed with a single product with x, and
+    the gradient and the hvp with a single product with x.T, written in the
+    rows of out.
+    """
+    n_samples, n_features = x.shape
+    theta_v = np.empty((n_features, 2), x.dtype)
+    theta_v[:, 0] = theta
+    theta_v[:, 1] = v
+    prod = x @ theta_v
+    loss, tmp, curvature = log_loss_terms_njit(y * prod[:, 0])
+    val = loss.mean()
+
+    weights = np.empty((2, n_samples), x.dtype)
+    weights[0] = -y * tmp
+    weights[1] = prod[:, 1] * curvature
+    np.dot(weights, x, out)
+    out /= n_samples
+    return val, out[0], out[1]
+
+
+@njit(cache=True)
+def grad_theta_log_loss_csr_njit(data, indices, indptr, y, start, stop,
+                                 theta, out):
+    """Returns the gradient of the logistic loss on the rows start:stop of a
+    CSR matrix, written in out."""
+    n_samples = stop - start
+    y = y[start:stop]
+    prod = csr_matmul(data, indices, indptr, start, stop, theta.reshape(-1, 1))
+    tmp2 = expit_njit(-y * prod[:, 0])
+
+    weights = (y * tmp2).reshape(1, -1)
+    csr_rmatmul(data, indices, indptr, start, stop, weights,
+                out.reshape(1, -1))
+    out /= -n_samples
+    return out
+
+
+@njit(cache=True)
+def hvp_log_loss_csr_njit(data, indices, indptr, y, start, stop, theta, v):
+    """Returns an hessian-vector product for the logistic loss on the rows
+    start:stop of a CSR matrix and a vector v."""
+    n_samples = stop - start
+    theta_v = np.empty((theta.shape[0], 2), data.dtype)
+    theta_v[:, 0] = theta
+    theta_v[:, 1] = v
+    prod = csr_matmul(data, indices, indptr, start, stop, theta_v)
+    _, _, curvature = log_loss_terms_njit(y[start:stop] * prod[:, 0])
+
+    hvp = np.empty((1, theta.shape[0]), data.dtype)
+    weights = (prod[:, 1] * curvature).reshape(1, -1)
+    csr_rmatmul(data, indices, indptr, start, stop, weights, hvp)
+    return hvp[0] / n_samples
+
+
+@njit(cache=True)
+def value_grad_hvp_log_loss_csr_njit(data, indices, indptr, y, start, stop,
+                                     theta, v, out):
+    """Returns value, gradient, hessian-vector product for the logistic loss
+    on the rows start:stop of a CSR matrix.
+
+    As in `value_grad_hvp_log_loss_njit`, the data is traversed once for the
+    margins and `x @ v`, and once for the gradient and the hvp, written in
+    the rows of out.
+    """
+    n_samples = stop - start
+    y = y[start:stop]
+    theta_v = np.empty((theta.shape[0], 2), data.dtype)
+    theta_v[:, 0] = theta
+    theta_v[:, 1] = v
+    prod = csr_matmul(data, indices, indptr, start, stop, theta_v)
+    loss, tmp, curvature = log_loss_terms_njit(y * prod[:, 0])
+    val = loss.mean()
+
+    weights = np.empty((2, n_samples), data.dtype)
+    weights[0] = -y * tmp
+    weights[1] = prod[:, 1] * curvature
+    csr_rmatmul(data, indices, indptr, start, stop, weights, out)
+    out /= n_samples
+    return val, out[0], out[1]
+
+
+def grad_theta_log_loss_pair(x, y, theta, theta_old, out=None):
+    """Returns the gradients of the logistic loss at theta and theta_old on
+    the same batch, as the rows of an array written in out if given.
+
+    The margins of both points are computed with a single product with x,
+    and both gradients with a single product with x.T.
     """
     n_samples, n_features = x.shape
-    tmp = y * safe_sparse_dot(x, theta)
-    val = - logsig(tmp).mean()
+    prod = safe_sparse_dot(x, np.stack([theta, theta_old], axis=1))
+    tmp = expit(-y[:, None] * prod)
+    grads = dot_out((y[:, None] * tmp).T, x, out=out)
+    grads /= -n_samples
+    return grads
 
-    tmp2 = expit(-tmp)
-    grad = -safe_sparse_dot(x.T, (y * tmp2)) / n_samples
 
-    idx1 = tmp < 0
-    tmp2[idx1] = np.exp(tmp[idx1]) * tmp2[idx1]**2
-    idx2 = tmp >= 0
-    tmp2[idx2] = np.exp(- tmp[idx2]) * expit(tmp[idx2])**2
+@njit(cache=True)
+def grad_theta_log_loss_pair_njit(x, y, theta, theta_old, out):
+    """Returns the gradients of the logistic loss at theta and theta_old on
+    the same batch, as the rows of out."""
+    n_samples, n_features = x.shape
+    thetas = np.empty((n_features, 2), x.dtype)
+    thetas[:, 0] = theta
+    thetas[:, 1] = theta_old
+    prod = x @ thetas
+    weights = np.empty((2, n_samples), x.dtype)
+    weights[0] = y * expit_njit(-y * prod[:, 0])
+    weights[1] = y * expit_njit(-y * prod[:, 1])
+    np.dot(weights, x, out)
+    out /= -n_samples
+    return out
+
+
+@njit(cache=True)
+def grad_theta_log_loss_pair_csr_njit(data, indices, indptr, y, start, stop,
+                                      theta, theta_old, out):
+    """Same as `grad_theta_log_loss_pair_njit` on the rows start:stop of a
+    CSR matrix."""
+    n_samples = stop - start
+    y = y[start:stop]
+    thetas = np.empty((theta.shape[0], 2), data.dtype)
+    thetas[:, 0] = theta
+    thetas[:, 1] = theta_old
+    prod = csr_matmul(data, indices, indptr, start, stop, thetas)
+    weights = np.empty((2, n_samples), data.dtype)
+    weights[0] = y * expit_njit(-y * prod[:, 0])
+    weights[1] = y * expit_njit(-y * prod[:, 1])
+    csr_rmatmul(data, indices, indptr, start, stop, weights, out)
+    out /= -n_samples
+    return out
+
+
+def grad_theta_log_loss_stack(x, y, thetas):
+    """Returns the gradients of the logistic loss at the rows of thetas on
+    the same batch, as the rows of an array.
+
+    The margins of all the points are computed with a single product with x,
+    and all the gradients with a single product with x.T.
+    """
+    n_samples, n_features = x.shape
+    prod = safe_sparse_dot(x, thetas.T)
+    tmp = expit(-y[:, None] * prod)
+    grads = safe_sparse_dot((y[:, None] * tmp).T, x)
+    grads /= -n_samples
+    return grads
+
+
+@njit(cache=True)
+def _stack_weights_njit(y, prod):
+    """Weights of the rows of `grad_theta_log_loss_stack` for the products
+    prod of the batch with the points."""
+    weights = np.empty((prod.shape[1], prod.shape[0]), prod.dtype)
+    for i in range(prod.shape[1]):
+        weights[i] = y * expit_njit(-y * prod[:, i])
+    return weights
+
+
+@njit(cache=True)
+def grad_theta_log_loss_stack_njit(x, y, thetas, out):
+    """Returns the gradients of the logistic loss at the rows of thetas on
+    the same batch, as the rows of out."""
+    n_samples, n_features = x.shape
+    params = np.empty((n_features, thetas.shape[0]), x.dtype)
+    params[:] = thetas.T
+    np.dot(_stack_weights_njit(y, x @ params), x, out)
+    out /= -n_samples
+    return out
+
+
+@njit(cache=True)
+def grad_theta_log_loss_stack_csr_njit(data, indices, indptr, y, start, stop,
+                                       thetas, out):
+    """Same as `grad_theta_log_loss_stack_njit` on the rows start:stop of a
+    CSR matrix."""
+    n_samples = stop - start
+    params = np.empty((thetas.shape[1], thetas.shape[0]), data.dtype)
+    params[:] = thetas.T
+    prod = csr_matmul(data, indices, indptr, start, stop, params)
+    weights = _stack_weights_njit(y[start:stop], prod)
+    csr_rmatmul(data, indices, indptr, start, stop, weights, out)
+    out /= -n_samples
+    return out
+
+
+def value_grad_hvp_log_loss_pair(x, y, theta, theta_old, v, v_old,
+                                 out=None):
+    """Returns `value_grad_hvp_log_loss` at (theta, v) and (theta_old, v_old)
+    on the same batch.
+
+    The batch is read once for the margins and the products with v of both
+    points, and once for their gradients and hvps. Returns the two values
+    and an array with rows `grad, hvp, grad_old, hvp_old`, written in out if
+    given.
+    """
+    n_samples, n_features = x.shape
+    prod = safe_sparse_dot(x, np.stack([theta, v, theta_old, v_old], axis=1))
+    loss, tmp, curvature = log_loss_terms(y[:, None] * prod[:, ::2])
+    val, val_old = loss.mean(axis=0)
+
+    weights = np.stack([
+        -y * tmp[:, 0], prod[:, 1] * curvature[:, 0],
+        -y * tmp[:, 1], prod[:, 3] * curvature[:, 1],
+    ])
+    grads_hvps = dot_out(weights, x, out=out)
+    grads_hvps /= n_samples
+    return val, val_old, grads_hvps
+
+
+@njit(cache=True)
+def _pair_weights_njit(y, prod):
+    """Values and weights of the rows of `value_grad_hvp_log_loss_pair` for
+    the products prod of the batch with theta, v, theta_old and v_old."""
+    weights = np.empty((4, prod.shape[0]), prod.dtype)
+    loss, tmp, curvature = log_loss_terms_njit(y * prod[:, 0])
+    weights[0] = -y * tmp
+    weights[1] = prod[:, 1] * curvature
+    val = loss.mean()
+    loss, tmp, curvature = log_loss_terms_njit(y * prod[:, 2])
+    weights[2] = -y * tmp
+    weights[3] = prod[:, 3] * curvature
+    return val, loss.mean(), weights
+
+
+@njit(cache=True)
+def value_grad_hvp_log_loss_pair_njit(x, y, theta, theta_old, v, v_old,
+                                      out):
+    """Same as `value_grad_hvp_log_loss_pair`, written in out."""
+    n_samples, n_features = x.shape
+    params = np.empty((n_features, 4), x.dtype)
+    params[:, 0] = theta
+    params[:, 1] = v
+    params[:, 2] = theta_old
+    params[:, 3] = v_old
+    val, val_old, weights = _pair_weights_njit(y, x @ params)
+    np.dot(weights, x, out)
+    out /= n_samples
+    return val, val_old, out
+
+
+@njit(cache=True)
+def value_grad_hvp_log_loss_pair_csr_njit(data, indices, indptr, y, start,
+                                          stop, theta, theta_old, v, v_old,
+                                          out):
+    """Same as `value_grad_hvp_log_loss_pair_njit` on the rows start:stop of
+    a CSR matrix."""
+    n_samples = stop - start
+    params = np.empty((theta.shape[0], 4), data.dtype)
+    params[:, 0] = theta
+    params[:, 1] = v
+    params[:, 2] = theta_old
+    params[:, 3] = v_old
+    prod = csr_matmul(data, indices, indptr, start, stop, params)
+    val, val_old, weights = _pair_weights_njit(y[start:stop], prod)
+    csr_rmatmul(data, indices, indptr, start, stop, weights, out)
+    out /= n_samples
+    return val, val_old, out
+
+
+def reg_cross(reg, theta, lmbda, v):
+    """Returns the cross derivative of the regularization of parametrization
+    reg with the vector v."""
+    if reg == 'exp':
+        res = np.exp(lmbda) * theta * v
+    elif reg == 'lin':
+        res = theta * v
+    else:
+        res = np.zeros_like(lmbda)
+    if lmbda.shape[0] == 1:
+        res = np.full(1, res.sum())
+    return res
+
+
+reg_cross_njit = njit(reg_cross, cache=True)
+
+
+def reg_grad(reg, grad_theta, theta, lmbda):
+    """Adds the regularization of parametrization reg to the gradient of the
+    loss grad_theta, and returns it with the gradient in lmbda."""
+    if reg == 'exp':
+        alpha = np.exp(lmbda)
+        grad_theta += alpha * theta
+        grad_lmbda = alpha * theta ** 2 / 2
+    elif reg == 'lin':
+        grad_theta += lmbda * theta
+        grad_lmbda = theta ** 2 / 2
+    else:
+        grad_lmbda = np.zeros_like(lmbda)
+    if lmbda.shape[0] == 1:
+        grad_lmbda = np.full(1, grad_lmbda.sum())
+    return grad_theta, grad_lmbda
+
+
+reg_grad_njit = njit(reg_grad, cache=True)
+
+
+def reg_grad_stack(reg, grads, thetas, lmbdas):
+    """Adds the regularization of parametrization reg to the gradients of
+    the loss at the rows of thetas and lmbdas."""
+    if reg == 'exp':
+        grads += np.exp(lmbdas) * thetas
+    elif reg == 'lin':
+        grads += lmbdas * thetas
+    return grads
+
 
-    hvp = safe_sparse_dot(x.T, (x.dot(v) * tmp2)) / n_samples
+reg_grad_stack_njit = njit(reg_grad_stack, cache=True)
+
+
+def reg_oracles(reg, val, grad, hvp, theta, lmbda, v):
+    """Adds the regularization of parametrization reg to the value, gradient
+    and hessian-vector product of the loss."""
+    if reg != 'none':
+        alpha = np.exp(lmbda) if reg == 'exp' else lmbda
+        val += .5 * (theta @ (alpha * theta))
+        grad += alpha * theta
+        hvp += alpha * v
     return val, grad, hvp
 
 
+reg_oracles_njit = njit(reg_oracles, cache=True)
+
+
 def _get_hvp_op(x, y, theta, reg, lmbda):
     n_samples, n_features = x.shape
-    tmp = np.zeros_like(y)
     tmp2 = y * safe_sparse_dot(x, theta)
     assert tmp2.shape == y.shape
-
-    idx1 = tmp2 < 0
-    tmp[idx1] = np.exp(tmp2[idx1]) * expit(-tmp2[idx1])**2
-    idx2 = tmp2 >= 0
-    tmp[idx2] = np.exp(- tmp2[idx2]) * expit(tmp2[idx2])**2
+    _, _, tmp = log_loss_terms(tmp2)
 
     # Precompute as much as possible
     if sparse.issparse(x):
@@ -151,17 +486,26 @@ def jax_loss(theta, lmbda, X, y):
     return jnp.mean(batched_loss(theta, lmbda, X, y), axis=0)
 
 
-spec = [
-    ('X', float64[:, ::1]),          # an array field
-    ('y', float64[::1]),               # a simple scalar field
-    ('reg', types.unicode_type),
-    ('n_samples', int64),
-    ('n_features', int64),
-    ("variables_shape", int64[:, ::1])
-]
+@jax.jit
+def jax_loss_sparse(theta, lmbda, X, y):
+    """Logistic loss for a BCOO matrix X, which cannot be vmapped over."""
+    return jnp.mean(-log_sigmoid(y * (X @ theta)), axis=0)
+
+
+def get_spec(dtype):
+    """Spec of the numba oracle for data of the numba type dtype."""
+    return [
+        # X is read-only so that memory-mapped data can be used without copy
+        ('X', types.Array(dtype, 2, 'C', readonly=True)),
+        ('y', dtype[::1]),               # a simple scalar field
+        ('reg', types.unicode_type),
+        ('n_samples', int64),
+        ('n_features', int64),
+        ("variables_shape", int64[:, ::1])
+    ]
 
 
-@jitclass(spec)
+@jitclass_dtypes(get_spec)
 class LogisticRegressionOracleNumba():
     """Numba class defining the oracles for the L^2 regularized logistic loss.
 
@@ -205,7 +549,10 @@ class LogisticRegressionOracleNumba():
         return tmp
 
     def grad_inner_var(self, theta, lmbda, idx):
-        tmp = grad_theta_log_loss_njit(self.X[idx], self.y[idx], theta)
+        tmp = grad_theta_log_loss_njit(
+            self.X[idx], self.y[idx], theta,
+            np.empty(self.n_features, self.X.dtype)
+        )
         if self.reg == 'exp':
             tmp += np.exp(lmbda) * theta
         elif self.reg == 'lin':
@@ -214,40 +561,25 @@ class LogisticRegressionOracleNumba():
 
     def grad_outer_var(self, theta, lmbda, idx):
         if self.reg == 'exp':
-            grad = .5 * np.exp(lmbda) * theta ** 2
+            grad = np.exp(lmbda) * theta ** 2 / 2
         elif self.reg == 'lin':
-            grad = .5 * theta ** 2
+            grad = theta ** 2 / 2
         else:
             grad = np.zeros_like(lmbda)
         if lmbda.shape[0] == 1:
-            grad = grad.sum() * np.ones((1,))
+            grad = np.full(1, grad.sum())
         return grad
 
-    def grad(self, theta, lmbda, idx):
-        grad_theta = grad_theta_log_loss_njit(self.X[idx], self.y[idx], theta)
-        if self.reg == 'exp':
-            alpha = np.exp(lmbda)
-            grad_theta += alpha * theta
-            grad_lmbda = .5 * alpha * theta ** 2
-        elif self.reg == 'lin':
-            grad_theta += lmbda * theta
-            grad_lmbda = .5 * theta ** 2
-        else:
-            grad_lmbda = np.zeros_like(lmbda)
-        if lmbda.shape[0] == 1:
-            grad_lmbda = grad_lmbda.sum() * np.ones((1,))
-        return grad_theta, grad_lmbda
+    def grad(self, theta, lmbda, idx, out=None):
+        if out is None:
+            out = np.empty(self.n_features, self.X.dtype)
+        grad_theta = grad_theta_log_loss_njit(
+            self.X[idx], self.y[idx], theta, out
+        )
+        return reg_grad_njit(self.reg, grad_theta, theta, lmbda)
 
     def cross(self, theta, lmbda, v, idx):
-        if self.reg == 'exp':
-            res = np.exp(lmbda) * theta * v
-        elif self.reg == 'lin':
-            res = theta * v
-        else:
-            res = np.zeros_like(lmbda)
-        if lmbda.shape[0] == 1:
-            res = res.sum() * np.ones((1,))
-        return res
+        return reg_cross_njit(self.reg, theta, lmbda, v)
 
     def hvp(self, theta, lmbda, v, idx):
         tmp = hvp_log_loss_njit(self.X[idx], self.y[idx], theta, v)
@@ -257,24 +589,14 @@ class LogisticRegressionOracleNumba():
             tmp += lmbda * v
         return tmp
 
-    def oracles(self, theta, lmbda, v, idx, inverse='id'):
+    def oracles(self, theta, lmbda, v, idx, inverse='id', out=None):
         """Returns the value, the gradient,
         """
         x = self.X[idx]
         y = self.y[idx]
-        n_samples = x.shape[0]
-        tmp = y * (x @ theta)
-        val = - logsig_njit(tmp).mean()
-
-        tmp2 = expit_njit(-tmp)
-        grad = -(x.T @ (y * tmp2)) / n_samples
-
-        idx1 = tmp < 0
-        tmp2[idx1] = np.exp(tmp[idx1]) * tmp2[idx1]**2
-        idx2 = ~idx1
-        tmp2[idx2] = np.exp(- tmp[idx2]) * expit_njit(tmp[idx2])**2
-
-        hvp = (x.T @ ((x @ v) * tmp2)) / n_samples
+        if out is None:
+            out = np.empty((2, self.n_features), self.X.dtype)
+        val, grad, hvp = value_grad_hvp_log_loss_njit(x, y, theta, v, out)
 
         if self.reg != 'none':
             alpha = np.exp(lmbda) if self.reg == 'exp' else lmbda
@@ -285,7 +607,8 @@ class LogisticRegressionOracleNumba():
         if inverse == 'id':
             inv_hvp = v
         elif inverse == 'cg':
-            H = x.T @ (tmp.reshape(-1, 1) * x)
+            _, _, curvature = log_loss_terms_njit(y * (x @ theta))
+            H = x.T @ (curvature.reshape(-1, 1) * x) / x.shape[0]
             if self.reg != 'none':
                 alpha = np.exp(lmbda) if self.reg == 'exp' else lmbda
                 if lmbda.shape[0] == 1:
@@ -298,6 +621,269 @@ class LogisticRegressionOracleNumba():
 
         return val, grad, hvp, self.cross(theta, lmbda, inv_hvp, idx)
 
+    def grad_sparse(self, theta, lmbda, idx, out=None):
+        grad_theta, grad_lmbda = self.grad(theta, lmbda, idx, out)
+        return grad_theta, (slice(0, lmbda.shape[0]), grad_lmbda)
+
+    def oracles_sparse(self, theta, lmbda, v, idx, inverse='id', out=None):
+        val, grad, hvp, cross_v = self.oracles(
+            theta, lmbda, v, idx, inverse, out
+        )
+        return val, grad, hvp, (slice(0, lmbda.shape[0]), cross_v)
+
+    def grad_inner_var_stack(self, thetas, lmbdas, idx):
+        """Same as `grad_inner_var` at the rows of thetas and lmbdas on the
+        same batch, which is read once."""
+        grads = grad_theta_log_loss_stack_njit(
+            self.X[idx], self.y[idx], thetas,
+            np.empty((thetas.shape[0], self.n_features), self.X.dtype)
+        )
+        return reg_grad_stack_njit(self.reg, grads, thetas, lmbdas)
+
+    def grad_pair(self, theta, theta_old, lmbda, lmbda_old, idx):
+        """Same as `grad_sparse` at (theta, lmbda) and (theta_old, lmbda_old)
+        on the same batch, which is read once."""
+        grads = grad_theta_log_loss_pair_njit(
+            self.X[idx], self.y[idx], theta, theta_old,
+            np.empty((2, self.n_features), self.X.dtype)
+        )
+        grad, grad_lmbda = reg_grad_njit(self.reg, grads[0], theta, lmbda)
+        grad_old, grad_lmbda_old = reg_grad_njit(
+            self.reg, grads[1], theta_old, lmbda_old
+        )
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((grad, (outer_idx, grad_lmbda)),
+                (grad_old, (outer_idx, grad_lmbda_old)))
+
+    def oracles_pair(self, theta, theta_old, lmbda, lmbda_old, v, v_old,
+                     idx):
+        """Same as `oracles_sparse` with inverse='id' at (theta, lmbda, v)
+        and (theta_old, lmbda_old, v_old) on the same batch, which is read
+        once."""
+        val, val_old, out = value_grad_hvp_log_loss_pair_njit(
+            self.X[idx], self.y[idx], theta, theta_old, v, v_old,
+            np.empty((4, self.n_features), self.X.dtype)
+        )
+        val, grad, hvp = reg_oracles_njit(
+            self.reg, val, out[0], out[1], theta, lmbda, v
+        )
+        val_old, grad_old, hvp_old = reg_oracles_njit(
+            self.reg, val_old, out[2], out[3], theta_old, lmbda_old, v_old
+        )
+        cross_v = self.cross(theta, lmbda, v, idx)
+        cross_v_old = self.cross(theta_old, lmbda_old, v_old, idx)
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((val, grad, hvp, (outer_idx, cross_v)),
+                (val_old, grad_old, hvp_old, (outer_idx, cross_v_old)))
+
+    def prox(self, theta, lmbda):
+        if self.reg == 'exp':
+            lmbda[lmbda < -12] = -12
+            lmbda[lmbda > 12] = 12
+        elif self.reg == 'lin':
+            lmbda = np.maximum(lmbda, 0)
+        return theta, lmbda
+
+
+def get_spec_csr(dtype):
+    """Spec of the numba oracle for a CSR matrix of the numba type dtype."""
+    return [
+        # arrays of the CSR matrix X, read-only as in `get_spec`. The column
+        # indices are int32 as in scipy, the index pointer is int64 as nnz
+        # may not fit in int32.
+        ('data', types.Array(dtype, 1, 'C', readonly=True)),
+        ('indices', types.Array(int32, 1, 'C', readonly=True)),
+        ('indptr', types.Array(int64, 1, 'C', readonly=True)),
+        ('y', dtype[::1]),
+        ('reg', types.unicode_type),
+        ('n_samples', int64),
+        ('n_features', int64),
+        ("variables_shape", int64[:, ::1])
+    ]
+
+
+@jitclass_dtypes(get_spec_csr)
+class LogisticRegressionOracleNumbaCSR():
+    """Numba class defining the oracles for the L^2 regularized logistic loss
+    with a sparse input matrix in CSR format.
+
+    The minibatches are the contiguous slices of rows given by the samplers,
+    which are read in place through the index pointer, without copy.
+
+    Parameters
+    ----------
+    data, indices, indptr : ndarray
+        Arrays of the CSR matrix X of shape (n_samples, n_features).
+    n_features : int
+        Number of features of X.
+    y : ndarray, shape (n_samples,)
+        Targets for the logistic regression. Must be binary targets.
+    reg : {'exp', ‘lin’, ‘none’}, default='none',
+        Parametrization of the regularization parameter
+        - 'exp' the parametrization is exponential
+        - 'lin' the parametrization is linear
+        - 'none' no regularization
+    """
+    def __init__(self, data, indices, indptr, n_features, y, reg='none'):
+
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.y = y
+        self.reg = reg
+
+        # attributes
+        self.n_samples = indptr.shape[0] - 1
+        self.n_features = n_features
+        self.variables_shape = np.array([
+            [self.n_features], [self.n_features]
+        ])
+
+    def value(self, theta, lmbda, idx):
+        start, stop = csr_rows(self.indptr, idx)
+        prod = csr_matmul(self.data, self.indices, self.indptr, start, stop,
+                          theta.reshape(-1, 1))
+        tmp = - logsig_njit(self.y[start:stop] * prod[:, 0]).mean()
+        if self.reg == 'exp':
+            tmp += .5 * theta.dot(np.exp(lmbda) * theta)
+        elif self.reg == 'lin':
+            tmp += .5 * theta.dot(lmbda * theta)
+        return tmp
+
+    def grad_inner_var(self, theta, lmbda, idx):
+        start, stop = csr_rows(self.indptr, idx)
+        tmp = grad_theta_log_loss_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, np.empty(self.n_features, self.data.dtype)
+        )
+        if self.reg == 'exp':
+            tmp += np.exp(lmbda) * theta
+        elif self.reg == 'lin':
+            tmp += lmbda * theta
+        return tmp
+
+    def grad_outer_var(self, theta, lmbda, idx):
+        if self.reg == 'exp':
+            grad = np.exp(lmbda) * theta ** 2 / 2
+        elif self.reg == 'lin':
+            grad = theta ** 2 / 2
+        else:
+            grad = np.zeros_like(lmbda)
+        if lmbda.shape[0] == 1:
+            grad = np.full(1, grad.sum())
+        return grad
+
+    def grad(self, theta, lmbda, idx, out=None):
+        if out is None:
+            out = np.empty(self.n_features, self.data.dtype)
+        start, stop = csr_rows(self.indptr, idx)
+        grad_theta = grad_theta_log_loss_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, out
+        )
+        return reg_grad_njit(self.reg, grad_theta, theta, lmbda)
+
+    def cross(self, theta, lmbda, v, idx):
+        return reg_cross_njit(self.reg, theta, lmbda, v)
+
+    def hvp(self, theta, lmbda, v, idx):
+        start, stop = csr_rows(self.indptr, idx)
+        tmp = hvp_log_loss_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, v
+        )
+        if self.reg == 'exp':
+            tmp += np.exp(lmbda) * v
+        elif self.reg == 'lin':
+            tmp += lmbda * v
+        return tmp
+
+    def oracles(self, theta, lmbda, v, idx, inverse='id', out=None):
+        """Returns the value, the gradient,
+        """
+        if out is None:
+            out = np.empty((2, self.n_features), self.data.dtype)
+        start, stop = csr_rows(self.indptr, idx)
+        val, grad, hvp = value_grad_hvp_log_loss_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, v, out
+        )
+
+        if self.reg != 'none':
+            alpha = np.exp(lmbda) if self.reg == 'exp' else lmbda
+            val += .5 * (theta @ (alpha * theta))
+            grad += alpha * theta
+            hvp += alpha * v
+
+        if inverse == 'id':
+            inv_hvp = v
+        else:
+            # The dense hessian of high dimensional sparse data does not fit
+            # in memory.
+            raise NotImplementedError('inverse unknown for sparse X')
+
+        return val, grad, hvp, self.cross(theta, lmbda, inv_hvp, idx)
+
+    def grad_sparse(self, theta, lmbda, idx, out=None):
+        grad_theta, grad_lmbda = self.grad(theta, lmbda, idx, out)
+        return grad_theta, (slice(0, lmbda.shape[0]), grad_lmbda)
+
+    def oracles_sparse(self, theta, lmbda, v, idx, inverse='id', out=None):
+        val, grad, hvp, cross_v = self.oracles(
+            theta, lmbda, v, idx, inverse, out
+        )
+        return val, grad, hvp, (slice(0, lmbda.shape[0]), cross_v)
+
+    def grad_inner_var_stack(self, thetas, lmbdas, idx):
+        """Same as `grad_inner_var` at the rows of thetas and lmbdas on the
+        same batch, which is read once."""
+        start, stop = csr_rows(self.indptr, idx)
+        grads = grad_theta_log_loss_stack_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            thetas, np.empty((thetas.shape[0], self.n_features),
+                             self.data.dtype)
+        )
+        return reg_grad_stack_njit(self.reg, grads, thetas, lmbdas)
+
+    def grad_pair(self, theta, theta_old, lmbda, lmbda_old, idx):
+        """Same as `grad_sparse` at (theta, lmbda) and (theta_old, lmbda_old)
+        on the same batch, which is read once."""
+        start, stop = csr_rows(self.indptr, idx)
+        grads = grad_theta_log_loss_pair_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, theta_old, np.empty((2, self.n_features), self.data.dtype)
+        )
+        grad, grad_lmbda = reg_grad_njit(self.reg, grads[0], theta, lmbda)
+        grad_old, grad_lmbda_old = reg_grad_njit(
+            self.reg, grads[1], theta_old, lmbda_old
+        )
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((grad, (outer_idx, grad_lmbda)),
+                (grad_old, (outer_idx, grad_lmbda_old)))
+
+    def oracles_pair(self, theta, theta_old, lmbda, lmbda_old, v, v_old,
+                     idx):
+        """Same as `oracles_sparse` with inverse='id' at (theta, lmbda, v)
+        and (theta_old, lmbda_old, v_old) on the same batch, which is read
+        once."""
+        start, stop = csr_rows(self.indptr, idx)
+        val, val_old, out = value_grad_hvp_log_loss_pair_csr_njit(
+            self.data, self.indices, self.indptr, self.y, start, stop,
+            theta, theta_old, v, v_old,
+            np.empty((4, self.n_features), self.data.dtype)
+        )
+        val, grad, hvp = reg_oracles_njit(
+            self.reg, val, out[0], out[1], theta, lmbda, v
+        )
+        val_old, grad_old, hvp_old = reg_oracles_njit(
+            self.reg, val_old, out[2], out[3], theta_old, lmbda_old, v_old
+        )
+        cross_v = self.cross(theta, lmbda, v, idx)
+        cross_v_old = self.cross(theta_old, lmbda_old, v_old, idx)
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((val, grad, hvp, (outer_idx, cross_v)),
+                (val_old, grad_old, hvp_old, (outer_idx, cross_v_old)))
+
     def prox(self, theta, lmbda):
         if self.reg == 'exp':
             lmbda[lmbda < -12] = -12
@@ -341,7 +927,7 @@ class LogisticRegressionOracle(BaseOracle):
 
         # Store info for other
         self.X = X
-        self.y = y.astype(np.float64)
+        self.y = y.astype(X.dtype)
         self.reg = reg
 
         # attributes
@@ -357,18 +943,25 @@ class LogisticRegressionOracle(BaseOracle):
         #         )
 
     def _get_jax_oracle(self, get_full_batch=False):
-        if sparse.issparse(self.X):
-            raise ValueError("X should not be sparse")
+        X = self.X
+        if sparse.issparse(X):
+            X = csr_to_bcoo(X)
+        if isinstance(X, jsparse.BCOO):
+            # The rows of a BCOO matrix built by `csr_to_bcoo` are a batch
+            # dimension, so that the minibatches are dense slices of its data.
+            dynamic_slice, loss = jsparse.bcoo_dynamic_slice, jax_loss_sparse
+        else:
+            dynamic_slice, loss = jax.lax.dynamic_slice, jax_loss
 
         @partial(jax.jit, static_argnames=('batch_size'))
         def jax_oracle(inner_var, outer_var, start=0, batch_size=1):
-            x = jax.lax.dynamic_slice(
-                self.X, (start, 0),
-                (batch_size, self.X.shape[1])
+            x = dynamic_slice(
+                X, (start, 0),
+                (batch_size, X.shape[1])
             )
             y = jax.lax.dynamic_slice(
                 self.y, (start, ), (batch_size, ))
-            res = jax_loss(inner_var, outer_var, x, y)
+            res = loss(inner_var, outer_var, x, y)
             if self.reg == 'exp':
                 res += jnp.dot(jnp.exp(outer_var) * inner_var, inner_var)/2
             elif self.reg == 'lin':
@@ -378,7 +971,7 @@ class LogisticRegressionOracle(BaseOracle):
         if get_full_batch:
             @jax.jit
             def jax_oracle_fb(inner_var, outer_var):
-                res = jax_loss(inner_var, outer_var, self.X, self.y)
+                res = loss(inner_var, outer_var, X, self.y)
                 if self.reg == 'exp':
                     res += jnp.dot(jnp.exp(outer_var) * inner_var, inner_var)/2
                 elif self.reg == 'lin':
@@ -390,8 +983,16 @@ class LogisticRegressionOracle(BaseOracle):
 
     def _get_numba_oracle(self):
         if sparse.issparse(self.X):
-            raise ValueError("X should not be sparse")
-        return LogisticRegressionOracleNumba(
+            # The data and the indices are not copied, only the index pointer,
+            # of size n_samples + 1, is cast to int64 if needed.
+            X = sparse.csr_matrix(self.X)
+            return LogisticRegressionOracleNumbaCSR[X.dtype](
+                X.data, X.indices.astype(np.int32, copy=False),
+                X.indptr.astype(np.int64, copy=False), X.shape[1], self.y,
+                self.reg
+            )
+        # No copy if X is already C-contiguous, e.g. a memory-mapped array.
+        return LogisticRegressionOracleNumba[self.X.dtype](
             np.ascontiguousarray(self.X), self.y, self.reg
         )
 
@@ -415,40 +1016,23 @@ class LogisticRegressionOracle(BaseOracle):
 
     def grad_outer_var(self, theta, lmbda, idx):
         if self.reg == 'exp':
-            grad = .5 * np.exp(lmbda) * theta ** 2
+            grad = np.exp(lmbda) * theta ** 2 / 2
         elif self.reg == 'lin':
-            grad = .5 * theta ** 2
+            grad = theta ** 2 / 2
         else:
             grad = np.zeros_like(lmbda)
         if lmbda.shape[0] == 1:
-            grad = grad.sum() * np.ones((1,))
+            grad = np.full(1, grad.sum())
         return grad
 
-    def grad(self, theta, lmbda, idx):
-        grad_theta = grad_theta_log_loss(self.X[idx], self.y[idx], theta)
-        if self.reg == 'exp':
-            alpha = np.exp(lmbda)
-            grad_theta += alpha * theta
-            grad_lmbda = .5 * alpha * theta ** 2
-        elif self.reg == 'lin':
-            grad_theta += lmbda * theta
-            grad_lmbda = .5 * theta ** 2
-        else:
-            grad_lmbda = np.zeros_like(lmbda)
-        if lmbda.shape[0] == 1:
-            grad_lmbda = grad_lmbda.sum() * np.ones((1,))
-        return grad_theta, grad_lmbda
+    def grad(self, theta, lmbda, idx, out=None):
+        grad_theta = grad_theta_log_loss(
+            self.X[idx], self.y[idx], theta, out=out
+        )
+        return reg_grad(self.reg, grad_theta, theta, lmbda)
 
     def cross(self, theta, lmbda, v, idx):
-        if self.reg == 'exp':
-            res = np.exp(lmbda) * theta * v
-        elif self.reg == 'lin':
-            res = theta * v
-        else:
-            res = np.zeros_like(lmbda)
-        if lmbda.shape[0] == 1:
-            res = res.sum() * np.ones((1,))
-        return res
+        return reg_cross(self.reg, theta, lmbda, v)
 
     def hvp(self, theta, lmbda, v, idx):
         tmp = hvp_log_loss(self.X[idx], self.y[idx], theta, v)
@@ -466,7 +1050,7 @@ class LogisticRegressionOracle(BaseOracle):
             lmbda = np.maximum(lmbda, 0)
         return theta, lmbda
 
-    def inverse_hvp(self, theta, lmbda, v, idx, approx='cg'):
+    def inverse_hvp(self, theta, lmbda, v, idx, approx='cg', x0=None):
         if approx == 'id':
             return v
         if approx != 'cg':
@@ -474,9 +1058,11 @@ class LogisticRegressionOracle(BaseOracle):
         x_i = self.X[idx]
         y_i = self.y[idx]
         Hop = _get_hvp_op(x_i, y_i, theta, self.reg, lmbda)
+        if x0 is None:
+            x0 = v
         Hv, success = splinalg.cg(
             Hop, v,
-            x0=v.copy(),
+            x0=x0.copy(),
             tol=1e-8,
             maxiter=5000,
         )
@@ -484,11 +1070,11 @@ class LogisticRegressionOracle(BaseOracle):
             print('CG did not converge to the desired precision')
         return Hv
 
-    def oracles(self, theta, lmbda, v, idx, inverse='id'):
+    def oracles(self, theta, lmbda, v, idx, inverse='id', out=None):
         """Returns the value, the gradient,
         """
         val, grad, hvp = value_grad_hvp_log_loss(
-            self.X[idx], self.y[idx], theta, v
+            self.X[idx], self.y[idx], theta, v, out=out
         )
         inv_hvp = self.inverse_hvp(theta, lmbda, v, idx, approx=inverse)
 
@@ -500,6 +1086,39 @@ class LogisticRegressionOracle(BaseOracle):
 
         return val, grad, hvp, self.cross(theta, lmbda, inv_hvp, idx)
 
+    def grad_inner_var_stack(self, thetas, lmbdas, idx):
+        grads = grad_theta_log_loss_stack(self.X[idx], self.y[idx], thetas)
+        return reg_grad_stack(self.reg, grads, thetas, lmbdas)
+
+    def grad_pair(self, theta, theta_old, lmbda, lmbda_old, idx):
+        grads = grad_theta_log_loss_pair(
+            self.X[idx], self.y[idx], theta, theta_old
+        )
+        grad, grad_lmbda = reg_grad(self.reg, grads[0], theta, lmbda)
+        grad_old, grad_lmbda_old = reg_grad(
+            self.reg, grads[1], theta_old, lmbda_old
+        )
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((grad, (outer_idx, grad_lmbda)),
+                (grad_old, (outer_idx, grad_lmbda_old)))
+
+    def oracles_pair(self, theta, theta_old, lmbda, lmbda_old, v, v_old,
+                     idx):
+        val, val_old, out = value_grad_hvp_log_loss_pair(
+            self.X[idx], self.y[idx], theta, theta_old, v, v_old
+        )
+        val, grad, hvp = reg_oracles(
+            self.reg, val, out[0], out[1], theta, lmbda, v
+        )
+        val_old, grad_old, hvp_old = reg_oracles(
+            self.reg, val_old, out[2], out[3], theta_old, lmbda_old, v_old
+        )
+        cross_v = self.cross(theta, lmbda, v, idx)
+        cross_v_old = self.cross(theta_old, lmbda_old, v_old, idx)
+        outer_idx = slice(0, lmbda.shape[0])
+        return ((val, grad, hvp, (outer_idx, cross_v)),
+                (val_old, grad_old, hvp_old, (outer_idx, cross_v_old)))
+
     def lipschitz_inner(self, theta, lmbda):
         Hop = _get_hvp_op(self.X, self.y, theta, self.reg, lmbda)
         return svds(Hop, k=1, return_singular_vectors=False)
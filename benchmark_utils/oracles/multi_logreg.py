@@ -6,7 +6,20 @@ from scipy import sparse
 import scipy.special as sc
 from scipy.sparse import linalg as splinalg
 
+from numba import njit, int64, types
+
 from .base import BaseOracle
+from .special import logsumexp as logsumexp_njit
+from .special import softmax as softmax_njit
+from .special import softmax_hvp as softmax_hvp_njit
+from .special import my_softmax_and_logsumexp as softmax_and_logsumexp_njit
+
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    from benchmark_utils.numba_utils import one_hot_fancy_index
+    from benchmark_utils.numba_utils import jitclass_dtypes
+    from benchmark_utils.oracle_utils import dot_out
 
 import warnings
 
@@ -52,6 +65,315 @@ def jax_loss(theta, lmbda, X, y):
     return jnp.mean(batched_loss(theta, lmbda, X, y), axis=0)
 
 
+def reg_grad(reg, grad_theta, theta_flat, lmbda):
+    """Adds the regularization of parametrization reg to the gradient of the
+    loss grad_theta, and returns it with the gradient in lmbda, which is empty
+    for reg='none'."""
+    if reg == 'exp':
+        alpha = np.exp(lmbda)
+        theta = theta_flat.reshape(-1, lmbda.shape[0])
+        grad = grad_theta.reshape(-1, lmbda.shape[0])
+        grad += alpha * theta
+        return grad_theta, alpha * (theta * theta).sum(axis=0) / 2
+    elif reg != 'none':
+        raise NotImplementedError()
+    return grad_theta, np.zeros(0, lmbda.dtype)
+
+
+reg_grad_njit = njit(reg_grad, cache=True)
+
+
+def reg_oracles(reg, loss, grad_theta, hvp, theta_flat, lmbda, v_flat):
+    """Adds the regularization of parametrization reg to the value, gradient
+    and hessian-vector product of the loss, and returns them with the cross
+    derivative with v_flat, which is empty for reg='none'."""
+    if reg == 'exp':
+        alpha = np.exp(lmbda)
+        theta = theta_flat.reshape(-1, lmbda.shape[0])
+        v = v_flat.reshape(-1, lmbda.shape[0])
+        loss += alpha @ (theta * theta).sum(axis=0) / 2
+        grad = grad_theta.reshape(-1, lmbda.shape[0])
+        grad += alpha * theta
+        hvp_theta = hvp.reshape(-1, lmbda.shape[0])
+        hvp_theta += alpha * v
+        return loss, grad_theta, hvp, alpha * (theta * v).sum(axis=0)
+    elif reg != 'none':
+        raise NotImplementedError()
+    return loss, grad_theta, hvp, np.zeros(0, lmbda.dtype)
+
+
+reg_oracles_njit = njit(reg_oracles, cache=True)
+
+
+def get_spec(dtype):
+    """Spec of the numba oracle for data of the numba type dtype."""
+    return [
+        # X is read-only so that memory-mapped data can be used without copy
+        ('X', types.Array(dtype, 2, 'C', readonly=True)),
+        ('y', dtype[:, ::1]),
+        ('reg', types.unicode_type),
+        ('n_samples', int64),
+        ('n_features', int64),
+        ('n_classes', int64),
+        ("variables_shape", int64[:, ::1])
+    ]
+
+
+@jitclass_dtypes(get_spec)
+class MultiLogRegOracleNumba():
+    """Numba class defining the oracles for multiclass logistic regression.
+
+    Parameters
+    ----------
+    X : ndarray, shape (n_samples, n_features)
+        Input data for the model.
+    y : ndarray, shape (n_samples, n_classes)
+        One hot encoded targets.
+    reg : {'exp', 'none'}, default='exp',
+        Parametrization of the regularization parameter
+        - 'exp' the parametrization is exponential
+        - 'none' no regularization
+    """
+    def __init__(self, X, y, reg='exp'):
+
+        self.X = X
+        self.y = y
+        self.reg = reg
+
+        # attributes
+        self.n_samples = X.shape[0]
+        self.n_features = X.shape[1]
+        self.n_classes = y.shape[1]
+        self.variables_shape = np.array(
+            [[self.n_features * self.n_classes], [self.n_classes]]
+        )
+
+    def set_order(self, idx):
+        self.X = self.X[idx]
+        self.y = self.y[idx]
+
+    def value(self, theta_flat, lmbda, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+
+        prod = x @ theta
+        loss = (-one_hot_fancy_index(prod, y) + logsumexp_njit(prod)).mean()
+        regul = 0.
+        if self.reg == 'exp':
+            alpha = np.exp(lmbda)
+            regul = alpha @ (theta * theta).sum(axis=0) / 2
+        return loss + 0.5 * regul
+
+    def grad_inner_var(self, theta_flat, lmbda, idx, out=None):
+        x = self.X[idx]
+        y = self.y[idx]
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty(self.n_features * self.n_classes, self.X.dtype)
+
+        n_samples = x.shape[0]
+        Y_proba = softmax_njit(x @ theta)
+        grad_theta = out.reshape(self.n_features, self.n_classes)
+        np.dot(x.T, Y_proba - y, grad_theta)
+        grad_theta /= n_samples
+
+        if self.reg == 'exp':
+            alpha = np.exp(lmbda)
+            grad_theta += alpha * theta
+
+        return out
+
+    def grad_outer_var(self, theta_flat, lmbda, idx):
+        if self.reg == 'exp':
+            alpha = np.exp(lmbda)
+            theta = theta_flat.reshape(self.n_features, self.n_classes)
+            grad_lmbda = alpha * (theta * theta).sum(axis=0) / 2
+        elif self.reg == 'none':
+            grad_lmbda = np.zeros_like(lmbda)
+        else:
+            raise ValueError()
+
+        return grad_lmbda
+
+    def grad(self, theta_flat, lmbda, idx, out=None):
+        return (self.grad_inner_var(theta_flat, lmbda, idx, out),
+                self.grad_outer_var(theta_flat, lmbda, idx))
+
+    def cross(self, theta_flat, lmbda, v_flat, idx):
+        if self.reg == "exp":
+            theta = theta_flat.reshape(self.n_features, self.n_classes)
+            v = v_flat.reshape(self.n_features, self.n_classes)
+            cross_v = np.exp(lmbda) * (theta * v).sum(axis=0)
+        else:
+            cross_v = np.zeros_like(lmbda)
+        return cross_v
+
+    def hvp(self, theta_flat, lmbda, v_flat, idx):
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        v = v_flat.reshape(self.n_features, self.n_classes)
+        x = self.X[idx]
+        n_samples = x.shape[0]
+        Y_proba = softmax_njit(x @ theta)
+        xv = x @ v
+        hvp = x.T @ softmax_hvp_njit(Y_proba, xv) / n_samples
+
+        if self.reg == 'exp':
+            alpha = np.exp(lmbda)
+            hvp += alpha * v
+        elif self.reg != 'none':
+            raise NotImplementedError()
+        return hvp.ravel()
+
+    def prox(self, theta, lmbda):
+        return theta, lmbda
+
+    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse='id',
+                out=None):
+        """Returns the value, the gradient, the hvp and the cross derivatives
+        product with v."""
+        theta = theta_flat.reshape(self.n_features, self.n_classes)
+        v = v_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty((2, self.n_features * self.n_classes), self.X.dtype)
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        prod = x @ theta
+        Y_proba, lse = softmax_and_logsumexp_njit(prod)
+        loss = (-one_hot_fancy_index(prod, y) + lse).mean()
+        grad_theta = out[0].reshape(self.n_features, self.n_classes)
+        np.dot(x.T, Y_proba - y, grad_theta)
+        grad_theta /= n_samples
+        xv = x @ v
+        hvp = out[1].reshape(self.n_features, self.n_classes)
+        np.dot(x.T, softmax_hvp_njit(Y_proba, xv), hvp)
+        hvp /= n_samples
+        cross_v = np.zeros(self.n_classes, lmbda.dtype)
+
+        if self.reg == 'exp':
+            alpha = np.exp(lmbda)
+            loss += alpha @ (theta * theta).sum(axis=0) / 2
+            grad_theta += alpha * theta
+            hvp += alpha * v
+            cross_v += alpha * (theta * v).sum(axis=0)
+        elif self.reg != 'none':
+            raise NotImplementedError()
+        return loss, out[0], out[1], cross_v
+
+    def grad_sparse(self, theta_flat, lmbda, idx, out=None):
+        if self.reg == 'none':
+            # The function does not depend on lmbda.
+            return (self.grad_inner_var(theta_flat, lmbda, idx, out),
+                    (slice(0, 0), np.zeros(0, lmbda.dtype)))
+        grad_theta, grad_lmbda = self.grad(theta_flat, lmbda, idx, out)
+        return grad_theta, (slice(0, lmbda.shape[0]), grad_lmbda)
+
+    def oracles_sparse(self, theta_flat, lmbda, v_flat, idx, inverse='id',
+                       out=None):
+        loss, grad, hvp, cross_v = self.oracles(
+            theta_flat, lmbda, v_flat, idx, inverse, out
+        )
+        if self.reg == 'none':
+            return loss, grad, hvp, (slice(0, 0), cross_v[:0])
+        return loss, grad, hvp, (slice(0, lmbda.shape[0]), cross_v)
+
+    def grad_inner_var_stack(self, thetas_flat, lmbdas, idx):
+        """Same as `grad_inner_var` at the rows of thetas_flat and lmbdas on
+        the same batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        n_points, k = thetas_flat.shape[0], self.n_classes
+        thetas = np.empty((self.n_features, n_points * k), self.X.dtype)
+        for i in range(n_points):
+            thetas[:, i * k:(i + 1) * k] = thetas_flat[i].reshape(
+                self.n_features, k
+            )
+        prod = x @ thetas
+        residuals = np.empty((n_samples, n_points * k), self.X.dtype)
+        for i in range(n_points):
+            residuals[:, i * k:(i + 1) * k] = (
+                softmax_njit(prod[:, i * k:(i + 1) * k]) - y
+            )
+        grads = x.T @ residuals / n_samples
+        res = np.empty((n_points, self.n_features * k), self.X.dtype)
+        for i in range(n_points):
+            grad_theta = np.ascontiguousarray(grads[:, i * k:(i + 1) * k])
+            if self.reg == 'exp':
+                grad_theta += np.exp(lmbdas[i]) * thetas[:, i * k:(i + 1) * k]
+            res[i] = grad_theta.ravel()
+        return res
+
+    def grad_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old, idx):
+        """Same as `grad_sparse` at (theta_flat, lmbda) and (theta_flat_old,
+        lmbda_old) on the same batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        k = self.n_classes
+        thetas = np.empty((self.n_features, 2 * k), self.X.dtype)
+        thetas[:, :k] = theta_flat.reshape(self.n_features, k)
+        thetas[:, k:] = theta_flat_old.reshape(self.n_features, k)
+        prod = x @ thetas
+        residuals = np.empty((n_samples, 2 * k), self.X.dtype)
+        residuals[:, :k] = softmax_njit(prod[:, :k]) - y
+        residuals[:, k:] = softmax_njit(prod[:, k:]) - y
+        grads = x.T @ residuals / n_samples
+        grad, grad_lmbda = reg_grad_njit(
+            self.reg, np.ascontiguousarray(grads[:, :k]).ravel(), theta_flat,
+            lmbda
+        )
+        grad_old, grad_lmbda_old = reg_grad_njit(
+            self.reg, np.ascontiguousarray(grads[:, k:]).ravel(),
+            theta_flat_old, lmbda_old
+        )
+        outer_idx = slice(0, grad_lmbda.shape[0])
+        return ((grad, (outer_idx, grad_lmbda)),
+                (grad_old, (outer_idx, grad_lmbda_old)))
+
+    def oracles_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old,
+                     v_flat, v_flat_old, idx):
+        """Same as `oracles_sparse` with inverse='id' at (theta_flat, lmbda,
+        v_flat) and (theta_flat_old, lmbda_old, v_flat_old) on the same
+        batch, which is read once."""
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples = x.shape[0]
+        k = self.n_classes
+        params = np.empty((self.n_features, 4 * k), self.X.dtype)
+        params[:, :k] = theta_flat.reshape(self.n_features, k)
+        params[:, k:2 * k] = theta_flat_old.reshape(self.n_features, k)
+        params[:, 2 * k:3 * k] = v_flat.reshape(self.n_features, k)
+        params[:, 3 * k:] = v_flat_old.reshape(self.n_features, k)
+        prod = x @ params
+        losses = np.empty(2, self.X.dtype)
+        weights = np.empty((n_samples, 4 * k), self.X.dtype)
+        for j in range(2):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            Y_proba, lse = softmax_and_logsumexp_njit(prod_j)
+            losses[j] = (-one_hot_fancy_index(prod_j, y) + lse).mean()
+            weights[:, 2 * j * k:(2 * j + 1) * k] = Y_proba - y
+            weights[:, (2 * j + 1) * k:(2 * j + 2) * k] = softmax_hvp_njit(
+                Y_proba, prod[:, (2 + j) * k:(3 + j) * k]
+            )
+        res = x.T @ weights / n_samples
+        val, grad, hvp, cross_v = reg_oracles_njit(
+            self.reg, losses[0], np.ascontiguousarray(res[:, :k]).ravel(),
+            np.ascontiguousarray(res[:, k:2 * k]).ravel(), theta_flat, lmbda,
+            v_flat
+        )
+        val_old, grad_old, hvp_old, cross_v_old = reg_oracles_njit(
+            self.reg, losses[1],
+            np.ascontiguousarray(res[:, 2 * k:3 * k]).ravel(),
+            np.ascontiguousarray(res[:, 3 * k:]).ravel(), theta_flat_old,
+            lmbda_old, v_flat_old
+        )
+        outer_idx = slice(0, cross_v.shape[0])
+        return ((val, grad, hvp, (outer_idx, cross_v)),
+                (val_old, grad_old, hvp_old, (outer_idx, cross_v_old)))
+
+
 class MultiLogRegOracle(BaseOracle):
     """Class defining the oracles for multiclass logistic regression
 
@@ -77,7 +399,7 @@ class MultiLogRegOracle(BaseOracle):
 
         # Store info for other
         self.X = X
-        self.y = y.astype(np.float64)
+        self.y = y.astype(X.dtype)
         self.reg = reg
 
         # attributes
@@ -88,8 +410,18 @@ class MultiLogRegOracle(BaseOracle):
         )
 
     def _get_numba_oracle(self):
-        raise NotImplementedError("No Numba implementation for multi logreg  "
-                                  + "oracle available")
+        if sparse.issparse(self.X):
+            raise ValueError("X should not be sparse")
+        # No copy if X is already C-contiguous, e.g. a memory-mapped array.
+        return MultiLogRegOracleNumba[self.X.dtype](
+            np.ascontiguousarray(self.X), self.y, self.reg
+        )
+
+    def get_outer_block_size(self, batch_size):
+        if self.reg == 'none':
+            # The function does not depend on lmbda.
+            return 0
+        return None
 
     def _get_jax_oracle(self, get_full_batch=False):
         if sparse.issparse(self.X):
@@ -145,22 +477,25 @@ class MultiLogRegOracle(BaseOracle):
             regul = 0.5 * alpha @ (theta * theta).sum(axis=0)
         return loss + 0.5 * regul
 
-    def grad_inner_var(self, theta_flat, lmbda, idx):
+    def grad_inner_var(self, theta_flat, lmbda, idx, out=None):
         x = self.X[idx]
         y = self.y[idx]
         theta = theta_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty(self.n_features * self.n_classes, self.X.dtype)
 
         n_samples, n_features = x.shape
         Y_proba = sc.softmax(safe_sparse_dot(x, theta), axis=1)
-        grad_theta = safe_sparse_dot(
-            x.T, (Y_proba - y)
-        ) / n_samples
+        grad_theta = dot_out(
+            x.T, (Y_proba - y), out=out.reshape(n_features, self.n_classes)
+        )
+        grad_theta /= n_samples
 
         if self.reg == 'exp':
             alpha = np.exp(lmbda)
             grad_theta += alpha * theta
 
-        return grad_theta.ravel()
+        return out
 
     def grad_outer_var(self, theta_flat, lmbda, idx):
 
@@ -175,27 +510,9 @@ class MultiLogRegOracle(BaseOracle):
 
         return grad_lmbda
 
-    def grad(self, theta_flat, lmbda, idx):
-        x = self.X[idx]
-        y = self.y[idx]
-        theta = theta_flat.reshape(self.n_features, self.n_classes)
-
-        n_samples, n_features = x.shape
-        Y_proba = sc.softmax(safe_sparse_dot(x, theta), axis=1)
-        grad_theta = safe_sparse_dot(
-            x.T, (Y_proba - y)
-        ) / n_samples
-
-        if self.reg == 'exp':
-            alpha = np.exp(lmbda)
-            grad_theta += alpha * theta
-            grad_lmbda = 0.5 * alpha * (theta * theta).sum(axis=0)
-        elif self.reg == 'none':
-            grad_lmbda = np.zeros_like(lmbda)
-        else:
-            raise ValueError()
-
-        return grad_theta.ravel(), grad_lmbda
+    def grad(self, theta_flat, lmbda, idx, out=None):
+        return (self.grad_inner_var(theta_flat, lmbda, idx, out=out),
+                self.grad_outer_var(theta_flat, lmbda, idx))
 
     def cross(self, theta_flat, lmbda, v_flat, idx):
         if self.reg == "exp":
@@ -263,10 +580,13 @@ class MultiLogRegOracle(BaseOracle):
             print("CG did not converge to the desired precision")
         return Hv
 
-    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse="id"):
+    def oracles(self, theta_flat, lmbda, v_flat, idx, inverse="id",
+                out=None):
         """Returns the value, the gradient,"""
         theta = theta_flat.reshape(self.n_features, self.n_classes)
         v = v_flat.reshape(self.n_features, self.n_classes)
+        if out is None:
+            out = np.empty((2, self.n_features * self.n_classes), self.X.dtype)
         x = self.X[idx]
         y = self.y[idx]
         n_samples, n_features = x.shape
@@ -274,12 +594,17 @@ class MultiLogRegOracle(BaseOracle):
         Y_proba, lse = my_softmax_and_logsumexp(prod)
         individual_losses = -prod[y == 1] + lse
         loss = (individual_losses).mean()
-        grad_theta = safe_sparse_dot(x.T, Y_proba - y) / n_samples
+        grad_theta = dot_out(
+            x.T, Y_proba - y, out=out[0].reshape(n_features, self.n_classes)
+        )
+        grad_theta /= n_samples
         xv = safe_sparse_dot(x, v)
-        hvp = safe_sparse_dot(
-            x.T, (softmax_hvp(Y_proba, xv))
-        ) / n_samples
-        cross_v = np.zeros(self.n_classes)
+        hvp = dot_out(
+            x.T, (softmax_hvp(Y_proba, xv)),
+            out=out[1].reshape(n_features, self.n_classes)
+        )
+        hvp /= n_samples
+        cross_v = np.zeros(self.n_classes, lmbda.dtype)
 
         if self.reg == 'exp':
             alpha = np.exp(lmbda)
@@ -289,7 +614,98 @@ class MultiLogRegOracle(BaseOracle):
             cross_v += alpha * (theta * v).sum(axis=0)
         elif self.reg != 'none':
             raise NotImplementedError
-        return loss, grad_theta.ravel(), hvp.ravel(), cross_v.ravel()
+        return loss, out[0], out[1], cross_v.ravel()
+
+    def grad_sparse(self, theta_flat, lmbda, idx, out=None):
+        if self.reg == 'none':
+            # The function does not depend on lmbda, which has one entry per
+            # sample in the datacleaning problem.
+            return (self.grad_inner_var(theta_flat, lmbda, idx, out=out),
+                    (slice(0, 0), np.zeros(0, lmbda.dtype)))
+        return super().grad_sparse(theta_flat, lmbda, idx, out=out)
+
+    def oracles_sparse(self, theta_flat, lmbda, v_flat, idx, inverse='id',
+                       out=None):
+        loss, grad, hvp, cross_v = self.oracles(
+            theta_flat, lmbda, v_flat, idx, inverse=inverse, out=out
+        )
+        if self.reg == 'none':
+            return loss, grad, hvp, (slice(0, 0), cross_v[:0])
+        return loss, grad, hvp, (slice(0, lmbda.shape[0]), cross_v)
+
+    def grad_inner_var_stack(self, thetas_flat, lmbdas, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        n_points, k = thetas_flat.shape[0], self.n_classes
+        thetas = thetas_flat.reshape(n_points, n_features, k)
+        prod = safe_sparse_dot(x, np.concatenate(thetas, axis=1))
+        Y_proba = sc.softmax(prod.reshape(n_samples, n_points, k), axis=2)
+        residuals = (Y_proba - y[:, None]).reshape(n_samples, n_points * k)
+        grads = safe_sparse_dot(x.T, residuals) / n_samples
+        grads = grads.reshape(n_features, n_points, k).transpose(1, 0, 2)
+        if self.reg == 'exp':
+            grads = grads + np.exp(lmbdas)[:, None] * thetas
+        return grads.reshape(n_points, n_features * k)
+
+    def grad_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        k = self.n_classes
+        prod = safe_sparse_dot(x, np.concatenate([
+            theta_flat.reshape(n_features, k),
+            theta_flat_old.reshape(n_features, k)
+        ], axis=1))
+        residuals = np.concatenate([
+            sc.softmax(prod[:, :k], axis=1) - y,
+            sc.softmax(prod[:, k:], axis=1) - y
+        ], axis=1)
+        grads = safe_sparse_dot(x.T, residuals) / n_samples
+        grad, grad_lmbda = reg_grad(
+            self.reg, grads[:, :k].ravel(), theta_flat, lmbda
+        )
+        grad_old, grad_lmbda_old = reg_grad(
+            self.reg, grads[:, k:].ravel(), theta_flat_old, lmbda_old
+        )
+        outer_idx = slice(0, grad_lmbda.shape[0])
+        return ((grad, (outer_idx, grad_lmbda)),
+                (grad_old, (outer_idx, grad_lmbda_old)))
+
+    def oracles_pair(self, theta_flat, theta_flat_old, lmbda, lmbda_old,
+                     v_flat, v_flat_old, idx):
+        x = self.X[idx]
+        y = self.y[idx]
+        n_samples, n_features = x.shape
+        k = self.n_classes
+        prod = safe_sparse_dot(x, np.concatenate([
+            theta_flat.reshape(n_features, k),
+            theta_flat_old.reshape(n_features, k),
+            v_flat.reshape(n_features, k),
+            v_flat_old.reshape(n_features, k),
+        ], axis=1))
+        losses, weights = [], []
+        for j in range(2):
+            prod_j = prod[:, j * k:(j + 1) * k]
+            Y_proba, lse = my_softmax_and_logsumexp(prod_j)
+            losses.append((-prod_j[y == 1] + lse).mean())
+            weights.append(Y_proba - y)
+            weights.append(
+                softmax_hvp(Y_proba, prod[:, (2 + j) * k:(3 + j) * k])
+            )
+        res = safe_sparse_dot(x.T, np.concatenate(weights, axis=1))
+        res /= n_samples
+        val, grad, hvp, cross_v = reg_oracles(
+            self.reg, losses[0], res[:, :k].ravel(), res[:, k:2 * k].ravel(),
+            theta_flat, lmbda, v_flat
+        )
+        val_old, grad_old, hvp_old, cross_v_old = reg_oracles(
+            self.reg, losses[1], res[:, 2 * k:3 * k].ravel(),
+            res[:, 3 * k:].ravel(), theta_flat_old, lmbda_old, v_flat_old
+        )
+        outer_idx = slice(0, cross_v.shape[0])
+        return ((val, grad, hvp, (outer_idx, cross_v)),
+                (val_old, grad_old, hvp_old, (outer_idx, cross_v_old)))
 
     def accuracy(self, theta_flat, lmbda, x, y):
         if y.ndim == 2:
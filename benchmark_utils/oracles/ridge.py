@@ -203,8 +203,12 @@ class RidgeRegressionOracle(BaseOracle):
     def grad_outer_var(self, theta, lmbda, idx):
         return self.numba_oracle.grad_outer_var(theta, lmbda, idx)
 
-    def grad(self, theta, lmbda, idx):
-        return self.numba_oracle.grad(theta, lmbda, idx)
+    def grad(self, theta, lmbda, idx, out=None):
+        grad_theta, grad_lmbda = self.numba_oracle.grad(theta, lmbda, idx)
+        if out is not None:
+            out[:] = grad_theta
+            grad_theta = out
+        return grad_theta, grad_lmbda
 
     def cross(self, theta, lmbda, v, idx):
         return self.numba_oracle.cross(theta, lmbda, v, idx)
@@ -223,8 +227,14 @@ class RidgeRegressionOracle(BaseOracle):
     def prox(self, theta, lmbda):
         return self.numba_oracle.prox(theta, lmbda)
 
-    def oracles(self, theta, lmbda, v, idx, inverse='id'):
-        return self.numba_oracle.oracles(theta, lmbda, v, idx, inverse)
+    def oracles(self, theta, lmbda, v, idx, inverse='id', out=None):
+        val, grad, hvp, cross_v = self.numba_oracle.oracles(
+            theta, lmbda, v, idx, inverse
+        )
+        if out is not None:
+            out[0], out[1] = grad, hvp
+            grad, hvp = out[0], out[1]
+        return val, grad, hvp, cross_v
 
     def lipschitz_inner(self, inner_var, outer_var):
         H = np.dot(self.X.T, self.X) / self.X.shape[0]
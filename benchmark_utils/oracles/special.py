@@ -27,7 +27,7 @@ def logsig(x):
     return out
 
 
-logsig_njit = njit(logsig)
+logsig_njit = njit(logsig, cache=True)
 
 
 def expit(t):
@@ -46,10 +46,10 @@ def expit(t):
     return out
 
 
-expit_njit = njit(expit)
+expit_njit = njit(expit, cache=True)
 
 
-@njit
+@njit(cache=True)
 def logsumexp(x):
     """Computes the logsumexp function."""
     m = np_max(x, axis=1)
@@ -60,20 +60,20 @@ def logsumexp(x):
     return lse
 
 
-@njit
+@njit(cache=True)
 def softmax(x):
     """Computes the softmax function."""
     return np.exp(x - logsumexp(x).reshape(-1, 1))
 
 
-@njit
+@njit(cache=True)
 def my_softmax_and_logsumexp(x):
     lse = logsumexp(x)
     s = np.exp(x - lse.reshape(-1, 1))
     return s, lse
 
 
-@njit
+@njit(cache=True)
 def softmax_hvp(z, v):
     """
     Computes the HVP for the softmax at x times v where z = softmax(x)
@@ -1,4 +1,5 @@
 import jax
+import numpy as np
 from functools import partial
 
 
@@ -58,23 +59,25 @@ def sgd_inner_vrbo(joint_shia, inner_oracle, outer_oracle, inner_var,
                    hia_lr):
     for i in range(n_steps):
         # Step.4.k.1 - Update direction for z
+        # The current and the old iterates are evaluated together on the
+        # batch.
         slice_inner, _ = inner_sampler.get_batch()
-        grad_inner_var = inner_oracle.grad_inner_var(
-            inner_var, outer_var, slice_inner
-        )
-        grad_inner_var_old = inner_oracle.grad_inner_var(
-            memory_inner[0], outer_var, slice_inner
+        (grad_inner_var, _), (grad_inner_var_old, _) = inner_oracle.grad_pair(
+            inner_var, memory_inner[0], outer_var, outer_var, slice_inner
         )
         memory_inner[1] += grad_inner_var - grad_inner_var_old
 
         # Step.4.k.2 - Update direction for x
         slice_outer, _ = outer_sampler.get_batch()
-        grad_outer, impl_grad = outer_oracle.grad(
-            inner_var, outer_var, slice_outer
-        )
-        grad_outer_old, impl_grad_old = outer_oracle.grad(
-            memory_inner[0], outer_var, slice_outer
-        )
+        (grad_outer, (idx_outer, grad_outer_var)), \
+            (grad_outer_old, (_, grad_outer_var_old)) = \
+            outer_oracle.grad_pair(
+                inner_var, memory_inner[0], outer_var, outer_var, slice_outer
+            )
+        impl_grad = np.zeros_like(outer_var)
+        impl_grad[idx_outer] = grad_outer_var
+        impl_grad_old = np.zeros_like(outer_var)
+        impl_grad_old[idx_outer] = grad_outer_var_old
         ihvp, ihvp_old = joint_shia(
             inner_oracle, inner_var, outer_var, grad_outer,
             memory_inner[0], outer_var, grad_outer_old,
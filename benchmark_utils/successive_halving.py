@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def criterion_score(values, max_stop_val=100):
+    """Score of one configuration, as `--criterion 100` of the plot script.
+
+    The metric is aggregated with the median over the seeds for each
+    evaluation, and the score is the lowest median reached in the first
+    `max_stop_val` evaluations. Lower is better.
+
+    Parameters
+    ----------
+    values : array, shape (n_evals, n_seeds)
+        Metric of each seed at each evaluation. Diverged runs should be
+        reported as `np.inf` or `np.nan`.
+    max_stop_val : int
+        Number of evaluations taken into account.
+    """
+    values = np.asarray(values, dtype=float)[:max_stop_val + 1]
+    values = np.where(np.isnan(values), np.inf, values)
+    return np.median(values, axis=1).min()
+
+
+def get_budgets(min_evals, max_evals, eta=2):
+    """Number of evaluations of each rung, from `min_evals` to `max_evals`
+    multiplied by `eta` at each rung."""
+    budgets = [min_evals]
+    while budgets[-1] < max_evals:
+        budgets.append(min(budgets[-1] * eta, max_evals))
+    return budgets
+
+
+def successive_halving(configs, evaluate, min_evals=4, max_evals=100, eta=2,
+                       max_stop_val=100):
+    """Select the best configurations with successive halving.
+
+    All the configurations are run for `min_evals` evaluations and ranked
+    with `criterion_score`. Only the best `1 / eta` fraction of them is run
+    again with an `eta` times larger budget, until `max_evals` is reached.
+
+    Parameters
+    ----------
+    configs : list
+        Hashable configurations to compare.
+    evaluate : callable
+        `evaluate(configs, n_evals)` returns a dict mapping each configuration
+        to its metric, an array of shape `(n_evals + 1, n_seeds)`.
+    min_evals : int
+        Budget of the first rung, in number of evaluations.
+    max_evals : int
+        Budget of the last rung.
+    eta : int
+        Inverse of the fraction of configurations kept at each rung.
+    max_stop_val : int
+        Number of evaluations taken into account in the score.
+
+    Returns
+    -------
+    rungs : list of tuple
+        For each rung, its budget and the list of `(config, score)` of the
+        configurations run at this rung, from the best to the worst.
+    """
+    rungs = []
+    configs = list(configs)
+    for n_evals in get_budgets(min_evals, max_evals, eta=eta):
+        values = evaluate(configs, n_evals)
+        ranking = sorted(
+            ((c, criterion_score(values[c], max_stop_val)) for c in configs),
+            key=lambda c_score: c_score[1]
+        )
+        rungs.append((n_evals, ranking))
+        n_keep = max(1, int(np.ceil(len(configs) / eta)))
+        configs = [c for c, _ in ranking[:n_keep]]
+    return rungs
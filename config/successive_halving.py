@@ -0,0 +1,215 @@
+"""Select the best step sizes of a config file with successive halving.
+
+All the `(step_size, outer_ratio)` pairs of the jax-batched solvers of a
+config file generated by `generate_yaml.py` are run with a small number of
+evaluations and ranked with the `--criterion 100` rule of
+`figures/plot_benchmark_bilevel.py`. Only the best fraction of them is run
+again with a larger budget. The winner of each solver is written in a
+`*_best_params.yml` like config file.
+"""
+from itertools import product
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from benchopt.benchmark import Benchmark, _extract_options
+from benchopt.utils.safe_import import set_benchmark_module
+from benchopt.utils.parametrized_name_mixin import product_param
+
+import argparse
+
+BENCHMARK_DIR = Path(__file__).parent.parent
+set_benchmark_module(BENCHMARK_DIR)
+
+from benchmark_utils.async_metrics import AsyncMetrics  # noqa
+from benchmark_utils.successive_halving import successive_halving  # noqa
+
+
+# Solvers implementing `run_sweep`
+BATCHED_SOLVERS = ['SOBA', 'SABA', 'SRBA']
+BATCHED_PARAMS = ['step_size', 'outer_ratio', 'random_state']
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def get_class(classes, name):
+    for klass in classes:
+        if klass.name.lower() == name.lower():
+            return klass
+    raise ValueError(f"Unknown class {name}.")
+
+
+def compute_metric(objective, metric, inner_var, outer_var):
+    """Metric of one iterate, `inf` for diverged runs."""
+    try:
+        value = objective.compute((inner_var, outer_var))[metric]
+    except ValueError:
+        return np.inf
+    return value if np.isfinite(value) else np.inf
+
+
+def get_metrics(objective, trajectories, metric, n_workers=4):
+    """Metric of each seed at each evaluation for each configuration.
+
+    The metrics are computed in a thread pool, and jax dispatches the solver
+    asynchronously, so the first evaluations are processed while the solver
+    is still computing the last iterates.
+    """
+    with AsyncMetrics(partial(compute_metric, objective, metric),
+                      n_workers=n_workers) as async_metrics:
+        for config, trajectory in trajectories.items():
+            for i, (inner_var, outer_var) in enumerate(trajectory):
+                for j in range(len(inner_var)):
+                    async_metrics.submit(
+                        (config, i, j), inner_var[j], outer_var[j]
+                    )
+        results = async_metrics.results()
+    return {
+        config: np.array([
+            [results[config, i, j] for j in range(len(inner_var))]
+            for i, (inner_var, _) in enumerate(trajectory)
+        ])
+        for config, trajectory in trajectories.items()
+    }
+
+
+def format_solver(name, params):
+    params = ','.join(f'{k}={v}' for k, v in params.items())
+    return f'{name}[{params}]'
+
+
+def get_best_solvers(objective, solver_specs, solver_classes, metric='value',
+                     min_evals=4, max_evals=100, eta=2, n_workers=4):
+    """Best `(step_size, outer_ratio)` of each jax-batched solver.
+
+    Returns the specs of the solvers of solver_specs in BATCHED_SOLVERS, with
+    the parameters of their best run, as formatted in a config file.
+    """
+    objective_dict = objective.get_objective()
+    best = []
+    for solver_spec in solver_specs:
+        solver_name, _, params = _extract_options(solver_spec)
+        if solver_name not in BATCHED_SOLVERS:
+            continue
+        solver_class = get_class(solver_classes, solver_name)
+        params['framework'] = 'jax'
+        configs = list(product(as_list(params['step_size']),
+                               as_list(params['outer_ratio'])))
+        random_states = as_list(params['random_state'])
+        static_params = {
+            k: as_list(v) for k, v in params.items()
+            if k not in BATCHED_PARAMS
+        }
+
+        results = []
+        for static in product_param(static_params):
+            solver = solver_class.get_instance(
+                **static, step_size=configs[0][0],
+                outer_ratio=configs[0][1], random_state=random_states[0]
+            )
+            skip, _ = solver.skip(**objective_dict)
+            if skip:
+                continue
+            solver.set_objective(**objective_dict)
+
+            def evaluate(configs, n_evals):
+                trajectories = solver.run_sweep(
+                    configs, random_states, n_evals=n_evals
+                )
+                return get_metrics(objective, trajectories, metric,
+                                   n_workers=n_workers)
+
+            rungs = successive_halving(
+                configs, evaluate, min_evals=min_evals, max_evals=max_evals,
+                eta=eta
+            )
+            for n_evals, ranking in rungs:
+                print(f"{format_solver(solver_name, static)} "
+                      f"{n_evals} evals: "
+                      f"{[(c, float(s)) for c, s in ranking]}")
+            (step_size, outer_ratio), score = rungs[-1][1][0]
+            results.append((score, dict(
+                **static, step_size=step_size, outer_ratio=outer_ratio,
+                random_state=random_states
+            )))
+
+        if len(results) > 0:
+            _, params = min(results, key=lambda r: r[0])
+            best.append(format_solver(solver_name, params))
+    return best
+
+
+def write_config(output, config, best):
+    """Write the config file running the solvers best with the objective and
+    the dataset of config."""
+    with open(output, "x") as f:
+        f.write("objective:\n")
+        for o in config['objective']:
+            f.write(f"  - {o}\n")
+        f.write("dataset:\n")
+        for d in config['dataset']:
+            f.write(f"  - {d}\n")
+        f.write("solver:\n")
+        for s in best:
+            f.write(f"  - {s}\n")
+        for key in ['n-repetitions', 'max-runs', 'timeout']:
+            if key in config:
+                f.write(f"{key}: {config[key]}\n")
+        f.write(f"output: {Path(output).stem}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Successive halving on the step sizes of a config file.'
+    )
+    parser.add_argument('config', type=str,
+                        help='Config file generated by generate_yaml.py.')
+    parser.add_argument('--metric', '-m', type=str, default='value',
+                        help='Metric used to rank the configurations.')
+    parser.add_argument('--min-evals', type=int, default=4,
+                        help='# of evaluations of the first rung.')
+    parser.add_argument('--max-evals', type=int, default=100,
+                        help='# of evaluations of the last rung.')
+    parser.add_argument('--eta', type=int, default=2,
+                        help='Only 1 / eta of the configurations are kept at '
+                        'each rung.')
+    parser.add_argument('--n-workers', type=int, default=4,
+                        help='# of threads computing the metrics.')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='Output config file.')
+    args = parser.parse_args()
+
+    config_file = Path(args.config)
+    with open(config_file) as f:
+        config = yaml.safe_load(f)
+    output = args.output
+    if output is None:
+        output = config_file.with_name(
+            f'{config_file.stem}_sh_best_params.yml'
+        )
+
+    benchmark = Benchmark(BENCHMARK_DIR)
+    _, _, objective_params = _extract_options(
+        config['objective'][0]
+    )
+    objective = benchmark.get_benchmark_objective().get_instance(
+        **objective_params
+    )
+    if len(config['dataset']) != 1:
+        raise ValueError("Successive halving needs a single dataset.")
+    dataset_name, _, dataset_params = _extract_options(config['dataset'][0])
+    dataset = get_class(benchmark.get_datasets(), dataset_name).get_instance(
+        **dataset_params
+    )
+    objective.set_dataset(dataset)
+
+    best = get_best_solvers(
+        objective, config['solver'], benchmark.get_solvers(),
+        metric=args.metric, min_evals=args.min_evals,
+        max_evals=args.max_evals, eta=args.eta, n_workers=args.n_workers
+    )
+    write_config(output, config, best)
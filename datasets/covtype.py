@@ -7,6 +7,8 @@ with safe_import_context() as import_ctx:
     from sklearn.datasets import fetch_covtype
     from sklearn.preprocessing import StandardScaler
     from sklearn.model_selection import train_test_split
+    from benchmark_utils.dataset_cache import load_splits
+    from benchmark_utils.oracle_utils import memoize_oracle
     from benchmark_utils.oracle_utils import convert_array_framework
 
 
@@ -22,9 +24,10 @@ class Dataset(BaseDataset):
         'reg': ['exp'],
         'n_reg': ['full'],
         'random_state': [2442],
+        'dtype': ['float64'],
     }
 
-    def get_data(self):
+    def get_splits(self):
         rng = np.random.RandomState(self.random_state)
         X, y = fetch_covtype(return_X_y=True, download_if_missing=True)
         y -= 1
@@ -40,7 +43,22 @@ class Dataset(BaseDataset):
         X_train = scaler.fit_transform(X_train)
         X_test = scaler.transform(X_test)
         X_val = scaler.transform(X_val)
+        return dict(
+            X_train=X_train.astype(self.dtype), y_train=y_train,
+            X_val=X_val.astype(self.dtype), y_val=y_val,
+            X_test=X_test.astype(self.dtype), y_test=y_test
+        )
+
+    def get_data(self):
+        splits = load_splits(
+            'covtype', dict(random_state=self.random_state, dtype=self.dtype),
+            self.get_splits
+        )
+        X_train, y_train = splits['X_train'], splits['y_train']
+        X_val, y_val = splits['X_val'], splits['y_val']
+        X_test, y_test = splits['X_test'], splits['y_test']
 
+        @memoize_oracle
         def get_inner_oracle(framework="none", get_full_batch=False):
             X = convert_array_framework(X_train, framework)
             y = convert_array_framework(y_train, framework)
@@ -49,6 +67,7 @@ class Dataset(BaseDataset):
             return oracle.get_framework(framework=framework,
                                         get_full_batch=get_full_batch)
 
+        @memoize_oracle
         def get_outer_oracle(framework="none", get_full_batch=False):
             X = convert_array_framework(X_val, framework)
             y = convert_array_framework(y_val, framework)
@@ -79,5 +98,6 @@ class Dataset(BaseDataset):
             oracle='multilogreg',
             metrics=metrics,
             n_reg=self.n_reg,
+            dtype=self.dtype,
         )
         return data
@@ -2,9 +2,13 @@ from benchopt import BaseDataset
 from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
+    import threading
+
     import numpy as np
     from benchmark_utils import oracles
     from libsvmdata import fetch_libsvm
+    from benchmark_utils.oracle_utils import memoize_oracle
+    from benchmark_utils.oracle_utils import array_lru_cache
     from benchmark_utils.oracle_utils import convert_array_framework
 
 
@@ -19,30 +23,54 @@ class Dataset(BaseDataset):
         'reg': ['exp'],
         'n_reg': ['full'],
         'oracle': ['logreg'],
+        'dtype': ['float64'],
     }
 
     def get_data(self):
         X_train, y_train = fetch_libsvm('ijcnn1')
         X_val, y_val = fetch_libsvm('ijcnn1_test')
 
-        def get_inner_oracle(framework="none", get_full_batch=False):
-            X = convert_array_framework(X_train, framework)
+        # The solvers run with self.dtype while the metrics are computed in
+        # float64, so that they do not depend on the precision of the solvers.
+        @memoize_oracle
+        def get_inner_oracle(framework="none", get_full_batch=False,
+                             dtype=self.dtype):
+            X = convert_array_framework(
+                X_train.astype(dtype, copy=False), framework
+            )
             y = convert_array_framework(y_train, framework)
             oracle = oracles.LogisticRegressionOracle(X, y, reg=self.reg)
             return oracle.get_framework(framework=framework,
                                         get_full_batch=get_full_batch)
 
-        def get_outer_oracle(framework="none", get_full_batch=False):
-            X = convert_array_framework(X_val, framework)
+        @memoize_oracle
+        def get_outer_oracle(framework="none", get_full_batch=False,
+                             dtype=self.dtype):
+            X = convert_array_framework(
+                X_val.astype(dtype, copy=False), framework
+            )
             y = convert_array_framework(y_val, framework)
             oracle = oracles.LogisticRegressionOracle(X, y)
             return oracle.get_framework(framework=framework,
                                         get_full_batch=get_full_batch)
 
-        def metrics(inner_var, outer_var):
-            f_train = get_inner_oracle(framework="none")
-            f_val = get_outer_oracle(framework="none")
-            inner_star = f_train.get_inner_var_star(outer_var)
+        # Last solutions of the inner problem and of the linear system, used
+        # to warm start the next evaluation. Only the evaluations of the main
+        # thread are warm started: the metrics computed in the threads of
+        # `AsyncMetrics` would otherwise depend on their order of execution.
+        main_warm_start = dict(inner_star=None, v=None)
+
+        @array_lru_cache(maxsize=128)
+        def value_function_metrics(outer_var):
+            if threading.current_thread() is threading.main_thread():
+                warm_start = main_warm_start
+            else:
+                warm_start = dict(inner_star=None, v=None)
+            f_train = get_inner_oracle(framework="none", dtype="float64")
+            f_val = get_outer_oracle(framework="none", dtype="float64")
+            inner_star = f_train.get_inner_var_star(
+                outer_var, inner_var0=warm_start['inner_star']
+            )
             value_function = f_val.get_value(inner_star, outer_var)
             grad_f_val_inner, grad_f_val_outer = f_val.get_grad(
                 inner_star, outer_var
@@ -50,20 +78,26 @@ class Dataset(BaseDataset):
             grad_value = grad_f_val_outer
             v = f_train.get_inverse_hvp(
                 inner_star, outer_var,
-                grad_f_val_inner
+                grad_f_val_inner, x0=warm_start['v']
             )
             grad_value -= f_train.get_cross(inner_star, outer_var, v)
+            warm_start.update(inner_star=inner_star, v=v)
 
             return dict(
                 value_func=value_function,
                 value=np.linalg.norm(grad_value)**2,
             )
 
+        def metrics(inner_var, outer_var):
+            # The metrics only depend on outer_var.
+            return dict(value_function_metrics(outer_var))
+
         data = dict(
             get_inner_oracle=get_inner_oracle,
             get_outer_oracle=get_outer_oracle,
             oracle='logreg',
             metrics=metrics,
             n_reg=self.n_reg,
+            dtype=self.dtype,
         )
         return data
@@ -12,11 +12,14 @@ with safe_import_context() as import_ctx:
     from sklearn.model_selection import train_test_split
 
     from benchmark_utils import oracles
+    from benchmark_utils.dataset_cache import load_splits
+    from benchmark_utils.oracle_utils import memoize_oracle
     from benchmark_utils.oracle_utils import convert_array_framework
 
 
 BASE_URL = "http://yann.lecun.com/exdb/mnist/"
 DATA_DIR = Path(__file__).parent / "data"
+MNIST_PICKLE = DATA_DIR / "mnist.pkl"
 
 
 def download_mnist():
@@ -42,7 +45,7 @@ def download_mnist():
             mnist[key] = np.frombuffer(
                 f.read(), np.uint8, offset=offset
             ).reshape(*shape)
-    with open("mnist.pkl", "wb") as f:
+    with open(MNIST_PICKLE, "wb") as f:
         pickle.dump(mnist, f)
     print("Save complete.")
 
@@ -58,15 +61,16 @@ class Dataset(BaseDataset):
         'ratio': [0.5, 0.7, 0.9],
         'random_state': [32],
         'oracle': ['datacleaning'],
+        'dtype': ['float64'],
     }
 
-    def get_data(self):
+    def get_splits(self):
         rng = np.random.RandomState(self.random_state)
         ratio = self.ratio
-        if not Path("mnist.pkl").exists():
+        if not MNIST_PICKLE.exists():
             download_mnist()
 
-        with open("mnist.pkl", "rb") as f:
+        with open(MNIST_PICKLE, "rb") as f:
             mnist = pickle.load(f)
 
         X_train, y_train, X_test, y_test = (
@@ -88,7 +92,23 @@ class Dataset(BaseDataset):
         X_train = scaler.fit_transform(X_train)
         X_test = scaler.transform(X_test)
         X_val = scaler.transform(X_val)
+        return dict(
+            X_train=X_train.astype(self.dtype), y_train=y_train,
+            X_val=X_val.astype(self.dtype), y_val=y_val,
+            X_test=X_test.astype(self.dtype), y_test=y_test
+        )
+
+    def get_data(self):
+        splits = load_splits(
+            'mnist', dict(random_state=self.random_state, ratio=self.ratio,
+                          dtype=self.dtype),
+            self.get_splits
+        )
+        X_train, y_train = splits['X_train'], splits['y_train']
+        X_val, y_val = splits['X_val'], splits['y_val']
+        X_test, y_test = splits['X_test'], splits['y_test']
 
+        @memoize_oracle
         def get_inner_oracle(framework="none", get_full_batch=False):
             X = convert_array_framework(X_train, framework)
             y = convert_array_framework(y_train, framework)
@@ -96,6 +116,7 @@ class Dataset(BaseDataset):
             return oracle.get_framework(framework=framework,
                                         get_full_batch=get_full_batch)
 
+        @memoize_oracle
         def get_outer_oracle(framework="none", get_full_batch=False):
             X = convert_array_framework(X_val, framework)
             y = convert_array_framework(y_val, framework)
@@ -125,6 +146,7 @@ class Dataset(BaseDataset):
             get_outer_oracle=get_outer_oracle,
             oracle='datacleaning',
             metrics=metrics,
-            n_reg=None
+            n_reg=None,
+            dtype=self.dtype,
         )
         return data
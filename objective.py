@@ -20,14 +20,16 @@ class Objective(BaseObjective):
 
     def get_one_solution(self):
         inner_shape, outer_shape = self.get_inner_oracle().variables_shape
-        return np.zeros(*inner_shape), np.zeros(*outer_shape)
+        return (np.zeros(*inner_shape, self.dtype),
+                np.zeros(*outer_shape, self.dtype))
 
     def set_data(self, get_inner_oracle, get_outer_oracle, oracle, metrics,
-                 n_reg):
+                 n_reg, dtype='float64'):
 
         self.get_inner_oracle = get_inner_oracle
         self.get_outer_oracle = get_outer_oracle
         self.metrics = metrics
+        self.dtype = dtype
 
         rng = check_random_state(self.random_state)
         inner_shape, outer_shape = self.get_inner_oracle().variables_shape
@@ -43,6 +45,10 @@ class Objective(BaseObjective):
             self.outer_var0 = -2 * np.ones(*outer_shape)
             # XXX: Try random inits
 
+        # The solvers run in the dtype of the data.
+        self.inner_var0 = self.inner_var0.astype(dtype)
+        self.outer_var0 = self.outer_var0.astype(dtype)
+
     def compute(self, beta):
         inner_var, outer_var = beta
 
@@ -5,8 +5,6 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit
-    from numba.experimental import jitclass
 
     from benchmark_utils import constants
     from benchmark_utils.minibatch_sampler import init_sampler
@@ -18,7 +16,8 @@ with safe_import_context() as import_ctx:
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -52,13 +51,6 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -80,11 +72,11 @@ class Solver(BaseSolver):
 
         if self.framework == 'numba':
             # JIT necessary functions and classes
-            self.sgd_v = njit(sgd_v)
-            njit_amigo = njit(_amigo)
-            self.sgd_inner = njit(sgd_inner)
-            self.MinibatchSampler = jitclass(MinibatchSampler, mbs_spec)
-            self.LearningRateScheduler = jitclass(
+            self.sgd_v = get_njit(sgd_v)
+            njit_amigo = get_njit(_amigo)
+            self.sgd_inner = get_njit(sgd_inner)
+            self.MinibatchSampler = get_jitclass(MinibatchSampler, mbs_spec)
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
 
@@ -136,7 +128,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq
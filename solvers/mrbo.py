@@ -5,8 +5,6 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit
-    from numba.experimental import jitclass
 
     from benchmark_utils import constants
     from benchmark_utils.minibatch_sampler import init_sampler
@@ -18,7 +16,8 @@ with safe_import_context() as import_ctx:
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -53,13 +52,6 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -80,10 +72,10 @@ class Solver(BaseSolver):
 
         if self.framework == 'numba':
             # JIT necessary functions and classes
-            njit_mrbo = njit(_mrbo)
-            njit_joint_shia = njit(joint_shia)
-            self.MinibatchSampler = jitclass(MinibatchSampler, mbs_spec)
-            self.LearningRateScheduler = jitclass(
+            njit_mrbo = get_njit(_mrbo)
+            njit_joint_shia = get_njit(joint_shia)
+            self.MinibatchSampler = get_jitclass(MinibatchSampler, mbs_spec)
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
 
@@ -122,7 +114,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq
@@ -208,12 +200,12 @@ def _mrbo(joint_shia, inner_oracle, outer_oracle, inner_var, outer_var,
         inner_lr, hia_lr, eta, outer_lr = lr_scheduler.get_lr()
 
         # Step.1 - Update direction for z with momentum
+        # The current and the old iterates are evaluated together on the
+        # batch.
         slice_inner, _ = inner_sampler.get_batch()
-        grad_inner_var = inner_oracle.grad_inner_var(
-            inner_var, outer_var, slice_inner
-        )
-        grad_inner_var_old = inner_oracle.grad_inner_var(
-            memory_inner[0], memory_outer[0], slice_inner
+        (grad_inner_var, _), (grad_inner_var_old, _) = inner_oracle.grad_pair(
+            inner_var, memory_inner[0], outer_var, memory_outer[0],
+            slice_inner
         )
         memory_inner[1] = eta * grad_inner_var + (1-eta) * (
             memory_inner[1] + grad_inner_var - grad_inner_var_old
@@ -221,12 +213,16 @@ def _mrbo(joint_shia, inner_oracle, outer_oracle, inner_var, outer_var,
 
         # Step.2 - Compute implicit grad approximation with HIA
         slice_outer, _ = outer_sampler.get_batch()
-        grad_outer, impl_grad = outer_oracle.grad(
-            inner_var, outer_var, slice_outer
-        )
-        grad_outer_old, impl_grad_old = outer_oracle.grad(
-            memory_inner[0], memory_outer[0], slice_outer
-        )
+        (grad_outer, (idx_outer, grad_outer_var)), \
+            (grad_outer_old, (_, grad_outer_var_old)) = \
+            outer_oracle.grad_pair(
+                inner_var, memory_inner[0], outer_var, memory_outer[0],
+                slice_outer
+            )
+        impl_grad = np.zeros_like(outer_var)
+        impl_grad[idx_outer] = grad_outer_var
+        impl_grad_old = np.zeros_like(outer_var)
+        impl_grad_old[idx_outer] = grad_outer_var_old
         ihvp, ihvp_old = joint_shia(
             inner_oracle, inner_var, outer_var, grad_outer,
             memory_inner[0], memory_outer[0], grad_outer_old,
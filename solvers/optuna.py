@@ -3,21 +3,30 @@ from benchopt import safe_import_context
 from benchopt.stopping_criterion import SufficientProgressCriterion
 
 with safe_import_context() as import_ctx:
+    import threading
+
     import numpy as np
     import optuna
 
 
 class Solver(BaseSolver):
-    """Hyperparameter Selection with Optuna."""
+    """Hyperparameter Selection with Optuna.
+
+    The best trial is evaluated after each batch of `n_jobs` trials, run in
+    `n_jobs` threads. The inner problem of each trial is solved with L-BFGS
+    warm started from the inner solution of the nearest outer variable
+    already evaluated.
+    """
     name = 'Optuna'
     stopping_criterion = SufficientProgressCriterion(
-        patience=100, strategy='iteration'
+        patience=100, strategy='callback'
     )
 
     install_cmd = 'conda'
     requirements = ['pip:optuna']
     parameters = {
         'random_state': [1],
+        'n_jobs': [1],
     }
 
     @staticmethod
@@ -32,31 +41,50 @@ class Solver(BaseSolver):
         self.f_inner = f_train(framework='none')
         self.f_outer = f_val(framework='none')
 
-    def run(self, n_iter):
+        self.lock = threading.Lock()
+
+    def init_study(self):
+        """Returns an empty study and an empty dict for the (outer_var,
+        inner_var) evaluated by its trials, by trial number."""
+        sampler = optuna.samplers.TPESampler(seed=self.random_state)
+        study = optuna.create_study(direction='minimize', sampler=sampler)
+        return study, {}
+
+    def get_warm_start(self, outer_var):
+        """Inner solution of the evaluated outer variable nearest to
+        outer_var, or None if no trial has been evaluated yet."""
+        with self.lock:
+            solutions = list(self.solutions.values())
+        if len(solutions) == 0:
+            return None
+        dist = [np.linalg.norm(outer - outer_var) for outer, _ in solutions]
+        return solutions[int(np.argmin(dist))][1]
+
+    def objective(self, trial):
+        outer_var = np.array([
+            trial.suggest_float(f'outer_var{k}', -15, 5)
+            for k in range(self.outer_var0.size)
+        ], dtype=self.outer_var0.dtype).reshape(self.outer_var0.shape)
+        inner_var = self.f_inner.get_inner_var_star(
+            outer_var, inner_var0=self.get_warm_start(outer_var)
+        )
+        with self.lock:
+            self.solutions[trial.number] = (outer_var, inner_var)
+        return self.f_outer.get_value(inner_var, outer_var)
+
+    def run(self, callback):
         optuna.logging.set_verbosity(optuna.logging.WARNING)
-        if n_iter == 0:
-            outer_var = self.outer_var0.copy()
-        else:
-            def obj_optuna(trial):
-                outer_var_flat = self.outer_var0.ravel()
-                for k in range(len(outer_var_flat)):
-                    outer_var_flat[k] = trial.suggest_float(
-                        f'outer_var{k}',
-                        -15,
-                        5
-                    )
-                outer_var = outer_var_flat.reshape(self.outer_var0.shape)
-                inner_var = self.f_inner.get_inner_var_star(outer_var)
-                return self.f_outer.get_value(inner_var, outer_var)
-
-            sampler = optuna.samplers.TPESampler(seed=self.random_state)
-            study = optuna.create_study(direction='minimize', sampler=sampler)
-            study.optimize(obj_optuna, n_trials=n_iter)
-            trial = study.best_trial
-            outer_var = np.array(list(trial.params.values())).reshape(
-                self.outer_var0.shape
-            )
+        self.study, self.solutions = self.init_study()
+
+        outer_var = self.outer_var0.copy()
         inner_var = self.f_inner.get_inner_var_star(outer_var)
+        while callback((inner_var, outer_var)):
+            self.study.optimize(
+                self.objective, n_trials=self.n_jobs, n_jobs=self.n_jobs
+            )
+            outer_var, inner_var = self.solutions[
+                self.study.best_trial.number
+            ]
         self.beta = (inner_var, outer_var)
 
     def get_result(self):
@@ -5,16 +5,15 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit
-    from numba.experimental import jitclass
 
     from benchmark_utils import constants
-    from benchmark_utils.gd_inner import gd_inner, gd_inner_jax
+    from benchmark_utils.gd_inner import gd_inner_stack, gd_inner_jax
     from benchmark_utils.learning_rate_scheduler import update_lr
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -46,14 +45,7 @@ class Solver(BaseSolver):
         return stop_val + 1
 
     def skip(self, f_train, f_val, **kwargs):
-        if self.framework == 'numba':
-            if isinstance(f_train(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
-        elif self.framework not in ['jax', 'none', 'numba']:
+        if self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
 
@@ -64,19 +56,19 @@ class Solver(BaseSolver):
 
         if self.framework == 'numba':
             # JIT necessary functions and classes
-            njit_pzobo = njit(_pzobo)
-            self.gd_inner = njit(gd_inner)
+            njit_pzobo = get_njit(_pzobo)
+            self.gd_inner = get_njit(gd_inner_stack)
 
             def pzobo(*args, **kwargs):
                 return njit_pzobo(self.gd_inner, *args, **kwargs)
             self.pzobo = pzobo
 
-            self.LearningRateScheduler = jitclass(
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
         elif self.framework == "none":
             # JIT necessary functions and classes
-            self.gd_inner = gd_inner
+            self.gd_inner = gd_inner_stack
 
             def pzobo(*args, **kwargs):
                 return _pzobo(self.gd_inner, *args, **kwargs)
@@ -97,7 +89,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq
@@ -168,28 +160,35 @@ def _pzobo(gd_inner, inner_oracle, outer_oracle, inner_var, outer_var, mu=.1,
     outer_var_shape = outer_var.shape[0]
     for i in range(max_iter):
         lr_inner, lr_outer = lr_scheduler.get_lr()
-        inner_var_old = inner_var.copy()
-
-        # Update inner variable by GD
-        inner_var = gd_inner(inner_oracle, inner_var, outer_var, lr_inner,
-                             n_steps=n_inner_steps)
 
-        # Sample gaussian vectors and perform ES estimation
+        # Sample gaussian vectors for the ES estimation
         U = np.random.randn(n_gaussian_vectors, outer_var_shape)
-        outer_var_aux = outer_var + mu * U
-        deltas = np.zeros((n_gaussian_vectors, inner_var_shape))
-        for q in range(n_gaussian_vectors):
-            deltas[q] = gd_inner(inner_oracle, inner_var_old,
-                                 outer_var_aux[q], lr_inner,
-                                 n_steps=n_inner_steps)
-            deltas[q] -= inner_var
-        deltas = deltas / mu
+
+        # Update the inner variable by GD at outer_var and at the perturbed
+        # outer variables together: the inner variables are stacked as the
+        # rows of a matrix, so that each GD step is a single product with
+        # the data for all of them.
+        outer_vars = np.empty((n_gaussian_vectors + 1, outer_var_shape),
+                              outer_var.dtype)
+        outer_vars[0] = outer_var
+        outer_vars[1:] = outer_var + mu * U
+        inner_vars = np.empty((n_gaussian_vectors + 1, inner_var_shape),
+                              inner_var.dtype)
+        inner_vars[:] = inner_var
+        inner_vars = gd_inner(inner_oracle, inner_vars, outer_vars, lr_inner,
+                              n_steps=n_inner_steps)
+        inner_var = inner_vars[0].copy()
+        deltas = inner_vars[1:] - inner_var
 
         grad_outer_in, grad_outer_out = outer_oracle.grad(
             inner_var, outer_var, slice(None)
         )
 
-        es_estimator = U.T.dot(deltas @ grad_outer_in) / n_gaussian_vectors
+        # deltas are in the dtype of the inner variable and U in the one of
+        # the outer variable, and they are divided by mu here.
+        es_estimator = U.T.dot(
+            (deltas @ grad_outer_in).astype(U.dtype)
+        ) / (mu * n_gaussian_vectors)
         outer_var -= lr_outer * (es_estimator + grad_outer_out)
 
     return inner_var, outer_var
@@ -206,34 +205,27 @@ def pzobo_jax(f_inner, f_outer, inner_var, outer_var, mu=.1,
     grad_outer = jax.grad(f_outer, argnums=(0, 1))
 
     def pzobo_one_iter(carry, _):
-        inner_var_shape = inner_var.shape[0]
         outer_var_shape = outer_var.shape[0]
         carry['key'] = jax.random.split(carry['key'], 1)[0]
         (inner_step_size, outer_step_size), carry['state_lr'] = update_lr(
             carry['state_lr']
         )
 
-        inner_var_old = carry['inner_var'].copy()
-
-        # Update inner variable by GD
-        carry['inner_var'] = gd_inner(grad_inner, carry['inner_var'],
-                                      carry['outer_var'], inner_step_size,
-                                      n_steps=n_inner_steps)
-
         U = jax.random.normal(carry['key'], (n_gaussian_vectors,
                                              outer_var_shape))
-        outer_var_aux = carry['outer_var'] + mu * U
-
-        def iter_fun(q, deltas):
-            deltasq = gd_inner(grad_inner, inner_var_old, outer_var_aux[q],
-                               inner_step_size, n_steps=n_inner_steps)
-            deltas = deltas.at[q].set(deltasq - carry['inner_var'])
-            return deltas
-
-        deltas = jax.lax.fori_loop(0, n_gaussian_vectors, iter_fun,
-                                   jnp.zeros((n_gaussian_vectors,
-                                              inner_var_shape)))
-        deltas /= mu
+        outer_vars = jnp.concatenate([
+            carry['outer_var'][None], carry['outer_var'] + mu * U
+        ])
+
+        # Update the inner variable by GD at outer_var and at the perturbed
+        # outer variables together, by vmapping the GD over the outer
+        # variables.
+        inner_vars = jax.vmap(
+            partial(gd_inner, grad_inner, n_steps=n_inner_steps),
+            in_axes=(None, 0, None)
+        )(carry['inner_var'], outer_vars, inner_step_size)
+        carry['inner_var'] = inner_vars[0]
+        deltas = (inner_vars[1:] - carry['inner_var']) / mu
         grad_outer_in, grad_outer_out = grad_outer(carry['inner_var'],
                                                    carry['outer_var'])
         es_estimator = U.T.dot(deltas @ grad_outer_in) / n_gaussian_vectors
@@ -5,18 +5,29 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit, prange
-    from numba.experimental import jitclass
+    from itertools import product
+    from numba import prange, get_num_threads
+    from numba import from_dtype, typed
 
     from benchmark_utils import constants
     from benchmark_utils.minibatch_sampler import init_sampler
+    from benchmark_utils.batched import run_batched, tree_stack
+    from benchmark_utils.batched import split_trajectory
+    from benchmark_utils.compressed_memory import CompressedMemory
+    from benchmark_utils.compressed_memory import get_numpy_dtype
+    from benchmark_utils.compressed_memory import init_compressed_memory
+    from benchmark_utils.compressed_memory import init_compressed_memory_jax
+    from benchmark_utils.compressed_memory import fill_compressed_memory_jax
+    from benchmark_utils.compressed_memory import update_compressed_memory_jax
+    from benchmark_utils.compressed_memory import get_spec as memory_spec
     from benchmark_utils.learning_rate_scheduler import update_lr
     from benchmark_utils.minibatch_sampler import MinibatchSampler
     from benchmark_utils.minibatch_sampler import spec as mbs_spec
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -42,6 +53,7 @@ class Solver(BaseSolver):
         'random_state': [1],
         'framework': ["numba"],
         'init_memory': ["zero"],
+        'memory_dtype': [None],
     }
 
     @staticmethod
@@ -52,13 +64,8 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
+            if self.memory_dtype in ['float16', 'bfloat16']:
+                return True, f"Numba does not support {self.memory_dtype}."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -79,34 +86,79 @@ class Solver(BaseSolver):
             self.batch_size_inner = self.batch_size
             self.batch_size_outer = self.batch_size
 
+        # When the gradients in outer_var of a batch are zero outside of a
+        # block, e.g. for per-sample outer variables, the memories only store
+        # this block. They are then `CompressedMemory`, in the dtype of the
+        # variables if memory_dtype is None.
+        self.block_sizes = (
+            f_train().get_outer_block_size(self.batch_size_inner),
+            f_val().get_outer_block_size(self.batch_size_outer),
+        )
+        compressed = (
+            self.memory_dtype is not None or self.block_sizes != (None, None)
+        )
+        if self.framework == 'jax':
+            memory_dtype = jnp.asarray(inner_var0).dtype.name
+        else:
+            memory_dtype = inner_var0.dtype.name
+        memory_dtype = self.memory_dtype or memory_dtype
+
         if self.framework == 'numba':
             # JIT necessary functions and classes
-            njit_saba = njit(_saba)
-            njit_vr = njit(variance_reduction)
-            njit_init_mem = njit(_init_memory)
-            njit_init_mem_fb = njit(_init_memory_fb)
-            self.MinibatchSampler = jitclass(MinibatchSampler, mbs_spec)
-            self.LearningRateScheduler = jitclass(
+            njit_saba = get_njit(_saba)
+            self.MinibatchSampler = get_jitclass(MinibatchSampler, mbs_spec)
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
+            if not compressed:
+                njit_vr = get_njit(variance_reduction)
+                njit_vr_step = get_njit(variance_reduction_step)
+                njit_init_mem = get_njit(_init_memory)
+                njit_init_mem_fb = get_njit(_init_memory_fb, parallel=True)
+
+                def get_memory(*args, **kwargs):
+                    return njit_init_mem(njit_init_mem_fb, *args, **kwargs)
+            else:
+                njit_vr = get_njit(variance_reduction_compressed)
+                njit_vr_step = get_njit(variance_reduction_step_compressed)
+                njit_init_mem_fb = get_njit(
+                    _init_memory_fb_compressed, parallel=True
+                )
+                Memory = get_jitclass(CompressedMemory, memory_spec(
+                    from_dtype(get_numpy_dtype(memory_dtype))
+                ))
 
-            def init_memory(*args, **kwargs):
-                return njit_init_mem(njit_init_mem_fb, *args, **kwargs)
-            self.init_memory = init_memory
+                def get_memory(*args, **kwargs):
+                    return _init_memory_compressed(
+                        njit_init_mem_fb, typed.Dict(), memory_dtype, Memory,
+                        self.block_sizes, *args, **kwargs
+                    )
+            self.get_memory = get_memory
 
             def saba(*args, **kwargs):
-                return njit_saba(njit_vr, *args, **kwargs)
+                return njit_saba(njit_vr, njit_vr_step, *args, **kwargs)
             self.saba = saba
         elif self.framework == "none":
             self.MinibatchSampler = MinibatchSampler
             self.LearningRateScheduler = LearningRateScheduler
+            if not compressed:
+                vr, vr_step = variance_reduction, variance_reduction_step
 
-            def init_memory(*args, **kwargs):
-                return _init_memory(_init_memory_fb, *args, **kwargs)
-            self.init_memory = init_memory
+                def get_memory(*args, **kwargs):
+                    return _init_memory(_init_memory_fb, *args, **kwargs)
+            else:
+                vr = variance_reduction_compressed
+                vr_step = variance_reduction_step_compressed
+
+                def get_memory(*args, **kwargs):
+                    return _init_memory_compressed(
+                        _init_memory_fb_compressed, {}, memory_dtype,
+                        CompressedMemory, self.block_sizes, *args, **kwargs
+                    )
+            self.get_memory = get_memory
 
             def saba(*args, **kwargs):
-                return _saba(variance_reduction, *args, **kwargs)
+                return _saba(vr, vr_step, *args, **kwargs)
             self.saba = saba
         elif self.framework == 'jax':
             self.f_inner = jax.jit(
@@ -115,23 +167,28 @@ class Solver(BaseSolver):
             self.f_outer = jax.jit(
                 partial(self.f_outer, batch_size=self.batch_size_outer)
             )
-            inner_sampler, self.state_inner_sampler \
-                = init_sampler(n_samples=n_inner_samples,
-                               batch_size=self.batch_size_inner)
-            outer_sampler, self.state_outer_sampler \
-                = init_sampler(n_samples=n_outer_samples,
-                               batch_size=self.batch_size_outer)
+            inner_sampler, _ = init_sampler(n_samples=n_inner_samples,
+                                            batch_size=self.batch_size_inner)
+            outer_sampler, _ = init_sampler(n_samples=n_outer_samples,
+                                            batch_size=self.batch_size_outer)
             self.weight_inner = self.batch_size_inner / n_inner_samples
             self.weight_outer = self.batch_size_outer / n_outer_samples
 
-            def init_memory(*args, **kwargs):
-                return _init_memory_jax(_init_memory_fb_jax, *args, **kwargs)
-            self.init_memory = init_memory
+            def get_memory(*args, **kwargs):
+                return _init_memory_jax(
+                    _init_memory_fb_jax, *args,
+                    memory_dtype=memory_dtype if compressed else None,
+                    block_sizes=self.block_sizes, **kwargs
+                )
+            self.get_memory = get_memory
             self.saba = partial(
                 saba_jax,
                 inner_sampler=inner_sampler,
                 outer_sampler=outer_sampler,
-                # variance_reduction=jax.jit(variance_reduction_jax)
+                variance_reduction=(
+                    update_compressed_memory_jax if compressed
+                    else variance_reduction_jax
+                ),
             )
         else:
             raise ValueError(f"Framework {self.framework} not supported.")
@@ -139,7 +196,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq  # // self.batch_size
@@ -148,28 +205,8 @@ class Solver(BaseSolver):
         inner_var = self.inner_var0.copy()
         outer_var = self.outer_var0.copy()
         if self.framework == 'jax':
-            v = jnp.zeros_like(inner_var)
-
-            step_sizes = jnp.array(
-                [self.step_size, self.step_size / self.outer_ratio]
-            )
-            exponents = jnp.zeros(2)
-            state_lr = init_lr_scheduler(step_sizes, exponents)
-
-            memory = self.init_memory(
-                self.f_inner, self.f_outer,
-                inner_var, outer_var, v,
-                n_inner_samples=self.n_inner_samples,
-                n_outer_samples=self.n_outer_samples,
-                batch_size_inner=self.batch_size_inner,
-                batch_size_outer=self.batch_size_outer,
-                inner_size=self.inner_size,
-                outer_size=self.outer_size,
-            )
-            carry = dict(
-                state_inner_sampler=self.state_inner_sampler,
-                state_outer_sampler=self.state_outer_sampler,
-                state_lr=state_lr,
+            (inner_var, outer_var, v, memory), carry = self.init_state_jax(
+                self.random_state
             )
         else:
             rng = np.random.RandomState(self.random_state)
@@ -189,9 +226,10 @@ class Solver(BaseSolver):
                 np.array(step_sizes, dtype=float), exponents
             )
 
-            memory = self.init_memory(
+            memory = self.get_memory(
                 self.f_inner, self.f_outer,
-                inner_var, outer_var, v, inner_sampler, outer_sampler
+                inner_var, outer_var, v, inner_sampler, outer_sampler,
+                mode=self.init_memory
             )
 
         # Start algorithm
@@ -216,6 +254,75 @@ class Solver(BaseSolver):
     def get_result(self):
         return self.beta
 
+    def init_state_jax(self, random_state, step_size=None,
+                       outer_ratio=None):
+        """Initial arguments and states of `saba_jax` for one run.
+
+        `step_size` and `outer_ratio` default to the solver parameters.
+        """
+        if step_size is None:
+            step_size = self.step_size
+        if outer_ratio is None:
+            outer_ratio = self.outer_ratio
+        inner_var = jnp.array(self.inner_var0)
+        outer_var = jnp.array(self.outer_var0)
+        v = jnp.zeros_like(inner_var)
+
+        step_sizes = jnp.array(
+            [step_size, step_size / outer_ratio]
+        )
+        exponents = jnp.zeros(2)
+        state_lr = init_lr_scheduler(step_sizes, exponents)
+        _, state_inner_sampler = init_sampler(
+            n_samples=self.n_inner_samples, batch_size=self.batch_size_inner,
+            random_state=random_state
+        )
+        _, state_outer_sampler = init_sampler(
+            n_samples=self.n_outer_samples, batch_size=self.batch_size_outer,
+            random_state=random_state
+        )
+
+        memory = self.get_memory(
+            self.f_inner, self.f_outer,
+            inner_var, outer_var, v, mode=self.init_memory,
+            n_inner_samples=self.n_inner_samples,
+            n_outer_samples=self.n_outer_samples,
+            batch_size_inner=self.batch_size_inner,
+            batch_size_outer=self.batch_size_outer,
+            inner_size=self.inner_size,
+            outer_size=self.outer_size,
+        )
+        carry = dict(
+            state_inner_sampler=state_inner_sampler,
+            state_outer_sampler=state_outer_sampler,
+            state_lr=state_lr,
+        )
+        return (inner_var, outer_var, v, memory), carry
+
+    def run_sweep(self, configs, random_states, n_evals=1):
+        """Run SABA for several step sizes and outer ratios with jax.
+
+        `configs` is a list of `(step_size, outer_ratio)`, for instance a grid
+        built with `itertools.product`. All the variables, memories and states
+        carry a leading axis over the `configs x random_states` runs and the
+        solver is vectorized with `jax.vmap`, so one compiled program advances
+        all of them. Returns a dict mapping each configuration to its list of
+        `(inner_var, outer_var)` every `eval_freq` iterations, with a leading
+        seed axis.
+        """
+        if self.framework != 'jax':
+            raise ValueError("Batched runs need the jax framework.")
+        runs = list(product(configs, random_states))
+        args, carry = tree_stack([
+            self.init_state_jax(seed, step_size=step_size,
+                                outer_ratio=outer_ratio)
+            for (step_size, outer_ratio), seed in runs
+        ])
+        solver = partial(self.saba, self.f_inner, self.f_outer,
+                         max_iter=self.eval_freq)
+        *_, trajectory = run_batched(solver, args, carry, n_evals=n_evals)
+        return split_trajectory(trajectory, [c for c, _ in runs])
+
 
 def _init_memory(
     _init_memory_fb,
@@ -231,12 +338,13 @@ def _init_memory(
     n_outer = outer_sampler.n_batches
     n_inner = inner_sampler.n_batches
     inner_size, outer_size = inner_oracle.variables_shape
+    dtype = inner_var.dtype
     memory = {
-        'inner_grad': np.zeros((n_inner + 1, inner_size[0])),
-        'hvp': np.zeros((n_inner + 1, inner_size[0])),
-        'cross_v': np.zeros((n_inner + 1, outer_size[0])),
-        'grad_in_outer': np.zeros((n_outer + 1, inner_size[0])),
-        'grad_out_outer': np.zeros((n_outer + 1, outer_size[0])),
+        'inner_grad': np.zeros((n_inner + 1, inner_size[0]), dtype),
+        'hvp': np.zeros((n_inner + 1, inner_size[0]), dtype),
+        'cross_v': np.zeros((n_inner + 1, outer_size[0]), dtype),
+        'grad_in_outer': np.zeros((n_outer + 1, inner_size[0]), dtype),
+        'grad_out_outer': np.zeros((n_outer + 1, outer_size[0]), dtype),
     }
     if mode == "full":
         memory = _init_memory_fb(
@@ -255,30 +363,161 @@ def _init_memory(
 def _init_memory_fb(memory, inner_oracle, outer_oracle,
                     inner_var, outer_var, v,
                     inner_sampler, outer_sampler):
+    """Fill the memory with the gradients of all the batches.
+
+    The batches are split in one chunk per thread, which run in parallel when
+    compiled with `njit(parallel=True)`. Each chunk writes the rows of its
+    batches and sums their weighted gradients in its own partial mean, and
+    the partial means are summed at the end, so that no entry is written by
+    two threads.
+    """
+    n_chunks = get_num_threads()
+    n_inner = inner_sampler.n_batches
+    n_outer = outer_sampler.n_batches
+    memory_grad = memory['inner_grad']
+    memory_hvp = memory['hvp']
+    memory_cross = memory['cross_v']
+    memory_in_outer = memory['grad_in_outer']
+    memory_out_outer = memory['grad_out_outer']
+    dtype = memory_grad.dtype
+    partial_grad = np.zeros((n_chunks, memory_grad.shape[1]), dtype)
+    partial_hvp = np.zeros((n_chunks, memory_hvp.shape[1]), dtype)
+    partial_cross = np.zeros((n_chunks, memory_cross.shape[1]), dtype)
+    partial_in_outer = np.zeros((n_chunks, memory_in_outer.shape[1]), dtype)
+    partial_out_outer = np.zeros((n_chunks, memory_out_outer.shape[1]), dtype)
+
+    for chunk in prange(n_chunks):
+        for id_inner in range(chunk, n_inner, n_chunks):
+            slice_inner, (_, weight) = inner_sampler.batch_at(id_inner)
+            _, grad_inner_var, hvp, (idx_cross, cross_v) = \
+                inner_oracle.oracles_sparse(
+                    inner_var, outer_var, v, slice_inner, inverse='id'
+                )
+            memory_grad[id_inner, :] = grad_inner_var
+            partial_grad[chunk] += weight * grad_inner_var
+            memory_hvp[id_inner, :] = hvp
+            partial_hvp[chunk] += weight * hvp
+            memory_cross[id_inner, idx_cross] = cross_v
+            partial_cross[chunk, idx_cross] += weight * cross_v
+
+        for id_outer in range(chunk, n_outer, n_chunks):
+            slice_outer, (_, weight) = outer_sampler.batch_at(id_outer)
+            grad_in, (idx_out, grad_out) = outer_oracle.grad_sparse(
+                inner_var, outer_var, slice_outer
+            )
+            memory_in_outer[id_outer, :] = grad_in
+            partial_in_outer[chunk] += weight * grad_in
+            memory_out_outer[id_outer, idx_out] = grad_out
+            partial_out_outer[chunk, idx_out] += weight * grad_out
+
+    memory_grad[-1] = partial_grad.sum(axis=0)
+    memory_hvp[-1] = partial_hvp.sum(axis=0)
+    memory_cross[-1] = partial_cross.sum(axis=0)
+    memory_in_outer[-1] = partial_in_outer.sum(axis=0)
+    memory_out_outer[-1] = partial_out_outer.sum(axis=0)
+    return memory
+
+
+def _init_memory_compressed(
+    _init_memory_fb,
+    memory,
+    memory_dtype,
+    memory_class,
+    block_sizes,
+    inner_oracle,
+    outer_oracle,
+    inner_var,
+    outer_var,
+    v,
+    inner_sampler,
+    outer_sampler,
+    mode="zero",
+):
+    """Same as `_init_memory` with `CompressedMemory` entries in memory_dtype.
+
+    memory is the empty dict to fill, a `numba.typed.Dict` with numba, and
+    memory_class the `CompressedMemory` class or its jitclass. block_sizes
+    are the outer block sizes of the inner and outer oracles, see
+    `BaseOracle.get_outer_block_size`.
+    """
     n_outer = outer_sampler.n_batches
     n_inner = inner_sampler.n_batches
-    for _ in prange(n_inner):
-        slice_inner, (id_inner, weight) = inner_sampler.get_batch()
-        _, grad_inner_var, hvp, cross_v = inner_oracle.oracles(
-            inner_var, outer_var, v, slice_inner, inverse='id'
+    inner_size, outer_size = inner_oracle.variables_shape
+    block_inner, block_outer = block_sizes
+    shapes = {
+        'inner_grad': (n_inner, inner_size[0], None),
+        'hvp': (n_inner, inner_size[0], None),
+        'cross_v': (n_inner, outer_size[0], block_inner),
+        'grad_in_outer': (n_outer, inner_size[0], None),
+        'grad_out_outer': (n_outer, outer_size[0], block_outer),
+    }
+    for name, (n_batches, size, block_size) in shapes.items():
+        memory[name] = init_compressed_memory(
+            n_batches, size, memory_dtype, memory_class, block_size
         )
-        memory['inner_grad'][id_inner, :] = grad_inner_var
-        memory['inner_grad'][-1, :] += weight * grad_inner_var
-        memory['hvp'][id_inner, :] = hvp
-        memory['hvp'][-1, :] += weight * hvp
-        memory['cross_v'][id_inner, :] = cross_v
-        memory['cross_v'][-1, :] += weight * cross_v
-
-    for id_outer in prange(n_outer):
-        slice_outer, (id_outer, weight) = outer_sampler.get_batch()
-        grad_in, grad_out = outer_oracle.grad(
-            inner_var, outer_var, slice_outer
+    if mode == "full":
+        memory = _init_memory_fb(
+            memory,
+            inner_oracle,
+            outer_oracle,
+            inner_var,
+            outer_var,
+            v,
+            inner_sampler,
+            outer_sampler,
         )
-        memory['grad_in_outer'][id_outer, :] = grad_in
-        memory['grad_in_outer'][-1, :] += weight * grad_in
-        memory['grad_out_outer'][id_outer, :] = grad_out
-        memory['grad_out_outer'][-1, :] += weight * grad_out
+    return memory
 
+
+def _init_memory_fb_compressed(memory, inner_oracle, outer_oracle,
+                               inner_var, outer_var, v,
+                               inner_sampler, outer_sampler):
+    """Same as `_init_memory_fb` for `CompressedMemory` entries."""
+    n_chunks = get_num_threads()
+    n_inner = inner_sampler.n_batches
+    n_outer = outer_sampler.n_batches
+    memory_grad = memory['inner_grad']
+    memory_hvp = memory['hvp']
+    memory_cross = memory['cross_v']
+    memory_in_outer = memory['grad_in_outer']
+    memory_out_outer = memory['grad_out_outer']
+    partial_grad = np.zeros((n_chunks, memory_grad.mean.shape[0]))
+    partial_hvp = np.zeros((n_chunks, memory_hvp.mean.shape[0]))
+    partial_cross = np.zeros((n_chunks, memory_cross.mean.shape[0]))
+    partial_in_outer = np.zeros((n_chunks, memory_in_outer.mean.shape[0]))
+    partial_out_outer = np.zeros((n_chunks, memory_out_outer.mean.shape[0]))
+
+    for chunk in prange(n_chunks):
+        # slices can not be shared with the threads of numba
+        all_inner = slice(0, inner_var.shape[0])
+        for id_inner in range(chunk, n_inner, n_chunks):
+            slice_inner, (_, weight) = inner_sampler.batch_at(id_inner)
+            _, grad_inner_var, hvp, (idx_cross, cross_v) = \
+                inner_oracle.oracles_sparse(
+                    inner_var, outer_var, v, slice_inner, inverse='id'
+                )
+            _, change = memory_grad.swap(id_inner, all_inner, grad_inner_var)
+            partial_grad[chunk] += weight * change
+            _, change = memory_hvp.swap(id_inner, all_inner, hvp)
+            partial_hvp[chunk] += weight * change
+            _, change = memory_cross.swap(id_inner, idx_cross, cross_v)
+            partial_cross[chunk, idx_cross] += weight * change
+
+        for id_outer in range(chunk, n_outer, n_chunks):
+            slice_outer, (_, weight) = outer_sampler.batch_at(id_outer)
+            grad_in, (idx_out, grad_out) = outer_oracle.grad_sparse(
+                inner_var, outer_var, slice_outer
+            )
+            _, change = memory_in_outer.swap(id_outer, all_inner, grad_in)
+            partial_in_outer[chunk] += weight * change
+            _, change = memory_out_outer.swap(id_outer, idx_out, grad_out)
+            partial_out_outer[chunk, idx_out] += weight * change
+
+    memory_grad.mean += partial_grad.sum(axis=0)
+    memory_hvp.mean += partial_hvp.sum(axis=0)
+    memory_cross.mean += partial_cross.sum(axis=0)
+    memory_in_outer.mean += partial_in_outer.sum(axis=0)
+    memory_out_outer.mean += partial_out_outer.sum(axis=0)
     return memory
 
 
@@ -296,23 +535,46 @@ def _init_memory_jax(
     inner_size=1,
     outer_size=1,
     mode="zero",
+    memory_dtype=None,
+    block_sizes=(None, None),
 ):
+    """Memory of `saba_jax`, with the running mean in the last row of each
+    table, or made of compressed memories if memory_dtype is not None, see
+    `init_compressed_memory_jax` and `_init_memory_compressed`."""
     n_outer = (n_outer_samples + batch_size_outer - 1) // batch_size_outer
     n_inner = (n_inner_samples + batch_size_inner - 1) // batch_size_inner
-    memory = {
-        'inner_grad': jnp.zeros((n_inner + 2, inner_size)),
-        'hvp': jnp.zeros((n_inner + 2, inner_size)),
-        'cross_v': jnp.zeros((n_inner + 2, outer_size)),
-        'grad_in_outer': jnp.zeros((n_outer + 2, inner_size)),
-        'grad_out_outer': jnp.zeros((n_outer + 2, outer_size)),
-    }
+    if memory_dtype is not None:
+        block_inner, block_outer = block_sizes
+        memory = {
+            'inner_grad': init_compressed_memory_jax(
+                n_inner, inner_size, memory_dtype
+            ),
+            'hvp': init_compressed_memory_jax(
+                n_inner, inner_size, memory_dtype
+            ),
+            'cross_v': init_compressed_memory_jax(
+                n_inner, outer_size, memory_dtype, block_inner
+            ),
+            'grad_in_outer': init_compressed_memory_jax(
+                n_outer, inner_size, memory_dtype
+            ),
+            'grad_out_outer': init_compressed_memory_jax(
+                n_outer, outer_size, memory_dtype, block_outer
+            ),
+        }
+    else:
+        memory = {
+            'inner_grad': jnp.zeros((n_inner + 1, inner_size)),
+            'hvp': jnp.zeros((n_inner + 1, inner_size)),
+            'cross_v': jnp.zeros((n_inner + 1, outer_size)),
+            'grad_in_outer': jnp.zeros((n_outer + 1, inner_size)),
+            'grad_out_outer': jnp.zeros((n_outer + 1, outer_size)),
+        }
     if mode == "full":
-        grad_inner = jax.grad(inner_oracle, argnums=0)
-        grad_outer = jax.grad(outer_oracle, argnums=(0, 1))
         memory = _init_memory_fb(
             memory,
-            grad_inner,
-            grad_outer,
+            inner_oracle,
+            outer_oracle,
             inner_var,
             outer_var,
             v,
@@ -320,8 +582,6 @@ def _init_memory_jax(
             n_outer_samples=n_outer_samples,
             batch_size_inner=batch_size_inner,
             batch_size_outer=batch_size_outer,
-            inner_size=inner_size,
-            outer_size=outer_size,
         )
 
     return memory
@@ -329,141 +589,219 @@ def _init_memory_jax(
 
 def _init_memory_fb_jax(
         memory,
-        grad_inner,
-        grad_outer,
+        inner_oracle,
+        outer_oracle,
         inner_var,
         outer_var,
         v,
-        inner_sampler,
-        outer_sampler,
-        state_inner_sampler,
-        state_outer_sampler,
         n_inner_samples=1,
         n_outer_samples=1,
         batch_size_inner=1,
         batch_size_outer=1,
 ):
-    n_outer = (n_outer_samples + batch_size_outer - 1) // batch_size_outer
-    n_inner = (n_inner_samples + batch_size_inner - 1) // batch_size_inner
-    for _ in range(n_inner):
-        start_inner, state_inner_sampler = inner_sampler(state_inner_sampler)
-        id_inner = state_inner_sampler['batch_order'][
-            state_inner_sampler['i_batch']
-        ]
-        weight = batch_size_inner / n_inner_samples
+    """Fill the memory with the gradients of all the batches.
+
+    The oracles are vectorized with `jax.vmap` over the first samples of the
+    batches, so that all the rows of the tables are computed at once.
+    """
+    grad_inner = jax.grad(inner_oracle, argnums=0)
+    grad_outer = jax.grad(outer_oracle, argnums=(0, 1))
+
+    def inner_oracles(start):
         grad_inner_var, vjp_train = jax.vjp(
-            lambda z, x: grad_inner(z, x, start_inner), inner_var,
-            outer_var
+            lambda z, x: grad_inner(z, x, start), inner_var, outer_var
         )
         hvp, cross_v = vjp_train(v)
-
-        memory['inner_grad'] = (
-            memory['inner_grad'].at[id_inner].set(grad_inner_var)
-            .at[-2].add(weight * grad_inner_var)
+        return (
+            grad_inner_var, hvp,
+            _get_block_jax(memory['cross_v'], cross_v, start)
         )
-        memory['hvp'] = (
-            memory['hvp'].at[id_inner].set(hvp)
-            .at[-2].add(weight * hvp)
-        )
-        memory['cross_v'] = (
-            memory['cross_v'].at[id_inner].set(cross_v)
-            .at[-2].add(weight * cross_v)
+
+    def outer_oracles(start):
+        grad_in, grad_out = grad_outer(inner_var, outer_var, start)
+        return (
+            grad_in, _get_block_jax(memory['grad_out_outer'], grad_out, start)
         )
 
-    for id_outer in range(n_outer):
-        start_outer, state_outer_sampler = outer_sampler(state_outer_sampler)
-        id_outer = state_outer_sampler['batch_order'][
-            state_outer_sampler['i_batch']
-        ]
-        weight = batch_size_outer / n_outer_samples
+    inner_batches = _get_batches_jax(n_inner_samples, batch_size_inner)
+    outer_batches = _get_batches_jax(n_outer_samples, batch_size_outer)
+    grad_inner_var, hvp, cross_v = jax.vmap(inner_oracles)(inner_batches[0])
+    grad_in, grad_out = jax.vmap(outer_oracles)(outer_batches[0])
+
+    values = {
+        'inner_grad': (grad_inner_var, inner_batches),
+        'hvp': (hvp, inner_batches),
+        'cross_v': (cross_v, inner_batches),
+        'grad_in_outer': (grad_in, outer_batches),
+        'grad_out_outer': (grad_out, outer_batches),
+    }
+    return {
+        name: _fill_memory_jax(memory[name], rows, *batches)
+        for name, (rows, batches) in values.items()
+    }
 
-        grad_in, grad_out = grad_outer(inner_var, outer_var, start_outer)
 
-        memory['grad_in_outer'] = (
-            memory['grad_in_outer'].at[id_outer].set(grad_in)
-            .at[-2].add(weight * grad_in)
-        )
-        memory['grad_out_outer'] = (
-            memory['grad_out_outer'].at[id_outer].set(grad_out)
-            .at[-2].add(weight * grad_out)
-        )
+def _get_batches_jax(n_samples, batch_size):
+    """First samples and weights of all the batches of the jax sampler."""
+    n_batches = (n_samples + batch_size - 1) // batch_size
+    starts = jnp.arange(n_batches) * batch_size
+    weights = jnp.full(n_batches, batch_size / n_samples)
+    if n_samples % batch_size != 0:
+        weights = weights.at[-1].set((n_samples % batch_size) / n_samples)
+    return starts, weights
+
+
+def _get_block_jax(memory, grad, start):
+    """Part of grad stored for the batch starting at start by a memory."""
+    if isinstance(memory, dict):
+        block_size = memory['table'].shape[1]
+        if block_size != grad.shape[0]:
+            return jax.lax.dynamic_slice(grad, (start,), (block_size,))
+    return grad
+
+
+def _fill_memory_jax(memory, rows, starts, weights):
+    """Memory storing rows as the entries of all the batches."""
+    if isinstance(memory, dict):
+        return fill_compressed_memory_jax(memory, rows, weights, starts)
+    return memory.at[:-1].set(rows).at[-1].set(weights @ rows)
 
-    return memory
 
+def variance_reduction(grad, memory, vr_info, diff=None):
+    """Variance reduced direction, written in place in grad.
 
-def variance_reduction(grad, memory, vr_info):
+    diff is an optional buffer with the shape of grad, so that no array is
+    allocated.
+    """
     idx, weigth = vr_info
-    diff = grad - memory[idx]
-    direction = diff + memory[-1]
-    memory[-1] += diff * weigth
+    if diff is None:
+        diff = np.empty_like(grad)
+    np.subtract(grad, memory[idx], diff)
     memory[idx, :] = grad
-    return direction
+    np.add(diff, memory[-1], grad)
+    diff *= weigth
+    memory[-1] += diff
+    return grad
 
 
-def _saba(variance_reduction, inner_oracle, outer_oracle, inner_var, outer_var,
-          v, memory, inner_sampler=None, outer_sampler=None, lr_scheduler=None,
-          max_iter=1, seed=None):
+def variance_reduction_step(var, step_size, grad, memory, vr_info):
+    """Variance reduced step on var for a gradient `(var_idx, values)`.
+
+    Same as `var -= step_size * variance_reduction(grad, memory, vr_info)`
+    with the dense gradient, but the memory is only updated on `var_idx`.
+    The step itself stays O(var.shape[0]) since the running mean
+    `memory[-1]` is dense.
+    """
+    idx, weigth = vr_info
+    var_idx, values = grad
+    diff = values - memory[idx, var_idx]
+    var -= step_size * memory[-1]
+    var[var_idx] -= step_size * diff
+    memory[-1, var_idx] += diff * weigth
+    memory[idx, var_idx] = values
+
+
+def variance_reduction_compressed(grad, memory, vr_info, diff=None):
+    """Same as `variance_reduction` for a `CompressedMemory`."""
+    idx, weigth = vr_info
+    correction, change = memory.swap(idx, slice(0, grad.shape[0]), grad)
+    np.add(correction, memory.mean, grad)
+    memory.mean += weigth * change
+    return grad
+
+
+def variance_reduction_step_compressed(var, step_size, grad, memory,
+                                       vr_info):
+    """Same as `variance_reduction_step` for a `CompressedMemory`."""
+    idx, weigth = vr_info
+    var_idx, values = grad
+    correction, change = memory.swap(idx, var_idx, values)
+    var -= step_size * memory.mean
+    var[var_idx] -= step_size * correction
+    memory.mean[var_idx] += weigth * change
+
+
+def _saba(variance_reduction, variance_reduction_step, inner_oracle,
+          outer_oracle, inner_var, outer_var, v, memory, inner_sampler=None,
+          outer_sampler=None, lr_scheduler=None, max_iter=1, seed=None):
 
     # Set seed for randomness
     if seed is not None:
         np.random.seed(seed)
 
+    # Buffers where the oracles and the variance reduction write the
+    # gradients in inner_var
+    inner_buffer = np.empty((2, inner_var.shape[0]), inner_var.dtype)
+    outer_buffer = np.empty(inner_var.shape[0], inner_var.dtype)
+    diff = np.empty(inner_var.shape[0], inner_var.dtype)
+
     for i in range(max_iter):
         inner_step_size, outer_step_size = lr_scheduler.get_lr()
 
         # Get all gradient for the batch
         slice_inner, vr_inner = inner_sampler.get_batch()
-        _, grad_inner_var, hvp, cross_v = inner_oracle.oracles(
-            inner_var, outer_var, v, slice_inner, inverse='id'
+        _, grad_inner_var, hvp, cross_v = inner_oracle.oracles_sparse(
+            inner_var, outer_var, v, slice_inner, inverse='id',
+            out=inner_buffer
         )
         slice_outer, vr_outer = outer_sampler.get_batch()
-        grad_in_outer, grad_out_outer = outer_oracle.grad(
-            inner_var, outer_var, slice_outer
+        grad_in_outer, grad_out_outer = outer_oracle.grad_sparse(
+            inner_var, outer_var, slice_outer, out=outer_buffer
         )
         # here memory_*[-1] corresponds to the running average of
         # the gradients
         grad_inner_var = variance_reduction(
-            grad_inner_var, memory['inner_grad'], vr_inner
+            grad_inner_var, memory['inner_grad'], vr_inner, diff
         )
-        hvp = variance_reduction(hvp, memory['hvp'], vr_inner)
-        cross_v = variance_reduction(
-            cross_v, memory['cross_v'], vr_inner
+        hvp = variance_reduction(hvp, memory['hvp'], vr_inner, diff)
+        grad_in_outer = variance_reduction(
+            grad_in_outer, memory['grad_in_outer'], vr_outer, diff
         )
 
-        grad_in_outer = variance_reduction(
-            grad_in_outer, memory['grad_in_outer'], vr_outer
+        # Update the variables, scaling the directions in their buffers to
+        # avoid temporary arrays. The gradients in outer_var are
+        # `(outer_idx, values)`, so that the memory of per-sample outer
+        # variables is only updated on the batch.
+        grad_inner_var *= inner_step_size
+        inner_var -= grad_inner_var
+        hvp += grad_in_outer
+        hvp *= inner_step_size
+        v -= hvp
+        variance_reduction_step(
+            outer_var, outer_step_size, cross_v, memory['cross_v'], vr_inner
         )
-        grad_out_outer = variance_reduction(
-            grad_out_outer, memory['grad_out_outer'], vr_outer
+        variance_reduction_step(
+            outer_var, outer_step_size, grad_out_outer,
+            memory['grad_out_outer'], vr_outer
         )
 
-        # Update the variables
-        inner_var -= inner_step_size * grad_inner_var
-        v -= inner_step_size * (hvp + grad_in_outer)
-        outer_var -= outer_step_size * (cross_v + grad_out_outer)
-
     return inner_var, outer_var, v
 
 
+def variance_reduction_jax(memory, grad, idx, weigth, start):
+    """Jax version of `variance_reduction`, returning the updated memory and
+    the direction. start is the first sample of the batch, used by the block
+    memories of `update_compressed_memory_jax`."""
+    diff = grad - memory[idx]
+    direction = diff + memory[-1]
+    memory = (
+        memory
+        .at[-1].add(weigth * diff)
+        .at[idx].set(grad)
+    )
+    return memory, direction
+
+
 @partial(jax.jit, static_argnums=(0, 1),
-         static_argnames=('inner_sampler', 'outer_sampler', 'max_iter'))
+         static_argnames=('inner_sampler', 'outer_sampler', 'max_iter',
+                          'variance_reduction'))
 def saba_jax(f_inner, f_outer, inner_var, outer_var, v, memory,
              state_inner_sampler=None, state_outer_sampler=None, state_lr=None,
-             inner_sampler=None, outer_sampler=None, max_iter=1):
+             inner_sampler=None, outer_sampler=None, max_iter=1,
+             variance_reduction=variance_reduction_jax):
     grad_inner = jax.grad(f_inner, argnums=0)
     grad_outer = jax.grad(f_outer, argnums=(0, 1))
 
-    def variance_reduction(memory, grad, idx, weigth):
-        diff = grad - memory[idx]
-        direction = diff + memory[-2]
-        memory = (
-            memory
-            .at[-1].set(direction)
-            .at[-2].add(weigth * diff)
-            .at[idx].set(grad)
-        )
-        return memory
-
     def saba_one_iter(carry, _):
         memory, carry = carry
         (inner_step_size, outer_step_size), carry['state_lr'] = update_lr(
@@ -487,27 +825,29 @@ def saba_jax(f_inner, f_outer, inner_var, outer_var, v, memory,
             carry['inner_var'], carry['outer_var'], start_outer
         )
 
-        # here memory_*[-2] corresponds to the running average of
-        # the gradients and memory[-1] to the current direction
+        # update the memories and get the variance reduced directions
+        inner_batch = (id_inner, weight_inner, start_inner)
+        outer_batch = (id_outer, weight_outer, start_outer)
         updates = {
-            'inner_grad': (grad_inner_var, id_inner, weight_inner),
-            'hvp': (hvp, id_inner, weight_inner),
-            'cross_v': (cross_v, id_inner, weight_inner),
-            'grad_in_outer': (grad_in_outer, id_outer, weight_outer),
-            'grad_out_outer': (grad_out_outer, id_outer, weight_outer),
+            'inner_grad': (grad_inner_var, *inner_batch),
+            'hvp': (hvp, *inner_batch),
+            'cross_v': (cross_v, *inner_batch),
+            'grad_in_outer': (grad_in_outer, *outer_batch),
+            'grad_out_outer': (grad_out_outer, *outer_batch),
         }
-        memory = jax.tree_map(
-            lambda mem, up: variance_reduction(mem, *up),
-            memory, updates
-        )
+        memory, direction = dict(memory), {}
+        for name, update in updates.items():
+            memory[name], direction[name] = variance_reduction(
+                memory[name], *update
+            )
 
         # Update the variables
-        carry['inner_var'] -= inner_step_size * memory['inner_grad'][-1]
+        carry['inner_var'] -= inner_step_size * direction['inner_grad']
         carry['v'] -= inner_step_size * (
-            memory['hvp'][-1] + memory['grad_in_outer'][-1]
+            direction['hvp'] + direction['grad_in_outer']
         )
         carry['outer_var'] -= outer_step_size * (
-            memory['cross_v'][-1] + memory['grad_out_outer'][-1]
+            direction['cross_v'] + direction['grad_out_outer']
         )
 
         # #Use prox to make sure we do not diverge
@@ -5,18 +5,22 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit
-    from numba.experimental import jitclass
+    from itertools import product
 
     from benchmark_utils import constants
+    from benchmark_utils.chunked_oracle import ChunkedOracle
+    from benchmark_utils.chunked_oracle import get_chunked_oracle_jax
     from benchmark_utils.minibatch_sampler import init_sampler
+    from benchmark_utils.batched import run_batched, tree_stack
+    from benchmark_utils.batched import split_trajectory
     from benchmark_utils.learning_rate_scheduler import update_lr
     from benchmark_utils.minibatch_sampler import MinibatchSampler
     from benchmark_utils.minibatch_sampler import spec as mbs_spec
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -39,6 +43,7 @@ class Solver(BaseSolver):
         'eval_freq': [128],
         'random_state': [1],
         'framework': ["jax"],
+        'chunk_size': [None],
     }
 
     @staticmethod
@@ -49,13 +54,8 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
+            if self.chunk_size is not None:
+                return True, "Numba does not support chunked full batches."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -77,28 +77,39 @@ class Solver(BaseSolver):
 
         if self.framework == 'numba':
             # JIT necessary functions and classes
-            self.soba = njit(soba)
-            self.MinibatchSampler = jitclass(MinibatchSampler, mbs_spec)
-            self.LearningRateScheduler = jitclass(
+            self.soba = get_njit(soba)
+            self.MinibatchSampler = get_jitclass(MinibatchSampler, mbs_spec)
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
         elif self.framework == "none":
+            if self.chunk_size is not None:
+                # Evaluate the large batches by chunks in a thread pool
+                self.f_inner = ChunkedOracle(self.f_inner, self.chunk_size)
+                self.f_outer = ChunkedOracle(self.f_outer, self.chunk_size)
             self.soba = soba
             self.MinibatchSampler = MinibatchSampler
             self.LearningRateScheduler = LearningRateScheduler
         elif self.framework == 'jax':
-            self.f_inner = jax.jit(
-                partial(self.f_inner, batch_size=self.batch_size_inner)
-            )
-            self.f_outer = jax.jit(
-                partial(self.f_outer, batch_size=self.batch_size_outer)
-            )
-            inner_sampler, self.state_inner_sampler \
-                = init_sampler(n_samples=n_inner_samples,
-                               batch_size=self.batch_size_inner)
-            outer_sampler, self.state_outer_sampler \
-                = init_sampler(n_samples=n_outer_samples,
-                               batch_size=self.batch_size_outer)
+            if self.batch_size == "full":
+                # Evaluate the full batches by chunks to bound the memory
+                self.f_inner = jax.jit(get_chunked_oracle_jax(
+                    self.f_inner, n_inner_samples, self.chunk_size
+                ))
+                self.f_outer = jax.jit(get_chunked_oracle_jax(
+                    self.f_outer, n_outer_samples, self.chunk_size
+                ))
+            else:
+                self.f_inner = jax.jit(
+                    partial(self.f_inner, batch_size=self.batch_size_inner)
+                )
+                self.f_outer = jax.jit(
+                    partial(self.f_outer, batch_size=self.batch_size_outer)
+                )
+            inner_sampler, _ = init_sampler(n_samples=n_inner_samples,
+                                            batch_size=self.batch_size_inner)
+            outer_sampler, _ = init_sampler(n_samples=n_outer_samples,
+                                            batch_size=self.batch_size_outer)
             self.soba = partial(
                 soba_jax,
                 inner_sampler=inner_sampler,
@@ -110,7 +121,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq
@@ -119,19 +130,8 @@ class Solver(BaseSolver):
         inner_var = self.inner_var0.copy()
         outer_var = self.outer_var0.copy()
         if self.framework == "jax":
-            v = jnp.zeros_like(inner_var)
-            # Init lr scheduler
-            step_sizes = jnp.array(
-                [self.step_size, self.step_size / self.outer_ratio]
-            )
-            exponents = jnp.array(
-                [.5, .5]
-            )
-            state_lr = init_lr_scheduler(step_sizes, exponents)
-            carry = dict(
-                state_lr=state_lr,
-                state_inner_sampler=self.state_inner_sampler,
-                state_outer_sampler=self.state_outer_sampler,
+            (inner_var, outer_var, v), carry = self.init_state_jax(
+                self.random_state
             )
         else:
             rng = np.random.RandomState(self.random_state)
@@ -174,6 +174,67 @@ class Solver(BaseSolver):
     def get_result(self):
         return self.beta
 
+    def init_state_jax(self, random_state, step_size=None,
+                       outer_ratio=None):
+        """Initial arguments and states of `soba_jax` for one run.
+
+        `step_size` and `outer_ratio` default to the solver parameters.
+        """
+        if step_size is None:
+            step_size = self.step_size
+        if outer_ratio is None:
+            outer_ratio = self.outer_ratio
+        inner_var = jnp.array(self.inner_var0)
+        outer_var = jnp.array(self.outer_var0)
+        v = jnp.zeros_like(inner_var)
+
+        # Init lr scheduler
+        step_sizes = jnp.array(
+            [step_size, step_size / outer_ratio]
+        )
+        exponents = jnp.array(
+            [.5, .5]
+        )
+        state_lr = init_lr_scheduler(step_sizes, exponents)
+        _, state_inner_sampler = init_sampler(
+            n_samples=self.n_inner_samples, batch_size=self.batch_size_inner,
+            random_state=random_state
+        )
+        _, state_outer_sampler = init_sampler(
+            n_samples=self.n_outer_samples, batch_size=self.batch_size_outer,
+            random_state=random_state
+        )
+        carry = dict(
+            state_lr=state_lr,
+            state_inner_sampler=state_inner_sampler,
+            state_outer_sampler=state_outer_sampler,
+        )
+        return (inner_var, outer_var, v), carry
+
+    def run_sweep(self, configs, random_states, n_evals=1):
+        """Run SOBA for several step sizes and outer ratios with jax.
+
+        `configs` is a list of `(step_size, outer_ratio)`, for instance a grid
+        built with `itertools.product`. All the variables and states carry a
+        leading axis over the `configs x random_states` runs and the solver is
+        vectorized with `jax.vmap`, so one compiled program advances all of
+        them. Returns a dict mapping each configuration to its list of
+        `(inner_var, outer_var)` every `eval_freq` iterations, with a leading
+        seed axis.
+        """
+        if self.framework != 'jax':
+            raise ValueError("Batched runs need the jax framework.")
+        runs = list(product(configs, random_states))
+        args, carry = tree_stack([
+            self.init_state_jax(seed, step_size=step_size,
+                                outer_ratio=outer_ratio)
+            for (step_size, outer_ratio), seed in runs
+        ])
+        solver = partial(self.soba, self.f_inner, self.f_outer,
+                         max_iter=self.eval_freq)
+        *_, trajectory = run_batched(solver, args, carry, n_evals=n_evals)
+        return split_trajectory(trajectory, [c for c, _ in runs])
+
 
 def soba(inner_oracle, outer_oracle, inner_var, outer_var, v,
          inner_sampler=None, outer_sampler=None, lr_scheduler=None, max_iter=1,
@@ -183,24 +244,37 @@ def soba(inner_oracle, outer_oracle, inner_var, outer_var, v,
     if seed is not None:
         np.random.seed(seed)
 
+    # Buffers where the oracles write the gradients in inner_var
+    inner_buffer = np.empty((2, inner_var.shape[0]), inner_var.dtype)
+    outer_buffer = np.empty(inner_var.shape[0], inner_var.dtype)
+
     for i in range(max_iter):
         inner_step_size, outer_step_size = lr_scheduler.get_lr()
 
         # Step.1 - get all gradients and compute the implicit gradient.
+        # The gradients in outer_var are `(outer_idx, values)`, so that the
+        # per-sample outer variables are only updated on the batch.
         slice_inner, _ = inner_sampler.get_batch()
-        _, grad_inner_var, hvp, cross_v = inner_oracle.oracles(
-            inner_var, outer_var, v, slice_inner, inverse='id'
-        )
+        _, grad_inner_var, hvp, (idx_cross, cross_v) = \
+            inner_oracle.oracles_sparse(
+                inner_var, outer_var, v, slice_inner, inverse='id',
+                out=inner_buffer
+            )
 
         slice_outer, _ = outer_sampler.get_batch()
-        grad_in_outer, grad_out_outer = outer_oracle.grad(
-            inner_var, outer_var, slice_outer
+        grad_in_outer, (idx_outer, grad_out_outer) = outer_oracle.grad_sparse(
+            inner_var, outer_var, slice_outer, out=outer_buffer
         )
 
-        # Step.2 - update the variables
-        inner_var -= inner_step_size * grad_inner_var
-        v -= inner_step_size * (hvp + grad_in_outer)
-        outer_var -= outer_step_size * (cross_v + grad_out_outer)
+        # Step.2 - update the variables, scaling the gradients in their
+        # buffers to avoid temporary arrays.
+        grad_inner_var *= inner_step_size
+        inner_var -= grad_inner_var
+        hvp += grad_in_outer
+        hvp *= inner_step_size
+        v -= hvp
+        outer_var[idx_cross] -= outer_step_size * cross_v
+        outer_var[idx_outer] -= outer_step_size * grad_out_outer
 
     return inner_var, outer_var, v
 
@@ -5,18 +5,22 @@ from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from numba import njit
-    from numba.experimental import jitclass
+    from itertools import product
 
     from benchmark_utils import constants
+    from benchmark_utils.chunked_oracle import ChunkedOracle
+    from benchmark_utils.chunked_oracle import get_chunked_oracle_jax
     from benchmark_utils.minibatch_sampler import init_sampler
+    from benchmark_utils.batched import run_batched, tree_stack
+    from benchmark_utils.batched import split_trajectory
     from benchmark_utils.learning_rate_scheduler import update_lr
     from benchmark_utils.minibatch_sampler import MinibatchSampler
     from benchmark_utils.minibatch_sampler import spec as mbs_spec
     from benchmark_utils.learning_rate_scheduler import init_lr_scheduler
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
@@ -40,6 +44,7 @@ class Solver(BaseSolver):
         'eval_freq': [128],
         'random_state': [1],
         'framework': ["jax"],
+        'chunk_size': [None],
     }
 
     @staticmethod
@@ -50,13 +55,8 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
+            if self.chunk_size is not None:
+                return True, "Numba does not support chunked full batches."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -78,40 +78,50 @@ class Solver(BaseSolver):
             self.f_inner = f_train(framework=self.framework)
             self.f_outer = f_val(framework=self.framework)
             # JIT necessary functions and classes
-            self.srba = njit(srba)
-            self.MinibatchSampler = jitclass(MinibatchSampler,
-                                             mbs_spec)
+            self.srba = get_njit(srba)
+            self.MinibatchSampler = get_jitclass(MinibatchSampler,
+                                                 mbs_spec)
 
-            self.LearningRateScheduler = jitclass(LearningRateScheduler,
-                                                  sched_spec)
+            self.LearningRateScheduler = get_jitclass(LearningRateScheduler,
+                                                      sched_spec)
 
         elif self.framework == 'none':
             self.f_inner = f_train(framework=self.framework)
             self.f_outer = f_val(framework=self.framework)
+            if self.chunk_size is not None:
+                # Evaluate the full batches by chunks in a thread pool
+                self.f_inner = ChunkedOracle(self.f_inner, self.chunk_size)
+                self.f_outer = ChunkedOracle(self.f_outer, self.chunk_size)
             self.srba = srba
             self.MinibatchSampler = MinibatchSampler
             self.LearningRateScheduler = LearningRateScheduler
         elif self.framework == 'jax':
-            self.f_inner, self.f_inner_fb = f_train(
+            f_inner, self.f_inner_fb = f_train(
                 framework=self.framework, get_full_batch=True
             )
-            self.f_outer, self.f_outer_fb = f_val(
+            f_outer, self.f_outer_fb = f_val(
                 framework=self.framework, get_full_batch=True
             )
             self.f_inner = jax.jit(
-                partial(self.f_inner, batch_size=self.batch_size_inner)
+                partial(f_inner, batch_size=self.batch_size_inner)
             )
             self.f_outer = jax.jit(
-                partial(self.f_outer, batch_size=self.batch_size_outer)
+                partial(f_outer, batch_size=self.batch_size_outer)
             )
+            if self.chunk_size is not None:
+                # Evaluate the full batches by chunks to bound the memory
+                self.f_inner_fb = get_chunked_oracle_jax(
+                    f_inner, n_inner_samples, self.chunk_size
+                )
+                self.f_outer_fb = get_chunked_oracle_jax(
+                    f_outer, n_outer_samples, self.chunk_size
+                )
             self.f_inner_fb = jax.jit(self.f_inner_fb)
             self.f_outer_fb = jax.jit(self.f_outer_fb)
-            inner_sampler, self.state_inner_sampler \
-                = init_sampler(n_samples=n_inner_samples,
-                               batch_size=self.batch_size_inner)
-            outer_sampler, self.state_outer_sampler \
-                = init_sampler(n_samples=n_outer_samples,
-                               batch_size=self.batch_size_outer)
+            inner_sampler, _ = init_sampler(n_samples=n_inner_samples,
+                                            batch_size=self.batch_size_inner)
+            outer_sampler, _ = init_sampler(n_samples=n_outer_samples,
+                                            batch_size=self.batch_size_outer)
             self.srba = partial(
                 srba_jax,
                 inner_sampler=inner_sampler,
@@ -123,7 +133,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq  # // self.batch_size
@@ -133,23 +143,9 @@ class Solver(BaseSolver):
         outer_var = self.outer_var0.copy()
 
         if self.framework == "jax":
-            v = jnp.zeros_like(inner_var)
-            step_sizes = jnp.array(  # (inner_ss, hia_lr, outer_ss)
-                [
-                    self.step_size,
-                    self.step_size / self.outer_ratio,
-                ]
-            )
-            exponents = jnp.zeros(2)
-            state_lr = init_lr_scheduler(step_sizes, exponents)
-            d_inner = jnp.zeros_like(inner_var)
-            d_v = jnp.zeros_like(inner_var)
-            d_outer = jnp.zeros_like(outer_var)
-            carry = dict(
-                state_lr=state_lr,
-                state_inner_sampler=self.state_inner_sampler,
-                state_outer_sampler=self.state_outer_sampler,
-                i_min=0
+            (inner_var, outer_var, v, inner_var_old, outer_var_old, v_old,
+             d_inner, d_v, d_outer), carry = self.init_state_jax(
+                self.random_state
             )
         else:
             rng = np.random.RandomState(self.random_state)
@@ -176,15 +172,11 @@ class Solver(BaseSolver):
             d_v = np.zeros_like(inner_var)
             d_outer = np.zeros_like(outer_var)
 
-        period = self.n_inner_samples + self.n_outer_samples
-        period *= self.period_frac
-        period /= self.batch_size
-        period = int(period)
-        # period = 1
+            inner_var_old = inner_var.copy()
+            outer_var_old = outer_var.copy()
+            v_old = v.copy()
 
-        inner_var_old = inner_var.copy()
-        outer_var_old = outer_var.copy()
-        v_old = v.copy()
+        period = self.get_period()
         i_min = 0
         # Start algorithm
         while callback((inner_var, outer_var)):
@@ -216,6 +208,86 @@ class Solver(BaseSolver):
     def get_result(self):
         return self.beta
 
+    def get_period(self):
+        period = self.n_inner_samples + self.n_outer_samples
+        period *= self.period_frac
+        period /= self.batch_size
+        return int(period)
+
+    def init_state_jax(self, random_state, step_size=None,
+                       outer_ratio=None):
+        """Initial arguments and states of `srba_jax` for one run.
+
+        `step_size` and `outer_ratio` default to the solver parameters.
+        """
+        if step_size is None:
+            step_size = self.step_size
+        if outer_ratio is None:
+            outer_ratio = self.outer_ratio
+        inner_var = jnp.array(self.inner_var0)
+        outer_var = jnp.array(self.outer_var0)
+        v = jnp.zeros_like(inner_var)
+        step_sizes = jnp.array(  # (inner_ss, outer_ss)
+            [
+                step_size,
+                step_size / outer_ratio,
+            ]
+        )
+        exponents = jnp.zeros(2)
+        state_lr = init_lr_scheduler(step_sizes, exponents)
+        _, state_inner_sampler = init_sampler(
+            n_samples=self.n_inner_samples, batch_size=self.batch_size_inner,
+            random_state=random_state
+        )
+        _, state_outer_sampler = init_sampler(
+            n_samples=self.n_outer_samples, batch_size=self.batch_size_outer,
+            random_state=random_state
+        )
+        d_inner = jnp.zeros_like(inner_var)
+        d_v = jnp.zeros_like(inner_var)
+        d_outer = jnp.zeros_like(outer_var)
+        carry = dict(
+            state_lr=state_lr,
+            state_inner_sampler=state_inner_sampler,
+            state_outer_sampler=state_outer_sampler,
+            i_min=0
+        )
+        return (
+            inner_var, outer_var, v, inner_var.copy(), outer_var.copy(),
+            v.copy(), d_inner, d_v, d_outer
+        ), carry
+
+    def run_sweep(self, configs, random_states, n_evals=1):
+        """Run SRBA for several step sizes and outer ratios with jax.
+
+        `configs` is a list of `(step_size, outer_ratio)`, for instance a grid
+        built with `itertools.product`. All the variables and states carry a
+        leading axis over the `configs x random_states` runs and the solver is
+        vectorized with `jax.vmap`, so one compiled program advances all of
+        them. The iteration counter is shared so that the full batch steps
+        happen at the same iterations for all the runs. Returns a dict mapping
+        each configuration to its list of `(inner_var, outer_var)` every
+        `eval_freq` iterations, with a leading seed axis.
+        """
+        if self.framework != 'jax':
+            raise ValueError("Batched runs need the jax framework.")
+        runs = list(product(configs, random_states))
+        args, carry = tree_stack([
+            self.init_state_jax(seed, step_size=step_size,
+                                outer_ratio=outer_ratio)
+            for (step_size, outer_ratio), seed in runs
+        ])
+        carry['i_min'] = 0
+        solver = partial(
+            self.srba, self.f_inner, self.f_outer, self.f_inner_fb,
+            self.f_outer_fb, period=self.get_period(),
+            max_iter=self.eval_freq
+        )
+        *_, trajectory = run_batched(
+            solver, args, carry, n_evals=n_evals, shared=('i_min',)
+        )
+        return split_trajectory(trajectory, [c for c, _ in runs])
+
 
 def srba(
     inner_oracle, outer_oracle, inner_var, outer_var, v, inner_var_old,
@@ -233,52 +305,60 @@ def srba(
         # Computation of the directions
         if i % period == 0:  # Full batch computations
             slice_inner = slice(0, inner_oracle.n_samples)
-            _, d_inner, hvp, cross_v = inner_oracle.oracles(
-                inner_var,
-                outer_var,
-                v,
-                slice_inner,
-                inverse='id'
-            )
+            _, d_inner, hvp, (idx_cross, cross_v) = \
+                inner_oracle.oracles_sparse(
+                    inner_var,
+                    outer_var,
+                    v,
+                    slice_inner,
+                    inverse='id'
+                )
 
             slice_outer = slice(0, outer_oracle.n_samples)
-            grad_outer_in, grad_outer_out = outer_oracle.grad(
-                inner_var,
-                outer_var,
-                slice_outer
-            )
+            grad_outer_in, (idx_outer, grad_outer_out) = \
+                outer_oracle.grad_sparse(
+                    inner_var,
+                    outer_var,
+                    slice_outer
+                )
             # print(np.linalg.norm(hvp), np.linalg.norm(grad_outer_in))
             d_v = hvp + grad_outer_in
-            d_outer = cross_v + grad_outer_out
+            d_outer = np.zeros_like(outer_var)
+            d_outer[idx_cross] += cross_v
+            d_outer[idx_outer] += grad_outer_out
 
         else:  # Stochastic computations
+            # The gradients in outer_var are `(outer_idx, values)`, with
+            # the same outer_idx for the current and the old iterates. Both
+            # iterates are evaluated together on the batch.
             slice_inner, _ = inner_sampler.get_batch()
-            _, grad_inner_var, hvp, cross_v = inner_oracle.oracles(
-                inner_var, outer_var, v, slice_inner, inverse='id'
-            )
-            _, grad_inner_var_old, hvp_old, cross_v_old = inner_oracle.oracles(
-                inner_var_old, outer_var_old, v_old, slice_inner, inverse='id'
-            )
+            (_, grad_inner_var, hvp, (idx_cross, cross_v)), \
+                (_, grad_inner_var_old, hvp_old, (_idx, cross_v_old)) = \
+                inner_oracle.oracles_pair(
+                    inner_var, inner_var_old, outer_var, outer_var_old, v,
+                    v_old, slice_inner
+                )
 
             slice_outer, _ = outer_sampler.get_batch()
-            grad_outer_in, grad_outer_out = outer_oracle.grad(
-                inner_var, outer_var, slice_outer
-            )
-            grad_outer_in_old, grad_outer_out_old = outer_oracle.grad(
-                inner_var_old, outer_var_old, slice_outer
-            )
+            (grad_outer_in, (idx_outer, grad_outer_out)), \
+                (grad_outer_in_old, (_idx, grad_outer_out_old)) = \
+                outer_oracle.grad_pair(
+                    inner_var, inner_var_old, outer_var, outer_var_old,
+                    slice_outer
+                )
 
             d_inner += grad_inner_var - grad_inner_var_old
             d_v += (hvp - hvp_old) + (grad_outer_in - grad_outer_in_old)
-            d_outer += (cross_v - cross_v_old)
-            d_outer += (grad_outer_out - grad_outer_out_old)
+            d_outer[idx_cross] += (cross_v - cross_v_old)
+            d_outer[idx_outer] += (grad_outer_out - grad_outer_out_old)
 
         # Store the last iterates
         inner_var_old = inner_var.copy()
         v_old = v.copy()
         outer_var_old = outer_var.copy()
 
-        # Update of the variables
+        # Update of the variables. The recursive direction d_outer is dense,
+        # so the outer step is O(n_outer) even when its gradients are sparse.
         inner_var -= inner_lr * d_inner
         v -= inner_lr * d_v
         outer_var -= outer_lr * d_outer
@@ -317,22 +397,26 @@ def srba_jax(f_inner, f_outer, f_inner_fb, f_outer_fb, inner_var, outer_var, v,
             inner_sampler(state_inner_sampler))
         start_outer, *_, state_outer_sampler = (
             outer_sampler(state_outer_sampler))
-        grad_inner_var, vjp_train = jax.vjp(
-            lambda z, x: jax.grad(f_inner, argnums=0)(z, x, start_inner),
-            inner_var, outer_var
-        )
-        hvp, cross_v = vjp_train(v)
-        grad_outer_in, grad_outer_out = jax.grad(f_outer, argnums=(0, 1))(
-            inner_var, outer_var, start_outer
-        )
 
-        grad_inner_var_old, vjp_train_old = jax.vjp(
-            lambda z, x: jax.grad(f_inner, argnums=0)(z, x, start_inner),
-            inner_var_old, outer_var_old
-        )
-        hvp_old, cross_v_old = vjp_train_old(v_old)
-        grad_outer_in_old, grad_outer_out_old = jax.grad(
-            f_outer, argnums=(0, 1))(inner_var_old, outer_var_old, start_outer)
+        def oracles(inner_var, outer_var, v):
+            grad_inner_var, vjp_train = jax.vjp(
+                lambda z, x: jax.grad(f_inner, argnums=0)(z, x, start_inner),
+                inner_var, outer_var
+            )
+            hvp, cross_v = vjp_train(v)
+            grad_outer_in, grad_outer_out = jax.grad(
+                f_outer, argnums=(0, 1))(inner_var, outer_var, start_outer)
+            return grad_inner_var, hvp, cross_v, grad_outer_in, grad_outer_out
+
+        # Evaluate the current and the old iterates together, so that their
+        # products with the batch are stacked.
+        (grad_inner_var, grad_inner_var_old), (hvp, hvp_old), \
+            (cross_v, cross_v_old), (grad_outer_in, grad_outer_in_old), \
+            (grad_outer_out, grad_outer_out_old) = jax.vmap(oracles)(
+                jnp.stack([inner_var, inner_var_old]),
+                jnp.stack([outer_var, outer_var_old]),
+                jnp.stack([v, v_old]),
+            )
 
         d_inner += grad_inner_var - grad_inner_var_old
         d_v += (hvp - hvp_old) + (grad_outer_in - grad_outer_in_old)
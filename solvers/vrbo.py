@@ -6,7 +6,6 @@ from benchopt import safe_import_context
 with safe_import_context() as import_ctx:
     import numpy as np
     from numba import njit
-    from numba.experimental import jitclass
 
     from benchmark_utils import constants
     from benchmark_utils.sgd_inner import sgd_inner_vrbo
@@ -21,11 +20,12 @@ with safe_import_context() as import_ctx:
     from benchmark_utils.hessian_approximation import shia_fb, joint_shia
     from benchmark_utils.learning_rate_scheduler import spec as sched_spec
     from benchmark_utils.learning_rate_scheduler import LearningRateScheduler
-    from benchmark_utils.oracles import MultiLogRegOracle, DataCleaningOracle
+    from benchmark_utils.jax_cache import timed_run_once
+    from benchmark_utils.numba_utils import get_njit, get_jitclass
 
     import jax
     import jax.numpy as jnp
-    from functools import partial
+    from functools import lru_cache, partial
 
 
 class Solver(BaseSolver):
@@ -57,13 +57,6 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             if self.batch_size == 'full':
                 return True, "Numba is not useful for full bach resolution."
-            elif isinstance(f_train(),
-                            (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for " \
-                      "this oracle."
-            elif isinstance(f_val(), (MultiLogRegOracle, DataCleaningOracle)):
-                return True, "Numba implementation not available for" \
-                      "this oracle."
         elif self.framework not in ['jax', 'none', 'numba']:
             return True, f"Framework {self.framework} not supported."
         return False, None
@@ -84,26 +77,11 @@ class Solver(BaseSolver):
         if self.framework == 'numba':
             self.f_inner = f_train(framework=self.framework)
             self.f_outer = f_val(framework=self.framework)
-            njit_vrbo = njit(_vrbo)
-            njit_shia = njit(shia_fb)
-            njit_joint_shia = njit(joint_shia)
-            _sgd_inner_vrbo = njit(sgd_inner_vrbo)
-
-            @njit
-            def njit_sgd_inner_vrbo(
-                inner_oracle, outer_oracle,  inner_var,  outer_var, inner_lr,
-                inner_sampler, outer_sampler, n_inner_steps, memory_inner,
-                memory_outer, n_shia_steps, hia_lr
-            ):
-                return _sgd_inner_vrbo(
-                    njit_joint_shia, inner_oracle, outer_oracle, inner_var,
-                    outer_var, inner_lr, inner_sampler, outer_sampler,
-                    n_inner_steps, memory_inner, memory_outer, n_shia_steps,
-                    hia_lr
-                )
-
-            self.MinibatchSampler = jitclass(MinibatchSampler, mbs_spec)
-            self.LearningRateScheduler = jitclass(
+            njit_vrbo = get_njit(_vrbo)
+            njit_shia = get_njit(shia_fb)
+            njit_sgd_inner_vrbo = get_njit_sgd_inner_vrbo()
+            self.MinibatchSampler = get_jitclass(MinibatchSampler, mbs_spec)
+            self.LearningRateScheduler = get_jitclass(
                 LearningRateScheduler, sched_spec
             )
 
@@ -167,7 +145,7 @@ class Solver(BaseSolver):
         self.inner_var0 = inner_var0
         self.outer_var0 = outer_var0
         if self.framework == 'numba' or self.framework == 'jax':
-            self.run_once(2)
+            timed_run_once(self, 2)
 
     def run(self, callback):
         eval_freq = self.eval_freq  # // self.batch_size
@@ -253,6 +231,28 @@ class Solver(BaseSolver):
         return self.beta
 
 
+@lru_cache(maxsize=None)
+def get_njit_sgd_inner_vrbo():
+    """Returns `sgd_inner_vrbo` with `joint_shia` compiled with numba, created
+    once per process so that the runs share the compiled `_vrbo`."""
+    njit_joint_shia = get_njit(joint_shia)
+    _sgd_inner_vrbo = get_njit(sgd_inner_vrbo)
+
+    @njit
+    def njit_sgd_inner_vrbo(
+        inner_oracle, outer_oracle,  inner_var,  outer_var, inner_lr,
+        inner_sampler, outer_sampler, n_inner_steps, memory_inner,
+        memory_outer, n_shia_steps, hia_lr
+    ):
+        return _sgd_inner_vrbo(
+            njit_joint_shia, inner_oracle, outer_oracle, inner_var,
+            outer_var, inner_lr, inner_sampler, outer_sampler,
+            n_inner_steps, memory_inner, memory_outer, n_shia_steps,
+            hia_lr
+        )
+    return njit_sgd_inner_vrbo
+
+
 def _vrbo(
     sgd_inner_vrbo, shia, inner_oracle, outer_oracle, inner_var,
     outer_var, memory_inner, memory_outer, max_iter, inner_sampler,
@@ -0,0 +1,32 @@
+import pytest
+import numpy as np
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.async_metrics import AsyncMetrics  # noqa: E402
+
+
+def test_async_metrics():
+    def metrics(inner_var, outer_var):
+        return dict(value=inner_var.sum() + outer_var.sum())
+
+    inner_var, outer_var = np.zeros(3), np.zeros(2)
+    with AsyncMetrics(metrics, n_workers=2) as async_metrics:
+        for i in range(5):
+            async_metrics.submit(i, inner_var, outer_var)
+            # in place updates of the solver do not change the snapshots
+            inner_var += 1
+        results = async_metrics.results()
+    assert list(results) == list(range(5))
+    assert [r['value'] for r in results.values()] == [0, 3, 6, 9, 12]
+
+
+def test_async_metrics_error():
+    def metrics(inner_var, outer_var):
+        raise ValueError
+
+    with AsyncMetrics(metrics) as async_metrics:
+        async_metrics.submit(0, np.zeros(1), np.zeros(1))
+        with pytest.raises(ValueError):
+            async_metrics.results()
@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from functools import partial
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+import jax  # noqa: E402
+import jax.numpy as jnp  # noqa: E402
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.minibatch_sampler import init_sampler  # noqa: E402
+from benchmark_utils.batched import run_batched, tree_stack  # noqa: E402
+from benchmark_utils.batched import split_trajectory  # noqa: E402
+from benchmark_utils.learning_rate_scheduler import init_lr_scheduler  # noqa
+from solvers.soba import soba_jax  # noqa: E402
+
+
+def _make_problem(n_samples, n_features, batch_size):
+    X = np.random.randn(n_samples, n_features)
+    y = np.sign(np.random.randn(n_samples))
+    f_inner = oracles.LogisticRegressionOracle(X, y, reg='exp')
+    f_outer = oracles.LogisticRegressionOracle(X, y)
+    f_inner = jax.jit(partial(f_inner.get_framework(framework='jax'),
+                              batch_size=batch_size))
+    f_outer = jax.jit(partial(f_outer.get_framework(framework='jax'),
+                              batch_size=batch_size))
+    return f_inner, f_outer
+
+
+def _init_state(n_samples, n_features, batch_size, step_size, seed):
+    inner_var = jnp.zeros(n_features)
+    outer_var = jnp.zeros(n_features)
+    state_lr = init_lr_scheduler(jnp.array([step_size, step_size]),
+                                 jnp.array([.5, .5]))
+    _, state_sampler = init_sampler(n_samples, batch_size, random_state=seed)
+    carry = dict(state_lr=state_lr, state_inner_sampler=state_sampler,
+                 state_outer_sampler=state_sampler)
+    return (inner_var, outer_var, jnp.zeros(n_features)), carry
+
+
+@pytest.mark.parametrize('n_evals', [1, 3])
+def test_run_batched(n_evals):
+    n_samples, n_features, batch_size = 128, 5, 16
+    f_inner, f_outer = _make_problem(n_samples, n_features, batch_size)
+    sampler, _ = init_sampler(n_samples, batch_size)
+    solver = partial(soba_jax, f_inner, f_outer, inner_sampler=sampler,
+                     outer_sampler=sampler, max_iter=4)
+
+    configs = [(.1, 1), (.1, 2), (.01, 1)]
+    states = [
+        _init_state(n_samples, n_features, batch_size, step_size, seed)
+        for step_size, seed in configs
+    ]
+    args, carry = tree_stack(states)
+    _, _, trajectory = run_batched(solver, args, carry, n_evals=n_evals)
+    assert len(trajectory) == n_evals + 1
+
+    # check that each run matches the corresponding sequential run.
+    for i, (args, carry) in enumerate(states):
+        for k in range(n_evals):
+            *args, carry = solver(*args, **carry)
+            inner_var, outer_var = trajectory[k + 1]
+            assert np.allclose(inner_var[i], args[0], atol=1e-5)
+            assert np.allclose(outer_var[i], args[1], atol=1e-5)
+
+
+def test_split_trajectory():
+    inner_var = jnp.arange(4)[:, None] * jnp.ones((4, 2))
+    trajectory = [(inner_var, -inner_var)]
+    keys = [(.1, 1), (.1, 1), (.01, 1), (.1, 1)]
+    trajectories = split_trajectory(trajectory, keys)
+    assert set(trajectories) == {(.1, 1), (.01, 1)}
+    inner, outer = trajectories[(.1, 1)][0]
+    assert np.allclose(inner[:, 0], [0, 1, 3])
+    assert np.allclose(outer, -inner)
@@ -0,0 +1,86 @@
+import threading
+
+import jax
+import pytest
+import numpy as np
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.chunked_oracle import ChunkedOracle  # noqa: E402
+from benchmark_utils.chunked_oracle import get_chunked_oracle_jax  # noqa
+
+
+def get_oracle(name, n_samples=100, n_features=4, n_classes=3):
+    X = np.random.randn(n_samples, n_features)
+    if name == 'logreg':
+        y = np.sign(np.random.randn(n_samples))
+        oracle = oracles.LogisticRegressionOracle(X, y, reg='exp')
+        outer_var = np.random.randn(n_features)
+        inner_var = np.random.randn(n_features)
+    else:
+        y = np.random.randint(n_classes, size=n_samples)
+        oracle = oracles.DataCleaningOracle(X, y)
+        outer_var = np.random.randn(n_samples)
+        inner_var = np.random.randn(n_features * n_classes)
+    return oracle, inner_var, outer_var
+
+
+def to_dense(grad, size):
+    idx, values = grad
+    res = np.zeros(size)
+    res[idx] = values
+    return res
+
+
+@pytest.mark.parametrize('name', ['logreg', 'datacleaning'])
+def test_chunked_oracle(name):
+    n_threads = threading.active_count()
+    oracle, inner_var, outer_var = get_oracle(name)
+    v = np.random.randn(*inner_var.shape)
+    chunked = ChunkedOracle(oracle, chunk_size=23, n_jobs=2)
+    assert chunked.n_samples == oracle.n_samples
+
+    for idx in [slice(0, 100), slice(10, 90), slice(5, 20)]:
+        grad_in, grad_out = chunked.grad_sparse(inner_var, outer_var, idx)
+        grad_in_, grad_out_ = oracle.grad_sparse(inner_var, outer_var, idx)
+        assert np.allclose(grad_in, grad_in_)
+        assert np.allclose(to_dense(grad_out, outer_var.shape[0]),
+                           to_dense(grad_out_, outer_var.shape[0]))
+
+        out = np.empty((2, inner_var.shape[0]))
+        val, grad, hvp, cross_v = chunked.oracles_sparse(
+            inner_var, outer_var, v, idx, out=out
+        )
+        val_, grad_, hvp_, cross_v_ = oracle.oracles_sparse(
+            inner_var, outer_var, v, idx
+        )
+        assert np.allclose(val, val_)
+        assert np.allclose(grad, grad_) and np.shares_memory(grad, out)
+        assert np.allclose(hvp, hvp_) and np.shares_memory(hvp, out)
+        assert np.allclose(to_dense(cross_v, outer_var.shape[0]),
+                           to_dense(cross_v_, outer_var.shape[0]))
+
+    # no thread is left running after the calls
+    assert threading.active_count() == n_threads
+
+
+@pytest.mark.parametrize('name', ['logreg', 'datacleaning'])
+@pytest.mark.parametrize('chunk_size', [25, 23])
+def test_chunked_oracle_jax(name, chunk_size):
+    oracle, inner_var, outer_var = get_oracle(name)
+    v = np.random.randn(*inner_var.shape)
+    f, f_fb = oracle.get_framework('jax', get_full_batch=True)
+    f_chunked = jax.jit(get_chunked_oracle_jax(f, 100, chunk_size))
+
+    def oracles(f):
+        grad_inner, vjp = jax.vjp(
+            jax.grad(f), inner_var, outer_var
+        )
+        # v is cast to the dtype of jax, which depends on jax_enable_x64.
+        return (f(inner_var, outer_var), grad_inner,
+                *vjp(v.astype(grad_inner.dtype)))
+
+    for res, res_ in zip(oracles(f_chunked), oracles(f_fb)):
+        assert np.allclose(res, res_, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,134 @@
+import pytest
+import numpy as np
+from numba import from_dtype
+from numba.experimental import jitclass
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.compressed_memory import get_spec  # noqa: E402
+from benchmark_utils.compressed_memory import get_numpy_dtype  # noqa: E402
+from benchmark_utils.compressed_memory import CompressedMemory  # noqa: E402
+from benchmark_utils.compressed_memory import init_compressed_memory  # noqa
+from benchmark_utils.compressed_memory import init_compressed_memory_jax  # noqa
+from benchmark_utils.compressed_memory import swap_compressed_memory_jax  # noqa
+from benchmark_utils.compressed_memory import update_compressed_memory_jax  # noqa
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('dtype, rtol', [
+    ('float32', 1e-6), ('float16', 1e-3), ('int8', 5e-2)
+])
+def test_compressed_memory(framework, dtype, rtol):
+    if framework == 'numba' and dtype == 'float16':
+        pytest.skip("Numba does not support float16.")
+    memory_class = CompressedMemory
+    if framework == 'numba':
+        memory_class = jitclass(
+            CompressedMemory, get_spec(from_dtype(get_numpy_dtype(dtype)))
+        )
+    n_batches, size = 5, 10
+    weight = 1 / n_batches
+    memory = init_compressed_memory(n_batches, size, dtype, memory_class)
+    entries = np.zeros((n_batches, size))
+    all_idx = slice(0, size)
+    for idx in np.random.randint(n_batches, size=50):
+        values = np.random.randn(size)
+        correction, change = memory.swap(idx, all_idx, values)
+        memory.mean += weight * change
+        assert np.allclose(correction, values - entries[idx], rtol=rtol,
+                           atol=rtol)
+        entries[idx] = values
+        assert np.allclose(memory.load(idx, all_idx), values, rtol=rtol,
+                           atol=rtol)
+
+    # The mean is exactly the one of the stored entries
+    stored = np.array([memory.load(i, all_idx) for i in range(n_batches)])
+    assert np.allclose(memory.mean, weight * stored.sum(axis=0),
+                       rtol=1e-12, atol=1e-12)
+    assert np.allclose(stored, entries, rtol=rtol, atol=rtol)
+
+    # Sparse updates only change the given coordinates of an entry
+    memory = init_compressed_memory(n_batches, size, dtype, memory_class)
+    values = np.random.randn(3)
+    correction, change = memory.swap(1, slice(2, 5), values)
+    assert np.all(correction == values)
+    assert np.allclose(change, values, rtol=rtol, atol=rtol)
+    stored = memory.load(1, all_idx)
+    assert np.all(stored[:2] == 0) and np.all(stored[5:] == 0)
+    assert np.all(memory.mean == 0)
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'bfloat16', 'int8'])
+def test_compressed_memory_jax(dtype):
+    n_batches, size = 5, 10
+    weight = 1 / n_batches
+    memory = init_compressed_memory_jax(n_batches, size, dtype)
+    entries = np.zeros((n_batches, size), np.float32)
+    for idx in np.random.randint(n_batches, size=20):
+        values = np.random.randn(size).astype(np.float32)
+        memory, correction, change = swap_compressed_memory_jax(
+            memory, idx, values
+        )
+        memory['mean'] = memory['mean'] + weight * change
+        assert np.allclose(correction, values - entries[idx], rtol=2e-2,
+                           atol=2e-2)
+        entries[idx] = values
+
+    stored = np.asarray(memory['table'], np.float32) * \
+        np.asarray(memory['scale'])[:, None]
+    assert np.allclose(memory['mean'], weight * stored.sum(axis=0),
+                       rtol=1e-5, atol=1e-5)
+    assert np.allclose(stored, entries, rtol=2e-2, atol=2e-2)
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('dtype', ['float64', 'int8'])
+def test_block_memory(framework, dtype):
+    memory_class = CompressedMemory
+    if framework == 'numba':
+        memory_class = jitclass(
+            CompressedMemory, get_spec(from_dtype(get_numpy_dtype(dtype)))
+        )
+    n_samples, batch_size = 23, 5
+    n_batches = (n_samples + batch_size - 1) // batch_size
+    weight = batch_size / n_samples
+    memory = init_compressed_memory(n_batches, n_samples, dtype, memory_class)
+    block_memory = init_compressed_memory(
+        n_batches, n_samples, dtype, memory_class, block_size=batch_size
+    )
+    assert block_memory.table.shape == (n_batches, batch_size)
+    for idx in np.random.randint(n_batches, size=30):
+        var_idx = slice(idx * batch_size, (idx + 1) * batch_size)
+        values = np.random.randn(len(range(n_samples)[var_idx]))
+        for mem in [memory, block_memory]:
+            correction, change = mem.swap(idx, var_idx, values)
+            mem.mean[var_idx] += weight * change
+        assert np.all(block_memory.mean == memory.mean)
+        assert np.all(block_memory.load(idx, var_idx) ==
+                      memory.load(idx, var_idx))
+
+
+@pytest.mark.parametrize('block_size', [5, 0])
+def test_block_memory_jax(block_size):
+    n_samples, batch_size = 23, 5
+    n_batches = (n_samples + batch_size - 1) // batch_size
+    weight = batch_size / n_samples
+    memory = init_compressed_memory_jax(n_batches, n_samples, 'float32')
+    block_memory = init_compressed_memory_jax(
+        n_batches, n_samples, 'float32', block_size=block_size
+    )
+    for idx in np.random.randint(n_batches, size=30):
+        # the last batch is shifted to fit in the samples, like in the jax
+        # oracles
+        start = min(idx * batch_size, n_samples - batch_size)
+        grad = np.zeros(n_samples, np.float32)
+        grad[start:start + block_size] = np.random.randn(block_size)
+        memory, direction = update_compressed_memory_jax(
+            memory, grad, idx, weight, start
+        )
+        block_memory, block_direction = update_compressed_memory_jax(
+            block_memory, grad, idx, weight, start
+        )
+        assert np.allclose(block_direction, direction)
+        assert np.allclose(block_memory['mean'], memory['mean'])
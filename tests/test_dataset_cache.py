@@ -0,0 +1,50 @@
+import numpy as np
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.dataset_cache import load_splits  # noqa: E402
+
+
+def test_load_splits(tmp_path):
+    calls = []
+
+    def get_splits():
+        calls.append(1)
+        return dict(X_train=np.arange(6.).reshape(3, 2),
+                    y_train=np.array([0, 1, 1]))
+
+    for _ in range(2):
+        splits = load_splits('dummy', dict(random_state=0), get_splits,
+                             cache_dir=tmp_path)
+        assert isinstance(splits['X_train'], np.memmap)
+        assert not splits['X_train'].flags.writeable
+        assert np.array_equal(splits['X_train'],
+                              np.arange(6.).reshape(3, 2))
+        assert np.array_equal(splits['y_train'], [0, 1, 1])
+    assert len(calls) == 1
+
+    # other parameters give another cache entry
+    load_splits('dummy', dict(random_state=1), get_splits, cache_dir=tmp_path)
+    assert len(calls) == 2
+
+
+def test_oracles_memmap(tmp_path):
+    X = np.random.randn(50, 4)
+    y = np.sign(np.random.randn(50))
+    splits = load_splits('dummy', {}, lambda: dict(X=X, y=y),
+                         cache_dir=tmp_path)
+
+    inner_var, outer_var = np.random.randn(4), np.random.randn(4)
+    idx = slice(0, 10)
+    f_ref = oracles.LogisticRegressionOracle(X, y, reg='exp')
+    f = oracles.LogisticRegressionOracle(splits['X'], splits['y'], reg='exp')
+    for framework in ['none', 'numba']:
+        f_framework = f.get_framework(framework=framework)
+        # The data is used without any copy.
+        assert np.shares_memory(f_framework.X, splits['X'])
+        assert np.allclose(
+            f_framework.grad_inner_var(inner_var, outer_var, idx),
+            f_ref.grad_inner_var(inner_var, outer_var, idx)
+        )
@@ -0,0 +1,50 @@
+import csv
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.jax_cache import timed_run_once  # noqa: E402
+
+
+class DummySolver():
+    # Not jax, so that the compilation cache of the tests is not enabled
+    framework = 'numba'
+
+    def __init__(self):
+        self.calls = []
+
+    def __repr__(self):
+        return 'Dummy[step_size=0.1,framework=jax]'
+
+    def run_once(self, stop_val):
+        self.calls.append(stop_val)
+
+
+def test_timed_run_once(tmp_path):
+    log_file = tmp_path / 'compile_times.csv'
+    solver = DummySolver()
+    for _ in range(2):
+        compile_time = timed_run_once(solver, 2, log_file=log_file)
+    assert solver.calls == [2, 2]
+    assert solver.compile_time == compile_time >= 0
+
+    # one row per call, the name of the solver being quoted
+    with open(log_file, newline='') as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 2
+    assert rows[1] == [str(solver), str(compile_time)]
+
+
+def test_timed_run_once_opt_in(tmp_path, monkeypatch):
+    log_file = tmp_path / 'compile_times.csv'
+    solver = DummySolver()
+
+    # nothing is logged by default
+    monkeypatch.delenv('BENCHMARK_COMPILE_TIMES', raising=False)
+    timed_run_once(solver, 2)
+    assert not log_file.exists()
+
+    monkeypatch.setenv('BENCHMARK_COMPILE_TIMES', str(log_file))
+    timed_run_once(solver, 2)
+    with open(log_file, newline='') as f:
+        assert list(csv.reader(f)) == [[str(solver), str(solver.compile_time)]]
@@ -0,0 +1,181 @@
+import jax
+import pytest
+import numpy as np
+from numba import njit
+from scipy import sparse
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.oracles.special import expit, logsig  # noqa: E402
+from benchmark_utils.oracles.logreg import log_loss_terms  # noqa: E402
+from benchmark_utils.oracles.logreg import hvp_log_loss  # noqa: E402
+from benchmark_utils.oracles.logreg import grad_theta_log_loss  # noqa: E402
+from benchmark_utils.oracles.logreg import value_grad_hvp_log_loss  # noqa
+from benchmark_utils.oracles.logreg import value_grad_hvp_log_loss_njit  # noqa
+from benchmark_utils.oracles import LogisticRegressionOracle  # noqa: E402
+
+
+def test_log_loss_terms():
+    t = np.array([-800., -40., -20., -1., 0., 1., 20., 40., 800.])
+    loss, tmp, curvature = log_loss_terms(t)
+    assert np.all(np.isfinite(loss)) and np.all(np.isfinite(curvature))
+    assert np.allclose(loss, -logsig(t))
+    assert np.allclose(tmp, expit(-t))
+    assert np.allclose(curvature, expit(t) * expit(-t), rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize('kernel', ['numpy', 'sparse', 'numba'])
+def test_value_grad_hvp_log_loss(kernel):
+    n_samples, n_features = 50, 4
+    x = 10 * np.random.randn(n_samples, n_features)
+    y = np.sign(np.random.randn(n_samples))
+    theta, v = np.random.randn(n_features), np.random.randn(n_features)
+
+    val_ = -logsig(y * (x @ theta)).mean()
+    grad_ = grad_theta_log_loss(x, y, theta)
+    hvp_ = hvp_log_loss(x, y, theta, v)
+
+    if kernel == 'numba':
+        out = np.empty((2, n_features))
+        val, grad, hvp = value_grad_hvp_log_loss_njit(x, y, theta, v, out)
+        assert np.shares_memory(grad, out) and np.shares_memory(hvp, out)
+    else:
+        if kernel == 'sparse':
+            x = sparse.csr_matrix(x)
+        val, grad, hvp = value_grad_hvp_log_loss(x, y, theta, v)
+    assert np.allclose(val, val_)
+    assert np.allclose(grad, grad_)
+    assert np.allclose(hvp, hvp_)
+
+
+@njit
+def _numba_oracles(f, theta, lmbda, v):
+    res = []
+    for idx in [slice(10, 47), slice(90, 110), slice(None)]:
+        res.append(np.array([f.value(theta, lmbda, idx)]))
+        res.append(f.grad_inner_var(theta, lmbda, idx))
+        res.append(f.hvp(theta, lmbda, v, idx))
+        _, grad, hvp, cross_v = f.oracles(theta, lmbda, v, idx)
+        res.append(grad)
+        res.append(hvp)
+        res.append(cross_v)
+    return res
+
+
+@pytest.mark.parametrize('reg', ['exp', 'none'])
+def test_csr_oracle(reg):
+    X = sparse.random(100, 30, density=.2, format='csr', random_state=0)
+    y = np.sign(np.random.randn(100))
+    theta, lmbda, v = np.random.randn(3, 30)
+
+    f = LogisticRegressionOracle(X, y, reg=reg)
+    f_dense = LogisticRegressionOracle(X.toarray(), y, reg=reg)
+
+    # the numba oracle reads the minibatches in the CSR arrays, without copy
+    f_numba = f.get_framework('numba')
+    assert np.shares_memory(f_numba.data, X.data)
+    assert np.shares_memory(f_numba.indices, X.indices)
+    res = _numba_oracles(f_numba, theta, lmbda, v)
+    res_ = _numba_oracles(f_dense.get_framework('numba'), theta, lmbda, v)
+    for r, r_ in zip(res, res_):
+        assert np.allclose(r, r_)
+
+    # the jax oracle slices a BCOO matrix
+    jax_oracle, jax_oracle_fb = f.get_framework('jax', get_full_batch=True)
+    jax_oracle_, jax_oracle_fb_ = f_dense.get_framework(
+        'jax', get_full_batch=True
+    )
+    assert np.allclose(jax_oracle_fb(theta, lmbda),
+                       jax_oracle_fb_(theta, lmbda), rtol=1e-5)
+    grad = jax.grad(jax_oracle)(theta, lmbda, 10, 37)
+    grad_ = jax.grad(jax_oracle_)(theta, lmbda, 10, 37)
+    assert np.allclose(grad, grad_, atol=1e-6)
+
+
+@njit
+def _numba_pair_oracles(f, theta, theta_old, lmbda, lmbda_old, v, v_old,
+                        idx):
+    (grad, (_, grad_lmbda)), (grad_old, (_, grad_lmbda_old)) = f.grad_pair(
+        theta, theta_old, lmbda, lmbda_old, idx
+    )
+    res_pair = f.oracles_pair(
+        theta, theta_old, lmbda, lmbda_old, v, v_old, idx
+    )
+    res = [grad, grad_lmbda, grad_old, grad_lmbda_old]
+    for val, grad, hvp, (_, cross_v) in res_pair:
+        res += [np.array([val]), grad, hvp, cross_v]
+    return res
+
+
+@pytest.mark.parametrize('reg', ['exp', 'none'])
+@pytest.mark.parametrize('csr', [False, True])
+def test_pair_oracles(reg, csr):
+    X = sparse.random(100, 30, density=.2, format='csr', random_state=0)
+    if not csr:
+        X = X.toarray()
+    y = np.sign(np.random.randn(100))
+    theta, theta_old, lmbda, lmbda_old, v, v_old = np.random.randn(6, 30)
+    f = LogisticRegressionOracle(X, y, reg=reg)
+    idx = slice(10, 47)
+
+    # the pair oracles match the oracles computed at each point
+    res = _numba_pair_oracles(f.get_framework('numba'), theta, theta_old,
+                              lmbda, lmbda_old, v, v_old, idx)
+    res_ = []
+    for point in [(theta, lmbda), (theta_old, lmbda_old)]:
+        res_ += list(f.grad(*point, idx))
+    for point in [(theta, lmbda, v), (theta_old, lmbda_old, v_old)]:
+        val, grad, hvp, cross_v = f.oracles(*point, idx)
+        res_ += [np.array([val]), grad, hvp, cross_v]
+    for r, r_ in zip(res, res_):
+        assert np.allclose(r, r_)
+
+    res = f.grad_pair(theta, theta_old, lmbda, lmbda_old, idx)
+    for (grad, (_, grad_lmbda)), r_ in zip(res, [res_[:2], res_[2:4]]):
+        assert np.allclose(grad, r_[0]) and np.allclose(grad_lmbda, r_[1])
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('csr', [False, True])
+def test_grad_inner_var_stack(framework, csr):
+    X = sparse.random(100, 30, density=.2, format='csr', random_state=0)
+    if not csr:
+        X = X.toarray()
+    y = np.sign(np.random.randn(100))
+    thetas, lmbdas = np.random.randn(2, 3, 30)
+    f = LogisticRegressionOracle(X, y, reg='exp')
+    idx = slice(10, 47)
+
+    grads = f.get_framework(framework).grad_inner_var_stack(
+        thetas, lmbdas, idx
+    )
+    assert grads.shape == thetas.shape
+    for grad, theta, lmbda in zip(grads, thetas, lmbdas):
+        assert np.allclose(grad, f.grad_inner_var(theta, lmbda, idx))
+
+
+@pytest.mark.parametrize('reg', ['exp', 'lin', 'none'])
+def test_mixed_dtype_oracles(reg):
+    # the float64 metrics oracles are called with the float32 outer variable
+    # of the solvers
+    X = np.random.randn(100, 3)
+    y = np.sign(np.random.randn(100))
+    theta, v = np.random.randn(2, 3)
+    lmbda = np.random.randn(3).astype(np.float32)
+    f = LogisticRegressionOracle(X, y, reg=reg)
+    lmbda_ = lmbda.astype(np.float64)
+
+    for res, res_ in zip(f.get_grad(theta, lmbda),
+                         f.get_grad(theta, lmbda_)):
+        assert np.allclose(res, res_)
+    assert np.allclose(f.get_cross(theta, lmbda, v),
+                       f.get_cross(theta, lmbda_, v))
+    idx = slice(10, 47)
+    for res, res_ in zip(
+        f.oracles_pair(theta, theta, lmbda, lmbda, v, v, idx)[0],
+        f.oracles_pair(theta, theta, lmbda_, lmbda_, v, v, idx)[0]
+    ):
+        if isinstance(res, tuple):
+            res, res_ = res[1], res_[1]
+        assert np.allclose(res, res_)
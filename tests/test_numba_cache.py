@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.numba_utils import get_njit, get_jitclass  # noqa: E402
+from benchmark_utils.minibatch_sampler import MinibatchSampler  # noqa: E402
+from benchmark_utils.minibatch_sampler import spec as mbs_spec  # noqa: E402
+
+
+def add(x, y):
+    return x + y
+
+
+def test_get_njit_get_jitclass():
+    njit_add = get_njit(add)
+    assert njit_add is get_njit(add)
+    assert njit_add(1., 2.) == 3.
+    assert get_njit(add, parallel=True) is not njit_add
+
+    sampler_class = get_jitclass(MinibatchSampler, mbs_spec)
+    assert sampler_class is get_jitclass(MinibatchSampler, list(mbs_spec))
+
+
+SCRIPT = """
+import numpy as np
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+from benchmark_utils.oracles.special import logsumexp
+logsumexp(np.ones((3, 2)))
+print(sum(logsumexp.stats.cache_hits.values()))
+"""
+
+
+def test_kernels_cached_on_disk(tmp_path):
+    # The second process loads the kernel compiled by the first one
+    env = {**os.environ, 'NUMBA_CACHE_DIR': str(tmp_path)}
+    hits = [
+        subprocess.run(
+            [sys.executable, '-c', SCRIPT], env=env, check=True,
+            capture_output=True, text=True
+        ).stdout.split()[-1]
+        for _ in range(2)
+    ]
+    assert hits == ['0', '1']
@@ -0,0 +1,232 @@
+import pytest
+import numpy as np
+from numba import njit
+from scipy import sparse
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.oracles.datacleaning import datacleaning_oracle  # noqa
+from benchmark_utils.oracles.datacleaning import datacleaning_oracle_njit  # noqa
+
+
+def _get_oracle(oracle, reg, n_samples=60, n_features=4, n_classes=3):
+    X = np.random.randn(n_samples, n_features)
+    y = np.random.randint(n_classes, size=n_samples)
+    if oracle == 'logreg':
+        f = oracles.LogisticRegressionOracle(X, 2 * (y > 0) - 1, reg=reg)
+    elif oracle == 'multilogreg':
+        f = oracles.MultiLogRegOracle(X, y, reg=reg)
+    elif oracle == 'datacleaning':
+        f = oracles.DataCleaningOracle(X, y, reg=reg)
+    inner_shape, outer_shape = f.variables_shape
+    inner_var = np.random.randn(*inner_shape)
+    outer_var = np.random.randn(*outer_shape)
+    v = np.random.randn(*inner_shape)
+    return f, inner_var, outer_var, v
+
+
+@pytest.mark.parametrize('oracle, reg', [('multilogreg', 'exp'),
+                                         ('multilogreg', 'none'),
+                                         ('datacleaning', 2e-1)])
+def test_numba_oracle(oracle, reg):
+    f, inner_var, outer_var, v = _get_oracle(oracle, reg)
+    f_numba = f.get_framework(framework='numba')
+
+    for idx in [slice(5, 25), np.arange(10, 30)]:
+        for method in ['value', 'grad_inner_var', 'grad_outer_var']:
+            assert np.allclose(
+                getattr(f, method)(inner_var, outer_var, idx),
+                getattr(f_numba, method)(inner_var, outer_var, idx)
+            ), method
+        for method in ['cross', 'hvp']:
+            assert np.allclose(
+                getattr(f, method)(inner_var, outer_var, v, idx),
+                getattr(f_numba, method)(inner_var, outer_var, v, idx)
+            ), method
+        for res, res_numba in zip(
+            f.grad(inner_var, outer_var, idx),
+            f_numba.grad(inner_var, outer_var, idx)
+        ):
+            assert np.allclose(res, res_numba)
+        for res, res_numba in zip(
+            f.oracles(inner_var, outer_var, v, idx),
+            f_numba.oracles(inner_var, outer_var, v, idx)
+        ):
+            assert np.allclose(res, res_numba)
+
+
+def test_datacleaning_oracle_njit():
+    f, inner_var, outer_var, v = _get_oracle('datacleaning', 2e-1)
+    theta = inner_var.reshape(f.n_features, f.n_classes)
+    v = v.reshape(f.n_features, f.n_classes)
+    idx = np.arange(10, 30)
+
+    # the outer gradients are only returned on idx
+    out = np.empty((2, inner_var.shape[0]))
+    loss, grad_theta, grad_lbda, hvp, jvp = datacleaning_oracle_njit(
+        f.X, f.y, theta, outer_var, v, idx, out
+    )
+    loss_, grad_theta_, grad_lbda_, hvp_, jvp_ = datacleaning_oracle(
+        f.X, f.y, theta, outer_var, v, idx
+    )
+    assert np.allclose(loss, loss_)
+    assert np.allclose(grad_theta, grad_theta_)
+    assert np.allclose(hvp, hvp_)
+    assert grad_lbda.shape == jvp.shape == (20,)
+    assert np.allclose(grad_lbda, grad_lbda_[idx])
+    assert np.allclose(jvp, jvp_[idx])
+
+
+def _densify_outer_grads(f, inner_var, outer_var, v, idx):
+    grad_inner, (idx_grad, grad_outer) = f.grad_sparse(
+        inner_var, outer_var, idx
+    )
+    _, _, _, (idx_cross, cross_v) = f.oracles_sparse(
+        inner_var, outer_var, v, idx
+    )
+    dense_grad = np.zeros_like(outer_var)
+    dense_grad[idx_grad] = grad_outer
+    dense_cross = np.zeros_like(outer_var)
+    dense_cross[idx_cross] = cross_v
+    return grad_inner, dense_grad, dense_cross
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('oracle, reg', [('multilogreg', 'exp'),
+                                         ('multilogreg', 'none'),
+                                         ('datacleaning', 2e-1)])
+def test_sparse_oracles(oracle, reg, framework):
+    f, inner_var, outer_var, v = _get_oracle(oracle, reg)
+    densify = _densify_outer_grads
+    if framework == 'numba':
+        # slices cannot be returned to python by numba.
+        f, densify = f.get_framework(framework='numba'), njit(densify)
+
+    idx = slice(5, 25)
+    grad_inner, grad_outer, cross_v = densify(f, inner_var, outer_var, v, idx)
+    grad_inner_, grad_outer_ = f.grad(inner_var, outer_var, idx)
+    assert np.allclose(grad_inner, grad_inner_)
+    assert np.allclose(grad_outer, grad_outer_)
+    assert np.allclose(cross_v, f.oracles(inner_var, outer_var, v, idx)[3])
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('oracle, reg', [('multilogreg', 'exp'),
+                                         ('datacleaning', 2e-1)])
+def test_oracles_out(oracle, reg, framework):
+    f, inner_var, outer_var, v = _get_oracle(oracle, reg)
+    f = f.get_framework(framework=framework)
+    idx = np.arange(5, 25)
+
+    # the gradients in inner_var are written in the given buffers, passed
+    # as positional arguments as jitclass methods do not take keywords.
+    out = np.empty(inner_var.shape[0])
+    grad_inner, grad_outer = f.grad(inner_var, outer_var, idx, out)
+    assert np.shares_memory(grad_inner, out)
+    grad_inner_, grad_outer_ = f.grad(inner_var, outer_var, idx)
+    assert np.allclose(grad_inner, grad_inner_)
+    assert np.allclose(grad_outer, grad_outer_)
+
+    out = np.empty((2, inner_var.shape[0]))
+    res = f.oracles(inner_var, outer_var, v, idx, 'id', out)
+    assert np.shares_memory(res[1], out[0])
+    assert np.shares_memory(res[2], out[1])
+    res_ = f.oracles(inner_var, outer_var, v, idx)
+    for r, r_ in zip(res, res_):
+        assert np.allclose(r, r_)
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('oracle, reg, csr', [('multilogreg', 'exp', False),
+                                              ('datacleaning', 2e-1, False),
+                                              ('logreg', 'exp', False),
+                                              ('logreg', 'exp', True)])
+def test_float32_oracles(oracle, reg, csr, framework):
+    f, inner_var, outer_var, v = _get_oracle(oracle, reg)
+    X = sparse.csr_matrix(f.X) if csr else f.X
+    f = type(f)(X, f.y, reg=reg)
+    f32 = type(f)(X.astype(np.float32), f.y, reg=reg)
+    f = f.get_framework(framework=framework)
+    f32 = f32.get_framework(framework=framework)
+    idx = slice(5, 25)
+
+    # the gradients are computed in the dtype of the data
+    res = f.oracles(inner_var, outer_var, v, idx)
+    res32 = f32.oracles(*(x.astype(np.float32) for x in
+                          (inner_var, outer_var, v)), idx)
+    for r, r32 in zip(res[1:], res32[1:]):
+        assert r32.dtype == np.float32
+        assert np.allclose(r, r32, rtol=1e-4, atol=1e-5)
+
+
+def _pair_oracles(f, inner_vars, outer_vars, vs, idx):
+    # returns the oracles at both points, with dense outer gradients.
+    pair = f.grad_pair(inner_vars[0], inner_vars[1], outer_vars[0],
+                       outer_vars[1], idx)
+    pair_oracles = f.oracles_pair(inner_vars[0], inner_vars[1],
+                                  outer_vars[0], outer_vars[1], vs[0], vs[1],
+                                  idx)
+    res = []
+    for i in range(2):
+        grad_inner, (idx_grad, grad_outer) = pair[i]
+        val, grad, hvp, (idx_cross, cross_v) = pair_oracles[i]
+        dense_grad = np.zeros_like(outer_vars[i])
+        dense_grad[idx_grad] = grad_outer
+        dense_cross = np.zeros_like(outer_vars[i])
+        dense_cross[idx_cross] = cross_v
+        res.append(grad_inner)
+        res.append(dense_grad)
+        res.append(np.array([val]))
+        res.append(grad)
+        res.append(hvp)
+        res.append(dense_cross)
+    return res
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('oracle, reg', [('multilogreg', 'exp'),
+                                         ('multilogreg', 'none'),
+                                         ('datacleaning', 2e-1)])
+def test_pair_oracles(oracle, reg, framework):
+    f, inner_var, outer_var, v = _get_oracle(oracle, reg)
+    inner_vars = np.stack([inner_var, np.random.randn(*inner_var.shape)])
+    outer_vars = np.stack([outer_var, np.random.randn(*outer_var.shape)])
+    vs = np.stack([v, np.random.randn(*v.shape)])
+    idx = slice(5, 25)
+
+    # the pair oracles match the oracles computed at each point
+    pair_oracles = _pair_oracles
+    f_framework = f.get_framework(framework=framework)
+    if framework == 'numba':
+        pair_oracles = njit(_pair_oracles)
+    res = pair_oracles(f_framework, inner_vars, outer_vars, vs, idx)
+    for i in range(2):
+        grad_inner, grad_outer, cross_v = _densify_outer_grads(
+            f, inner_vars[i], outer_vars[i], vs[i], idx
+        )
+        val, grad, hvp, _ = f.oracles(inner_vars[i], outer_vars[i], vs[i],
+                                      idx)
+        expected = [grad_inner, grad_outer, val, grad, hvp, cross_v]
+        for r, r_ in zip(res[6 * i:6 * (i + 1)], expected):
+            assert np.allclose(r, r_)
+
+
+@pytest.mark.parametrize('framework', ['none', 'numba'])
+@pytest.mark.parametrize('oracle, reg', [('multilogreg', 'exp'),
+                                         ('datacleaning', 2e-1)])
+def test_grad_inner_var_stack(oracle, reg, framework):
+    f, inner_var, outer_var, _ = _get_oracle(oracle, reg)
+    inner_vars = np.stack([inner_var, np.random.randn(*inner_var.shape),
+                           np.random.randn(*inner_var.shape)])
+    outer_vars = np.stack([outer_var, np.random.randn(*outer_var.shape),
+                           np.random.randn(*outer_var.shape)])
+    idx = slice(5, 25)
+
+    grads = f.get_framework(framework=framework).grad_inner_var_stack(
+        inner_vars, outer_vars, idx
+    )
+    assert grads.shape == inner_vars.shape
+    for grad, inner_var, outer_var in zip(grads, inner_vars, outer_vars):
+        assert np.allclose(grad, f.grad_inner_var(inner_var, outer_var, idx))
@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+optuna = pytest.importorskip('optuna')
+
+from benchmark_utils import oracles  # noqa: E402
+from solvers.optuna import Solver  # noqa: E402
+
+
+def _get_solver(n_jobs=1, n_samples=50, n_features=2):
+    X = np.random.randn(n_samples, n_features)
+    y = np.sign(np.random.randn(n_samples))
+    f_inner = oracles.LogisticRegressionOracle(X, y, reg='exp')
+    f_outer = oracles.LogisticRegressionOracle(X, y)
+
+    solver = Solver.get_instance(random_state=1, n_jobs=n_jobs)
+    solver.set_objective(
+        f_train=lambda framework: f_inner.get_framework(framework),
+        f_val=lambda framework: f_outer.get_framework(framework),
+        n_inner_samples=n_samples, n_outer_samples=n_samples,
+        inner_var0=np.zeros(n_features), outer_var0=np.zeros(n_features)
+    )
+    return solver, f_inner, f_outer
+
+
+def _stop_after(n_calls):
+    """Callback stopping the solver at its n_calls-th call."""
+    calls = []
+
+    def callback(beta):
+        calls.append(beta)
+        return len(calls) < n_calls
+
+    return callback
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_optuna_run(n_jobs):
+    solver, f_inner, f_outer = _get_solver(n_jobs=n_jobs)
+
+    # each call to the callback follows n_jobs new trials
+    solver.run(_stop_after(4))
+    assert len(solver.study.trials) == 3 * n_jobs
+    assert len(solver.solutions) == 3 * n_jobs
+
+    # the result is the best trial with its inner solution
+    inner_var, outer_var = solver.get_result()
+    assert np.isclose(f_outer.get_value(inner_var, outer_var),
+                      solver.study.best_value)
+    assert np.allclose(inner_var,
+                       f_inner.get_inner_var_star(outer_var), atol=1e-4)
+
+    # a new run starts a new study
+    solver.run(_stop_after(2))
+    assert len(solver.study.trials) == n_jobs
+
+
+def test_optuna_warm_start():
+    solver, f_inner, _ = _get_solver()
+    solver.run(_stop_after(1))
+    assert solver.get_warm_start(np.zeros(2)) is None
+
+    solver.solutions = {
+        0: (np.zeros(2), np.zeros(2)),
+        1: (np.ones(2), np.ones(2)),
+    }
+    assert np.all(solver.get_warm_start(np.full(2, .8)) == 1)
+    assert np.all(solver.get_warm_start(np.full(2, -.1)) == 0)
@@ -0,0 +1,75 @@
+import numpy as np
+from scipy import sparse
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.oracle_utils import memoize_oracle  # noqa: E402
+from benchmark_utils.oracle_utils import array_lru_cache  # noqa: E402
+from benchmark_utils.oracle_utils import convert_array_framework  # noqa
+
+
+def test_memoize_oracle():
+    calls = []
+
+    @memoize_oracle
+    def get_oracle(framework="none", get_full_batch=False, dtype="float64"):
+        calls.append((framework, get_full_batch, dtype))
+        return object()
+
+    oracle = get_oracle()
+    assert get_oracle(framework="none") is oracle
+    assert get_oracle("none", False) is oracle
+    assert get_oracle(framework="jax") is not oracle
+    assert get_oracle(framework="jax", get_full_batch=True) is not oracle
+    assert get_oracle(framework="jax") is get_oracle("jax")
+    # the defaults are part of the key
+    assert get_oracle(dtype="float64") is oracle
+    assert get_oracle("none", dtype="float64") is oracle
+    assert get_oracle(dtype="float32") is get_oracle(dtype="float32")
+    assert get_oracle(dtype="float32") is not oracle
+    assert calls == [("none", False, "float64"), ("jax", False, "float64"),
+                     ("jax", True, "float64"), ("none", False, "float32")]
+
+
+def test_array_lru_cache():
+    calls = []
+
+    @array_lru_cache(maxsize=2)
+    def func(x):
+        calls.append(x.copy())
+        return x.sum()
+
+    x = np.arange(3.)
+    assert func(x) == func(x.copy()) == 3.
+    assert len(calls) == 1
+    # same bytes but different shape or dtype are different keys
+    func(x.reshape(1, 3))
+    func(x.astype(np.float32))
+    assert len(calls) == 3
+    func(x)
+    assert len(calls) == 4
+
+
+def test_inner_var_star_warm_start():
+    X = np.random.randn(100, 5)
+    y = np.sign(np.random.randn(100))
+    f = oracles.LogisticRegressionOracle(X, y, reg='exp')
+    outer_var = np.zeros(5)
+    inner_star = f.get_inner_var_star(outer_var)
+    inner_star_ws = f.get_inner_var_star(outer_var, inner_var0=inner_star)
+    assert np.allclose(inner_star, inner_star_ws, atol=1e-5)
+
+
+def test_csr_to_bcoo():
+    X = sparse.random(50, 20, density=.2, format='lil', random_state=0)
+    X[3] = 0
+    X = X.tocsr()
+    X_bcoo = convert_array_framework(X, framework='jax')
+    assert X_bcoo.n_batch == 1
+    # the rows are padded to the largest number of non-zeros of a row
+    assert X_bcoo.nse == np.diff(X.indptr).max()
+    assert np.allclose(X_bcoo.todense(), X.toarray())
+    # numpy and numba frameworks keep the matrix as is
+    assert convert_array_framework(X, framework='numba') is X
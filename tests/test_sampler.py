@@ -1,9 +1,11 @@
 import pytest
+import numpy as np
 
 from benchopt.utils.safe_import import set_benchmark_module
 set_benchmark_module('.')
 
 from benchmark_utils.minibatch_sampler import init_sampler  # noqa: E402
+from benchmark_utils.minibatch_sampler import MinibatchSampler  # noqa: E402
 
 
 @pytest.mark.parametrize('n_samples', [100])
@@ -12,3 +14,16 @@ def test_lr_scheduler(n_samples, batch_size):
     sampler, state_sampler = init_sampler(n_samples, batch_size)
     for k in range(10):
         selector, _, _, state_sampler = sampler(state_sampler)
+
+
+def test_batch_at():
+    n_samples, batch_size = 100, 23
+    sampler = MinibatchSampler(n_samples, batch_size)
+    weights = np.zeros(sampler.n_batches)
+    for _ in range(2 * sampler.n_batches):
+        i_batch = sampler.i_batch
+        selector, (idx, weight) = sampler.get_batch()
+        assert sampler.batch_at(idx) == (selector, (idx, weight))
+        assert sampler.i_batch == (i_batch + 1) % sampler.n_batches
+        weights[idx] = weight
+    assert np.isclose(weights.sum(), 1)
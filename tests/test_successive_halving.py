@@ -0,0 +1,95 @@
+import numpy as np
+import yaml
+
+from benchopt.utils.safe_import import set_benchmark_module
+set_benchmark_module('.')
+
+from benchmark_utils.successive_halving import get_budgets  # noqa: E402
+from benchmark_utils.successive_halving import criterion_score  # noqa: E402
+from benchmark_utils.successive_halving import successive_halving  # noqa
+from benchmark_utils import oracles  # noqa: E402
+from benchmark_utils.oracle_utils import convert_array_framework  # noqa
+from config.successive_halving import get_best_solvers  # noqa: E402
+from config.successive_halving import write_config  # noqa: E402
+from objective import Objective  # noqa: E402
+from solvers.soba import Solver as SOBA  # noqa: E402
+
+
+def test_criterion_score():
+    values = np.array([[3., 3., 3.], [2., 1., np.nan], [0., np.inf, np.inf]])
+    assert criterion_score(values) == 2.
+    assert criterion_score(values, max_stop_val=0) == 3.
+
+
+def test_get_budgets():
+    assert get_budgets(4, 100) == [4, 8, 16, 32, 64, 100]
+    assert get_budgets(4, 4) == [4]
+
+
+def test_successive_halving():
+    # config c converges to c with rate 1 / (k + 1)
+    configs = [1., 2., 3., 4., 5.]
+    calls = []
+
+    def evaluate(configs, n_evals):
+        calls.append((list(configs), n_evals))
+        k = np.arange(n_evals + 1)[:, None]
+        return {c: c + 1 / (k + 1) * np.ones((1, 3)) for c in configs}
+
+    rungs = successive_halving(configs, evaluate, min_evals=2, max_evals=8)
+    assert [n_evals for n_evals, _ in rungs] == [2, 4, 8]
+    assert [len(configs) for configs, _ in calls] == [5, 3, 2]
+    assert rungs[-1][1][0][0] == 1.
+    assert np.isclose(rungs[-1][1][0][1], 1 + 1 / 9)
+
+
+def _get_objective(n_samples=64, n_features=3):
+    rng = np.random.RandomState(0)
+    X = rng.randn(n_samples, n_features)
+    y = np.sign(rng.randn(n_samples))
+
+    def get_oracle(reg, framework="none", get_full_batch=False):
+        oracle = oracles.LogisticRegressionOracle(
+            convert_array_framework(X, framework),
+            convert_array_framework(y, framework), reg=reg
+        )
+        return oracle.get_framework(framework=framework,
+                                    get_full_batch=get_full_batch)
+
+    def metrics(inner_var, outer_var):
+        f_val = get_oracle('none')
+        return dict(value=f_val.get_value(np.asarray(inner_var),
+                                          np.asarray(outer_var)))
+
+    objective = Objective.get_instance()
+    objective.set_data(
+        lambda **kwargs: get_oracle('exp', **kwargs),
+        lambda **kwargs: get_oracle('none', **kwargs),
+        oracle='logreg', metrics=metrics, n_reg='full'
+    )
+    return objective
+
+
+def test_get_best_solvers(tmp_path):
+    config = dict(
+        objective=['Bilevel Optimization'],
+        dataset=['tiny'],
+        solver=[
+            'SOBA[batch_size=16,eval_freq=8,step_size=[0.1, 0.01],'
+            'outer_ratio=[1.0],random_state=[1, 2],framework=jax]',
+            'Optuna[random_state=[1]]',
+        ],
+        timeout=10,
+    )
+    best = get_best_solvers(_get_objective(), config['solver'], [SOBA],
+                            min_evals=2, max_evals=4)
+    assert len(best) == 1
+    assert best[0].startswith('SOBA[')
+
+    output = tmp_path / 'tiny_sh_best_params.yml'
+    write_config(output, config, best)
+    with open(output) as f:
+        written = yaml.safe_load(f)
+    assert written['solver'] == best
+    assert written['dataset'] == ['tiny']
+    assert written['timeout'] == 10